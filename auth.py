@@ -1,17 +1,36 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
+from pydantic import BaseModel
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from prisma import Prisma
+import asyncio
 import secrets
 import string
+import time
 from config import settings
-from prisma import Prisma
+from database import db_pool
+from cache import TTLCache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# Cache clé API -> utilisateur, et cache négatif des clés invalides
+api_key_cache = TTLCache(maxsize=settings.api_key_cache_size, ttl=settings.api_key_cache_ttl)
+invalid_api_key_cache = TTLCache(
+    maxsize=settings.api_key_negative_cache_size,
+    ttl=settings.api_key_negative_cache_ttl
+)
+
+class TokenUser(BaseModel):
+    """Identité minimale de l'utilisateur reconstruite à partir des claims du token"""
+    id: str
+    name: Optional[str] = None
+    email: Optional[str] = None
+    createdAt: Optional[datetime] = None
+
 def generate_api_key(length: int = 32) -> str:
     """Génère une clé API aléatoire"""
     alphabet = string.ascii_letters + string.digits
@@ -24,7 +43,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
@@ -40,6 +59,42 @@ def verify_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def user_token_claims(user) -> dict:
+    """Construit les claims d'identité à embarquer dans le token"""
+    claims = {"sub": user.id}
+    if settings.jwt_stateless:
+        claims["usr"] = {
+            "name": user.name,
+            "email": user.email,
+            "created_at": user.createdAt.isoformat() if user.createdAt else None
+        }
+    return claims
+
+async def revoke_token(payload: dict) -> None:
+    """Révoque un token jusqu'à son expiration (table partagée par tous les workers)"""
+    jti = payload.get("jti")
+    # exp est un horodatage UTC : time.time() ne dépend pas du fuseau de l'hôte
+    if jti is None or payload.get("exp", 0) <= time.time():
+        return
+    now = datetime.now(timezone.utc)
+    async with db_pool.acquire() as prisma:
+        async with prisma.batch_() as batcher:
+            batcher.revokedtoken.upsert(
+                where={"jti": jti},
+                data={
+                    "create": {"jti": jti, "expiresAt": datetime.fromtimestamp(payload["exp"], timezone.utc)},
+                    "update": {}
+                }
+            )
+            # Un token expiré est déjà refusé : sa révocation n'a plus d'utilité
+            batcher.revokedtoken.delete_many(where={"expiresAt": {"lt": now}})
+
+async def _is_revoked(prisma: Prisma, jti: Optional[str]) -> bool:
+    """Vrai si le token a été révoqué (une erreur de base est propagée : le token est alors refusé)"""
+    if jti is None:
+        return False
+    return await prisma.revokedtoken.find_unique(where={"jti": jti}) is not None
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Récupère l'utilisateur actuel à partir du token"""
     token = credentials.credentials
@@ -52,31 +107,68 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    prisma = Prisma()
-    await prisma.connect()
-    try:
-        user = await prisma.user.find_unique(where={"id": user_id})
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Utilisateur non trouvé",
-                headers={"WWW-Authenticate": "Bearer"},
+    # Chemin rapide : identité issue des claims, seule la révocation est lue en base
+    claims = payload.get("usr")
+    stateless = settings.jwt_stateless and claims is not None
+    async with db_pool.acquire() as prisma:
+        if stateless:
+            revoked = await _is_revoked(prisma, payload.get("jti"))
+            user = None
+        else:
+            revoked, user = await asyncio.gather(
+                _is_revoked(prisma, payload.get("jti")),
+                prisma.user.find_unique(where={"id": user_id})
             )
-        return user
-    finally:
-        await prisma.disconnect()
+    if revoked:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if stateless:
+        return TokenUser(
+            id=user_id,
+            name=claims.get("name"),
+            email=claims.get("email"),
+            createdAt=claims.get("created_at")
+        )
+    
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Utilisateur non trouvé",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
 
 async def verify_api_key(api_key: str):
     """Vérifie une clé API et retourne l'utilisateur"""
-    prisma = Prisma()
-    await prisma.connect()
-    try:
-        user = await prisma.user.find_unique(where={"apiKey": api_key})
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Clé API invalide"
-            )
+    user = api_key_cache.get(api_key)
+    if user is not None:
         return user
-    finally:
-        await prisma.disconnect()
\ No newline at end of file
+    
+    if invalid_api_key_cache.get(api_key) is None:
+        async with db_pool.acquire() as prisma:
+            user = await prisma.user.find_unique(where={"apiKey": api_key})
+        if user is None:
+            invalid_api_key_cache.set(api_key, True)
+    
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Clé API invalide"
+        )
+    api_key_cache.set(api_key, user)
+    return user
+
+def invalidate_api_key(api_key: str) -> None:
+    """Invalide les entrées de cache d'une clé API (création ou suppression d'utilisateur)"""
+    api_key_cache.pop(api_key)
+    invalid_api_key_cache.pop(api_key)
+
+def api_key_cache_stats() -> dict:
+    """Retourne les compteurs des caches de clés API"""
+    return {
+        "api_keys": api_key_cache.stats(),
+        "invalid_api_keys": invalid_api_key_cache.stats()
+    }
\ No newline at end of file
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark de get_current_user : chemin base de données vs chemin JWT sans état
+
+Usage : python -m benchmarks.auth_benchmark --iterations 2000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import timedelta
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from config import settings
+from database import db_pool
+from auth import create_access_token, generate_api_key, get_current_user, user_token_claims
+
+async def measure(token: str, iterations: int) -> list:
+    """Mesure la latence de get_current_user pour un token donné"""
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await get_current_user(credentials)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def report(label: str, durations: list) -> None:
+    """Affiche les percentiles d'une série de mesures"""
+    ordered = sorted(durations)
+    p50 = ordered[len(ordered) // 2] * 1000
+    p99 = ordered[int(len(ordered) * 0.99) - 1] * 1000
+    mean = statistics.mean(durations) * 1000
+    print(f"{label:<12} moyenne={mean:.3f}ms p50={p50:.3f}ms p99={p99:.3f}ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'authentification JWT")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    await db_pool.connect()
+    try:
+        async with db_pool.acquire() as prisma:
+            user = await prisma.user.create(
+                data={"apiKey": generate_api_key(), "name": "Benchmark", "email": "bench@fraym.local"}
+            )
+        expires = timedelta(minutes=settings.access_token_expire_minutes)
+
+        settings.jwt_stateless = False
+        db_token = create_access_token(user_token_claims(user), expires)
+        db_durations = await measure(db_token, args.iterations)
+
+        settings.jwt_stateless = True
+        stateless_token = create_access_token(user_token_claims(user), expires)
+        stateless_durations = await measure(stateless_token, args.iterations)
+
+        print(f"📊 get_current_user sur {args.iterations} appels")
+        report("base", db_durations)
+        report("sans état", stateless_durations)
+        print(f"🔁 Acquisitions du pool Prisma: {db_pool.stats()['acquisitions']}")
+
+        async with db_pool.acquire() as prisma:
+            await prisma.user.delete(where={"id": user.id})
+    finally:
+        await db_pool.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Serveur factice compatible avec l'API OpenAI Assistants (threads, messages, runs)
+
+Latences configurables et réponses JSON d'interface pré-enregistrées
+(benchmarks/corpus/assistant_responses.jsonl), pour mesurer l'API sans OpenAI.
+
+Injection de pannes : --fail-rate (réponses --fail-status avec Retry-After) et
+--hang-rate (runs qui ne se terminent jamais), modifiables à chaud via POST /faults,
+qui accepte aussi fail_next (les N prochains appels échouent) et fail_applied
+(l'appel est traité avant l'erreur, comme une réponse perdue).
+
+Usage : python -m benchmarks.fake_openai --port 8200 --run-latency 2.0
+Puis  : OPENAI_BASE_URL=http://127.0.0.1:8200/v1
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import uuid
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CORPUS = Path(__file__).parent / "corpus" / "assistant_responses.jsonl"
+
+# Réglages des pannes modifiables via POST /faults
+FAULTS = ("fail_rate", "fail_status", "retry_after", "hang_rate", "fail_next", "fail_applied")
+
+class FakeAssistants:
+    """État en mémoire des threads et des runs du serveur factice"""
+
+    def __init__(self, run_latency: float, api_latency: float, jitter: float, first_token: float, chunk_size: int):
+        self.run_latency = run_latency
+        self.api_latency = api_latency
+        self.jitter = jitter
+        self.first_token = first_token
+        self.chunk_size = chunk_size
+        self.threads = {}
+        self.runs = {}
+        self.calls = 0
+        # Pannes injectées
+        self.fail_rate = 0.0
+        self.fail_status = 503
+        self.retry_after = 0.0
+        self.hang_rate = 0.0
+        self.fail_next = 0
+        self.fail_applied = False
+        self.failures = 0
+        responses = [json.loads(line)["content"] for line in CORPUS.read_text(encoding="utf-8").splitlines() if line]
+        self.responses = itertools.cycle(responses)
+
+    def _jittered(self, value: float) -> float:
+        return max(0.0, value * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def api_delay(self) -> None:
+        """Latence réseau simulée d'un appel à l'API"""
+        self.calls += 1
+        if self.api_latency:
+            await asyncio.sleep(self._jittered(self.api_latency))
+
+    def thread(self, thread_id: str) -> dict:
+        if thread_id not in self.threads:
+            raise HTTPException(status_code=404, detail="No thread found")
+        return self.threads[thread_id]
+
+    def should_fail(self) -> bool:
+        """Tire la prochaine panne injectée"""
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            return True
+        return random.random() < self.fail_rate
+
+    def new_message(self, thread_id: str, role: str, content: str, run_id: str = None, metadata: dict = None) -> dict:
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "status": "completed",
+            "content": [{"type": "text", "text": {"value": content, "annotations": []}}],
+            "assistant_id": "asst_fake" if role == "assistant" else None,
+            "run_id": run_id,
+            "attachments": [],
+            "metadata": metadata or {},
+        }
+        self.thread(thread_id)["messages"].append(message)
+        return message
+
+    def new_run(self, thread_id: str, assistant_id: str, metadata: dict = None) -> dict:
+        run = {
+            "id": f"run_{uuid.uuid4().hex[:24]}",
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "assistant_id": assistant_id,
+            "status": "queued",
+            "model": "fake-model",
+            "instructions": "",
+            "tools": [],
+            "metadata": metadata or {},
+            "parallel_tool_calls": False,
+        }
+        hangs = random.random() < self.hang_rate
+        self.runs[run["id"]] = {
+            "run": run,
+            "done_at": float("inf") if hangs else time.monotonic() + self._jittered(self.run_latency),
+            "response": next(self.responses),
+        }
+        return run
+
+    def refresh_run(self, run_id: str) -> dict:
+        """Fait avancer le run selon le temps écoulé et publie la réponse à la fin"""
+        state = self.runs.get(run_id)
+        if state is None:
+            raise HTTPException(status_code=404, detail="No run found")
+        run = state["run"]
+        if run["status"] in ("queued", "in_progress"):
+            if time.monotonic() >= state["done_at"]:
+                self.new_message(run["thread_id"], "assistant", state["response"], run["id"])
+                run["status"] = "completed"
+                run["completed_at"] = int(time.time())
+            else:
+                run["status"] = "in_progress"
+        return run
+
+def list_page(items: list, order: str, limit: int, after: str = None, before: str = None) -> dict:
+    """Page d'une liste comme l'API : ordre, limite et curseurs after/before (ID d'objet)"""
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+    items = list(reversed(items)) if order == "desc" else list(items)
+    ids = [item["id"] for item in items]
+    for cursor in (after, before):
+        if cursor is not None and cursor not in ids:
+            raise HTTPException(status_code=400, detail=f"No object found with id '{cursor}'")
+    if after is not None:
+        items = items[ids.index(after) + 1:]
+    if before is not None:
+        # Les objets qui précèdent le curseur, les plus proches d'abord
+        items = items[:ids.index(before)][::-1]
+    data = items[:limit]
+    if before is not None:
+        data.reverse()
+    return {
+        "object": "list",
+        "data": data,
+        "first_id": data[0]["id"] if data else None,
+        "last_id": data[-1]["id"] if data else None,
+        "has_more": len(items) > limit,
+    }
+
+def create_app(fake: FakeAssistants) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI Assistants")
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        if not request.url.path.startswith("/v1") or not fake.should_fail():
+            return await call_next(request)
+        fake.failures += 1
+        if fake.fail_applied:
+            # Réponse perdue : l'appel a bien été traité
+            await call_next(request)
+        headers = {"retry-after": str(fake.retry_after)} if fake.retry_after else {}
+        return JSONResponse(
+            status_code=fake.fail_status,
+            content={"error": {"message": "Injected fault", "type": "server_error"}},
+            headers=headers
+        )
+
+    @app.post("/faults")
+    async def set_faults(request: Request):
+        body = await request.json()
+        for name in FAULTS:
+            if name in body:
+                setattr(fake, name, type(getattr(fake, name))(body[name]))
+        return {name: getattr(fake, name) for name in FAULTS}
+
+    @app.post("/v1/threads")
+    async def create_thread():
+        await fake.api_delay()
+        thread_id = f"thread_{uuid.uuid4().hex[:24]}"
+        fake.threads[thread_id] = {"messages": []}
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+
+    @app.delete("/v1/threads/{thread_id}")
+    async def delete_thread(thread_id: str):
+        await fake.api_delay()
+        fake.thread(thread_id)
+        del fake.threads[thread_id]
+        return {"id": thread_id, "object": "thread.deleted", "deleted": True}
+
+    @app.post("/v1/threads/{thread_id}/messages")
+    async def create_message(thread_id: str, request: Request):
+        await fake.api_delay()
+        body = await request.json()
+        content = body.get("content", "")
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content)
+        return fake.new_message(thread_id, body.get("role", "user"), content, metadata=body.get("metadata"))
+
+    @app.delete("/v1/threads/{thread_id}/messages/{message_id}")
+    async def delete_message(thread_id: str, message_id: str):
+        await fake.api_delay()
+        messages = fake.thread(thread_id)["messages"]
+        if not any(message["id"] == message_id for message in messages):
+            raise HTTPException(status_code=404, detail="No message found")
+        fake.thread(thread_id)["messages"] = [message for message in messages if message["id"] != message_id]
+        return {"id": message_id, "object": "thread.message.deleted", "deleted": True}
+
+    @app.get("/v1/threads/{thread_id}/messages")
+    async def list_messages(thread_id: str, order: str = "desc", limit: int = 20, after: str = None, before: str = None):
+        await fake.api_delay()
+        return list_page(fake.thread(thread_id)["messages"], order, limit, after, before)
+
+    @app.post("/v1/threads/{thread_id}/runs")
+    async def create_run(thread_id: str, request: Request):
+        await fake.api_delay()
+        fake.thread(thread_id)
+        body = await request.json()
+        run = fake.new_run(thread_id, body.get("assistant_id", "asst_fake"), metadata=body.get("metadata"))
+        if body.get("stream"):
+            return StreamingResponse(stream_run(run), media_type="text/event-stream")
+        return run
+
+    @app.get("/v1/threads/{thread_id}/runs")
+    async def list_runs(thread_id: str, order: str = "desc", limit: int = 20, after: str = None, before: str = None):
+        await fake.api_delay()
+        fake.thread(thread_id)
+        runs = [fake.refresh_run(run_id) for run_id, state in fake.runs.items() if state["run"]["thread_id"] == thread_id]
+        return list_page(runs, order, limit, after, before)
+
+    @app.get("/v1/threads/{thread_id}/runs/{run_id}")
+    async def retrieve_run(thread_id: str, run_id: str):
+        await fake.api_delay()
+        return fake.refresh_run(run_id)
+
+    @app.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+    async def cancel_run(thread_id: str, run_id: str):
+        await fake.api_delay()
+        run = fake.refresh_run(run_id)
+        if run["status"] in ("queued", "in_progress"):
+            run["status"] = "cancelled"
+        return run
+
+    @app.get("/stats")
+    async def stats():
+        cancelled = sum(1 for state in fake.runs.values() if state["run"]["status"] == "cancelled")
+        return {
+            "calls": fake.calls,
+            "threads": len(fake.threads),
+            "runs": len(fake.runs),
+            "cancelled_runs": cancelled,
+            "failures": fake.failures,
+        }
+
+    def sse(event: str, data) -> str:
+        payload = data if isinstance(data, str) else json.dumps(data)
+        return f"event: {event}\ndata: {payload}\n\n"
+
+    async def stream_run(run: dict):
+        """Diffuse un run : création, fragments de texte étalés sur la latence du run, fin"""
+        state = fake.runs[run["id"]]
+        content = state["response"]
+        yield sse("thread.run.created", run)
+        run["status"] = "in_progress"
+        yield sse("thread.run.in_progress", run)
+
+        await asyncio.sleep(fake._jittered(fake.first_token))
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": run["thread_id"],
+            "role": "assistant",
+            "status": "in_progress",
+            "content": [],
+            "assistant_id": run["assistant_id"],
+            "run_id": run["id"],
+            "attachments": [],
+            "metadata": {},
+        }
+        yield sse("thread.message.created", message)
+
+        chunks = [content[i:i + fake.chunk_size] for i in range(0, len(content), fake.chunk_size)] or [""]
+        remaining = max(0.0, state["done_at"] - time.monotonic())
+        pause = remaining / len(chunks)
+        for chunk in chunks:
+            yield sse("thread.message.delta", {
+                "id": message["id"],
+                "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": chunk, "annotations": []}}]},
+            })
+            if pause:
+                await asyncio.sleep(pause)
+
+        message["status"] = "completed"
+        message["content"] = [{"type": "text", "text": {"value": content, "annotations": []}}]
+        fake.thread(run["thread_id"])["messages"].append(message)
+        yield sse("thread.message.completed", message)
+
+        run["status"] = "completed"
+        run["completed_at"] = int(time.time())
+        yield sse("thread.run.completed", run)
+        yield sse("done", "[DONE]")
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur OpenAI Assistants factice")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--run-latency", type=float, default=2.0, help="Durée d'un run (s)")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Latence de chaque appel (s)")
+    parser.add_argument("--first-token", type=float, default=0.4, help="Délai avant le premier fragment en streaming (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variation relative des latences")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Taille des fragments diffusés")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Proportion d'appels en erreur")
+    parser.add_argument("--fail-status", type=int, default=503, help="Code HTTP des erreurs injectées")
+    parser.add_argument("--retry-after", type=float, default=0.0, help="En-tête Retry-After des erreurs (s)")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Proportion de runs qui ne finissent jamais")
+    parser.add_argument("--fail-applied", action="store_true", help="Erreurs renvoyées après traitement de l'appel")
+    args = parser.parse_args()
+
+    fake = FakeAssistants(args.run_latency, args.api_latency, args.jitter, args.first_token, args.chunk_size)
+    fake.fail_rate = args.fail_rate
+    fake.fail_status = args.fail_status
+    fake.retry_after = args.retry_after
+    fake.hang_rate = args.hang_rate
+    fake.fail_applied = args.fail_applied
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
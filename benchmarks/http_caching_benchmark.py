@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la compression HTTP et des réponses 304 sur l'historique d'une session
+
+Rejoue GET /sessions/{id}/messages sur une page de réponses du corpus, à travers
+CompressionMiddleware, et compare par requête les octets transmis et le temps CPU
+du serveur : réponse complète en clair, compressée (gzip, brotli si installé) et
+revalidation 304 (If-None-Match), qui ne lit ni ne sérialise aucune ligne.
+
+Usage : python -m benchmarks.http_caching_benchmark --messages 50 --iterations 500
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI, Header, Response
+
+from conditional import cache_headers, make_etag, matching_etag, not_modified
+from middleware import CompressionMiddleware, brotli
+from models import MessageResponse
+from response_normalizer import normalize_response
+
+CORPUS = Path(__file__).parent / "corpus" / "assistant_responses.jsonl"
+
+def build_app(rows: list) -> FastAPI:
+    """Route calquée sur get_session_messages, les lignes Prisma étant déjà en mémoire"""
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    version = [{"sessionId": "s1", "_count": {"_all": len(rows)}, "_max": {"createdAt": rows[-1]["createdAt"]}}]
+
+    @app.get("/sessions/{session_id}/messages", response_model=List[MessageResponse])
+    async def messages(session_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+        etag = make_etag("messages", session_id, version, None, None, len(rows), [])
+        validator = matching_etag(if_none_match, etag)
+        if validator:
+            return not_modified(validator)
+        response.headers.update(cache_headers(etag))
+        return [
+            MessageResponse(id=row["id"], role=row["role"], content=row["content"], created_at=row["createdAt"])
+            for row in rows
+        ]
+
+    return app
+
+async def get(app: FastAPI, headers: dict) -> tuple:
+    """Appel ASGI direct, sans client HTTP : (statut, en-têtes, corps transmis)"""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/sessions/s1/messages", "raw_path": b"/sessions/s1/messages", "query_string": b"",
+        "root_path": "", "server": ("127.0.0.1", 80), "client": ("127.0.0.1", 1234),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], dict(start["headers"]), body
+
+async def measure(app: FastAPI, headers: dict, iterations: int) -> tuple:
+    """(octets du corps transmis, temps CPU serveur moyen en ms)"""
+    started = time.process_time()
+    for _ in range(iterations):
+        _, _, body = await get(app, headers)
+    return len(body), (time.process_time() - started) / iterations * 1000
+
+async def run(app: FastAPI, args) -> None:
+    _, headers, _ = await get(app, {"Accept-Encoding": "identity"})
+    etag = headers[b"etag"].decode()
+
+    cases = [("clair", {"Accept-Encoding": "identity"}), ("gzip", {"Accept-Encoding": "gzip"})]
+    if brotli is not None:
+        cases.append(("brotli", {"Accept-Encoding": "br"}))
+    cases.append(("304", {"Accept-Encoding": "gzip", "If-None-Match": etag}))
+
+    print(f"📊 Historique de {args.messages} messages, {args.iterations} requêtes par cas")
+    print(f"{'réponse':<10}{'octets':>10}{'CPU/req':>12}")
+    for label, headers in cases:
+        wire, cpu = await measure(app, headers, args.iterations)
+        print(f"{label:<10}{wire:>10}{cpu:>10.3f}ms")
+    if brotli is None:
+        print("ℹ️  brotli ignoré : paquet brotli non installé")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la compression HTTP et des 304")
+    parser.add_argument("--messages", type=int, default=50, help="Messages par page d'historique")
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    corpus = [
+        normalize_response(json.loads(line)["content"]).text
+        for line in CORPUS.read_text(encoding="utf-8").splitlines() if line
+    ]
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"id": f"m{index:06d}", "role": "assistant" if index % 2 else "user",
+         "content": corpus[index % len(corpus)] if index % 2 else "Montre-moi des vestes", "createdAt": now}
+        for index in range(args.messages)
+    ]
+    asyncio.run(run(build_app(rows), args))
+
+if __name__ == "__main__":
+    main()
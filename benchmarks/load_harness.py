@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Harnais de charge de l'API Rasa Fraym contre un serveur OpenAI factice
+
+Démarre benchmarks.fake_openai et l'API (uvicorn), puis rejoue le parcours
+d'un visiteur : auto-register -> création de session -> N tours de chat ->
+lecture du cart -> mise à jour du cart -> historique. Rapporte p50/p95/p99,
+requêtes par seconde et requêtes Prisma par requête HTTP, par endpoint.
+
+Usage :
+  python -m benchmarks.load_harness --users 20 --turns 3 --run-latency 1.0
+  python -m benchmarks.load_harness --output resultats.json
+  python -m benchmarks.load_harness --compare resultats.json --tolerance 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+class EndpointStats:
+    """Mesures collectées pour un endpoint"""
+
+    def __init__(self):
+        self.latencies = []
+        self.db_queries = []
+        self.wire_bytes = 0
+        self.errors = 0
+
+    def record(self, latency: float, response: httpx.Response) -> None:
+        self.latencies.append(latency)
+        if response.status_code >= 400:
+            self.errors += 1
+        # Octets reçus tels que transmis (compressés le cas échéant)
+        self.wire_bytes += response.num_bytes_downloaded
+        queries = response.headers.get("X-DB-Queries")
+        if queries is not None:
+            self.db_queries.append(int(queries))
+
+    def summary(self, elapsed: float) -> dict:
+        ordered = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000 if ordered else 0.0
+
+        return {
+            "count": len(ordered),
+            "errors": self.errors,
+            "p50_ms": round(percentile(0.50), 2),
+            "p95_ms": round(percentile(0.95), 2),
+            "p99_ms": round(percentile(0.99), 2),
+            "rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            "db_queries": round(sum(self.db_queries) / len(self.db_queries), 2) if self.db_queries else None,
+            "db_queries_max": max(self.db_queries) if self.db_queries else None,
+            "kb_per_request": round(self.wire_bytes / len(ordered) / 1024, 2) if ordered else 0.0,
+        }
+
+class Harness:
+    """Client de charge qui rejoue les parcours et agrège les mesures"""
+
+    def __init__(self, base_url: str, turns: int):
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=120.0)
+        self.turns = turns
+        self.stats = defaultdict(EndpointStats)
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.stats[name].record(time.perf_counter() - started, response)
+        return response
+
+    async def visitor(self, index: int) -> None:
+        """Parcours complet d'un visiteur (une IP distincte par visiteur)"""
+        forwarded = {"X-Forwarded-For": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"}
+        response = await self.call("POST /auth/auto-register", "POST", "/auth/auto-register", headers=forwarded)
+        if response.status_code != 200:
+            return
+        headers = {"Authorization": f"Bearer {response.json()['api_key']}"}
+
+        response = await self.call("POST /sessions", "POST", "/sessions", json={"title": "Benchmark"}, headers=headers)
+        if response.status_code != 200:
+            return
+        session_id = response.json()["id"]
+
+        for turn in range(self.turns):
+            await self.call(
+                "POST /sessions/{id}/chat", "POST", f"/sessions/{session_id}/chat",
+                json={"content": f"Montre-moi des vestes (tour {turn})"}, headers=headers
+            )
+
+        response = await self.call("GET /cart", "GET", "/cart", headers=headers)
+        # Revalidation d'un cart inchangé (304 attendu)
+        await self.call("GET /cart (304)", "GET", "/cart",
+                        headers={**headers, "If-None-Match": response.headers.get("ETag", "")})
+        await self.call("PUT /cart", "PUT", "/cart", headers=headers, json={"cart": [
+            {"product_id": "veste-2", "product_name": "Veste en laine 2", "quantity": 1,
+             "unit_price": 109.95, "total_price": 109.95}
+        ]})
+        response = await self.call("GET /sessions/{id}/messages", "GET", f"/sessions/{session_id}/messages", headers=headers)
+        await self.call("GET /sessions/{id}/messages (304)", "GET", f"/sessions/{session_id}/messages",
+                        headers={**headers, "If-None-Match": response.headers.get("ETag", "")})
+
+    async def run(self, users: int, concurrency: int) -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(index: int):
+            async with semaphore:
+                await self.visitor(index)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(limited(index) for index in range(users)))
+        return time.perf_counter() - started
+
+async def wait_ready(url: str, timeout: float = 60.0) -> None:
+    """Attend qu'un serveur réponde sur l'URL donnée"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} ne répond pas")
+
+def start_servers(args) -> list:
+    """Démarre le serveur OpenAI factice puis l'API configurée pour l'utiliser"""
+    fake = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+        "--run-latency", str(args.run_latency), "--api-latency", str(args.api_latency),
+        "--jitter", str(args.jitter), "--fail-rate", str(args.fail_rate),
+        "--fail-status", str(args.fail_status), "--hang-rate", str(args.hang_rate)
+    ])
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_ASSISTANT_ID": "asst_fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+        "DATABASE_URL": args.database_url,
+        "EXPOSE_DB_QUERY_COUNT": "true",
+        **dict(item.split("=", 1) for item in args.env),
+    }
+    subprocess.run([sys.executable, "setup_database.py"], env=env, check=True)
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning"
+    ], env=env)
+    return [fake, api]
+
+def print_report(results: dict) -> None:
+    print(f"\n📊 {results['users']} visiteurs, {results['turns']} tours, {results['elapsed_s']}s")
+    print(f"{'endpoint':<38}{'n':>6}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>9}{'db/req':>8}{'Ko/req':>8}")
+    for name, summary in results["endpoints"].items():
+        db = "-" if summary["db_queries"] is None else f"{summary['db_queries']:.1f}"
+        print(
+            f"{name:<38}{summary['count']:>6}{summary['errors']:>5}"
+            f"{summary['p50_ms']:>9.1f}ms{summary['p95_ms']:>8.1f}ms{summary['p99_ms']:>8.1f}ms"
+            f"{summary['rps']:>9.1f}{db:>8}{summary['kb_per_request']:>8.2f}"
+        )
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> bool:
+    """Affiche l'écart de p50 avec une exécution de référence ; False si le p95 ou les requêtes DB régressent"""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    ok = True
+    for name, summary in results["endpoints"].items():
+        reference = baseline["endpoints"].get(name)
+        if reference is None:
+            continue
+        saved = reference["p50_ms"] - summary["p50_ms"]
+        print(f"⏱️  {name}: p50 {reference['p50_ms']}ms → {summary['p50_ms']}ms ({-saved:+.1f}ms)")
+        if reference["p95_ms"] and summary["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            print(f"❌ {name}: p95 {summary['p95_ms']}ms > {reference['p95_ms']}ms (+{tolerance:.0%})")
+            ok = False
+        if reference["db_queries"] is not None and summary["db_queries"] is not None \
+                and summary["db_queries"] > reference["db_queries"]:
+            print(f"❌ {name}: {summary['db_queries']} requêtes DB > {reference['db_queries']}")
+            ok = False
+    if ok:
+        print("✅ Aucune régression par rapport à la référence")
+    return ok
+
+def check_queries(results: dict, limits: list) -> bool:
+    """Vérifie le nombre maximal de requêtes DB par appel (limites "ENDPOINT=N") ; False si dépassé"""
+    ok = True
+    for limit in limits:
+        name, _, maximum = limit.rpartition("=")
+        summary = results["endpoints"].get(name)
+        if summary is None or summary["db_queries_max"] is None:
+            print(f"⚠️  {name}: aucune mesure de requêtes DB")
+            ok = False
+        elif summary["db_queries_max"] > int(maximum):
+            print(f"❌ {name}: jusqu'à {summary['db_queries_max']} requêtes DB > {maximum}")
+            ok = False
+        else:
+            print(f"✅ {name}: au plus {summary['db_queries_max']} requêtes DB (limite {maximum})")
+    return ok
+
+async def run_benchmark(args) -> dict:
+    await wait_ready(f"http://127.0.0.1:{args.fake_port}/stats")
+    await wait_ready(f"http://127.0.0.1:{args.port}/health")
+    harness = Harness(f"http://127.0.0.1:{args.port}", args.turns)
+    try:
+        elapsed = await harness.run(args.users, args.concurrency)
+    finally:
+        await harness.client.aclose()
+    return {
+        "users": args.users,
+        "turns": args.turns,
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": {name: stats.summary(elapsed) for name, stats in harness.stats.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Harnais de charge Rasa Fraym")
+    parser.add_argument("--users", type=int, default=20, help="Nombre de visiteurs")
+    parser.add_argument("--concurrency", type=int, default=10, help="Visiteurs simultanés")
+    parser.add_argument("--turns", type=int, default=3, help="Tours de chat par visiteur")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fake-port", type=int, default=8200)
+    parser.add_argument("--run-latency", type=float, default=1.0)
+    parser.add_argument("--api-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Pannes OpenAI injectées (proportion d'appels)")
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Proportion de runs bloqués")
+    parser.add_argument("--database-url", default="file:./bench.db")
+    parser.add_argument("--env", action="append", default=[], help="Variable supplémentaire pour l'API (CLE=valeur)")
+    parser.add_argument("--output", help="Fichier JSON où enregistrer les résultats")
+    parser.add_argument("--compare", help="Résultats de référence (JSON) à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Dégradation p95 tolérée")
+    parser.add_argument("--max-queries", action="append", default=[],
+                        help="Requêtes DB maximales par appel (\"ENDPOINT=N\")")
+    args = parser.parse_args()
+
+    servers = start_servers(args)
+    try:
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        for server in reversed(servers):
+            server.terminate()
+            server.wait()
+
+    print_report(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"💾 Résultats enregistrés dans {args.output}")
+    ok = check_queries(results, args.max_queries)
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        ok = False
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
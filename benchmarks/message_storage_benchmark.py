@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark du stockage compressé des messages : taille sur disque et débit de lecture
+
+Écrit N réponses de l'assistant (corpus) dans une table SQLite calquée sur `messages`,
+une fois par encodage (texte brut, zlib+d1, zstd+d1 si zstandard est installé), puis
+mesure la taille du fichier et le débit de relecture avec décodage, et sans décodage
+(octets envoyés tels quels aux clients qui annoncent X-Accept-Message-Encoding).
+
+Usage : python -m benchmarks.message_storage_benchmark --messages 20000
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from message_codec import IDENTITY, MessageCodec, zstandard
+from response_normalizer import normalize_response
+
+CORPUS = Path(__file__).parent / "corpus" / "assistant_responses.jsonl"
+
+def write_database(path: str, codec: MessageCodec, corpus: list, count: int) -> None:
+    """Écrit count messages encodés par codec dans une base neuve"""
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE messages (id TEXT PRIMARY KEY, sessionId TEXT, role TEXT, content TEXT,"
+        " encoding TEXT DEFAULT 'identity', compressed BLOB, createdAt TEXT)"
+    )
+    rows = []
+    for index in range(count):
+        content = corpus[index % len(corpus)]
+        encoding, payload = codec.encode(content)
+        rows.append((
+            f"m{index:08d}", f"s{index // 20}", "assistant",
+            content if payload is None else "", encoding, payload, "2025-01-01T00:00:00Z"
+        ))
+    connection.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.execute("VACUUM")
+    connection.close()
+
+def read_database(path: str, codec: MessageCodec, decode: bool) -> tuple:
+    """Relit tous les messages ; retourne (durée, octets de texte servis)"""
+    connection = sqlite3.connect(path)
+    started = time.perf_counter()
+    served = 0
+    for content, encoding, payload in connection.execute("SELECT content, encoding, compressed FROM messages"):
+        if decode or encoding == IDENTITY:
+            served += len(codec.decode(encoding, content, payload))
+        else:
+            served += len(payload)
+    elapsed = time.perf_counter() - started
+    connection.close()
+    return elapsed, served
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du stockage compressé des messages")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Contenu tel qu'enregistré par le tour de chat (texte normalisé)
+    corpus = [
+        normalize_response(json.loads(line)["content"]).text
+        for line in CORPUS.read_text(encoding="utf-8").splitlines() if line
+    ]
+    algorithms = ["", "zlib"] + (["zstd"] if zstandard is not None else [])
+
+    print(f"📊 {args.messages} réponses de l'assistant ({len(corpus)} modèles du corpus)")
+    print(f"{'encodage':<12}{'disque':>12}{'ratio':>8}{'lecture':>14}{'lecture brute':>16}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for algorithm in algorithms:
+            codec = MessageCodec(algorithm=algorithm, min_size=0)
+            path = os.path.join(directory, f"{algorithm or 'identity'}.db")
+            write_database(path, codec, corpus, args.messages)
+            size = os.path.getsize(path)
+            baseline = baseline or size
+            elapsed, _ = read_database(path, codec, decode=True)
+            raw_elapsed, _ = read_database(path, codec, decode=False)
+            print(
+                f"{codec.encoding:<12}{size / 1024:>10.0f}Ko{size / baseline:>8.2f}"
+                f"{args.messages / elapsed:>10.0f} m/s{args.messages / raw_elapsed:>12.0f} m/s"
+            )
+    if zstandard is None:
+        print("ℹ️  zstd ignoré : paquet zstandard non installé")
+
+if __name__ == "__main__":
+    main()
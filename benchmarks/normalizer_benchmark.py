@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de la normalisation des réponses de l'assistant
+
+Compare l'ancien traitement (regex recompilées, jusqu'à trois json.loads et
+un json.dumps) au normaliseur en un seul passage de response_normalizer.
+
+Usage : python -m benchmarks.normalizer_benchmark --iterations 5000
+"""
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+from response_normalizer import normalize_response
+
+CORPUS = Path(__file__).parent / "corpus" / "assistant_responses.jsonl"
+
+def legacy_process(content: str) -> str:
+    """Ancienne implémentation de OpenAIService._process_response"""
+    match = re.match(r'^```json\s*\n?(.*?)\n?```$', content.strip(), re.DOTALL | re.MULTILINE)
+    if match:
+        json_content = match.group(1).strip()
+    else:
+        json_content = content.strip()
+        for pattern in [r'^```json\s*\n?(.*?)$', r'^```\s*\n?(.*?)\n?```$', r'^```.*?\n(.*?)\n?```$']:
+            match = re.match(pattern, json_content, re.DOTALL | re.MULTILINE)
+            if match:
+                json_content = match.group(1).strip()
+                break
+    json_content = re.sub(r'`+', '', json_content)
+    json_content = re.sub(r'^(json|JSON)\s*\n?', '', json_content, flags=re.MULTILINE).strip()
+    try:
+        json.loads(json_content)
+        return json_content
+    except json.JSONDecodeError:
+        corrected = re.sub(r',\s*}', '}', json_content)
+        corrected = re.sub(r',\s*]', ']', corrected)
+        corrected = re.sub(r"'([^']*)':", r'"\1":', corrected)
+        corrected = re.sub(r":\s*'([^']*)'", r': "\1"', corrected)
+        corrected = re.sub(r'//.*?\n', '\n', corrected)
+        corrected = re.sub(r'/\*.*?\*/', '', corrected, flags=re.DOTALL)
+        try:
+            json.loads(corrected)
+            return corrected
+        except json.JSONDecodeError:
+            return content
+
+def legacy_pipeline(content: str) -> str:
+    """Ancien enchaînement _process_response puis _handle_use_state"""
+    processed = legacy_process(content)
+    try:
+        data = json.loads(processed)
+        if "useState" in data and "cart" in data["useState"]:
+            del data["useState"]["cart"]
+            data["cart_updated"] = True
+            return json.dumps(data)
+    except (json.JSONDecodeError, KeyError, TypeError):
+        pass
+    return processed
+
+def current_pipeline(content: str) -> str:
+    """Nouvel enchaînement : une analyse, une sérialisation au plus"""
+    response = normalize_response(content)
+    data = response.data
+    if isinstance(data, dict) and isinstance(data.get("useState"), dict) and "cart" in data["useState"]:
+        del data["useState"]["cart"]
+        data["cart_updated"] = True
+        response.mark_modified()
+    return response.text
+
+def run(pipeline, corpus: list, iterations: int) -> float:
+    """Retourne le temps moyen par réponse en microsecondes"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for content in corpus:
+            pipeline(content)
+    return (time.perf_counter() - started) / (iterations * len(corpus)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la normalisation des réponses")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    corpus = [json.loads(line)["content"] for line in CORPUS.read_text(encoding="utf-8").splitlines() if line]
+
+    # Les deux traitements doivent produire des réponses équivalentes
+    for content in corpus:
+        legacy, current = legacy_pipeline(content), current_pipeline(content)
+        try:
+            assert json.loads(legacy) == json.loads(current)
+        except json.JSONDecodeError:
+            assert legacy == current
+
+    legacy_us = run(legacy_pipeline, corpus, args.iterations)
+    current_us = run(current_pipeline, corpus, args.iterations)
+    print(f"📊 {len(corpus)} réponses x {args.iterations} itérations")
+    print(f"ancien     {legacy_us:.1f} µs/réponse")
+    print(f"nouveau    {current_us:.1f} µs/réponse ({legacy_us / current_us:.2f}x)")
+
+if __name__ == "__main__":
+    main()
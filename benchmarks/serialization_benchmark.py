@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la sérialisation des réponses sur un long historique de session
+
+Rejoue GET /sessions/{id}/messages sur N messages du corpus (1000 par défaut) en
+appel ASGI direct et compare le temps CPU serveur par requête :
+  - revalidé : modèles re-validés par le response_model puis json.dumps (avant)
+  - orjson   : idem, avec FastJSONResponse comme classe de réponse par défaut
+  - construit: model_construct + render(), sans validation (plus lent en pydantic 2 :
+               model_construct s'exécute en Python, la validation en pydantic-core)
+  - rendu    : modèles validés + render(), une seule passe pydantic-core (retenu)
+
+Mesure aussi l'aller-retour d'une ChatResponse (sérialisation serveur puis décodage
+côté client) : texte JSON dans content, décodé deux fois, ou arbre imbriqué
+(X-Accept-Message-Format: tree), décodé une fois.
+
+Usage : python -m benchmarks.serialization_benchmark --messages 1000 --iterations 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from chat_turn import TREE, format_chat_response
+from models import ChatResponse, MessageResponse
+from response_normalizer import normalize_response
+from responses import FastJSONResponse, orjson, render
+
+CORPUS = Path(__file__).parent / "corpus" / "assistant_responses.jsonl"
+
+def build_app(rows: list, mode: str, response_class=JSONResponse) -> FastAPI:
+    """Route calquée sur get_session_messages, les lignes Prisma étant déjà en mémoire"""
+    app = FastAPI(default_response_class=response_class)
+    adapter = TypeAdapter(List[MessageResponse])
+    build = MessageResponse.model_construct if mode == "construit" else MessageResponse
+
+    @app.get("/sessions/{session_id}/messages", response_model=List[MessageResponse])
+    async def messages(session_id: str, response: Response):
+        results = [
+            build(id=row["id"], role=row["role"], content=row["content"], created_at=row["createdAt"])
+            for row in rows
+        ]
+        if mode == "revalidé":
+            return results
+        return render(adapter, results, response)
+
+    return app
+
+async def get(app: FastAPI) -> bytes:
+    """Appel ASGI direct, sans client HTTP : corps de la réponse"""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/sessions/s1/messages", "raw_path": b"/sessions/s1/messages", "query_string": b"",
+        "root_path": "", "server": ("127.0.0.1", 80), "client": ("127.0.0.1", 1234), "headers": [],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return b"".join(message.get("body", b"") for message in messages[1:])
+
+async def measure(app: FastAPI, iterations: int) -> tuple:
+    """(octets du corps, temps CPU serveur moyen en ms)"""
+    body = await get(app)
+    started = time.process_time()
+    for _ in range(iterations):
+        await get(app)
+    return len(body), (time.process_time() - started) / iterations * 1000
+
+async def run(rows: list, args) -> None:
+    cases = [("revalidé", build_app(rows, "revalidé"))]
+    if orjson is not None:
+        cases.append(("orjson", build_app(rows, "revalidé", response_class=FastJSONResponse)))
+    cases.append(("construit", build_app(rows, "construit")))
+    cases.append(("rendu", build_app(rows, "rendu")))
+
+    print(f"📊 Historique de {args.messages} messages, {args.iterations} requêtes par cas")
+    print(f"{'réponse':<12}{'octets':>10}{'CPU/req':>12}{'gain':>8}")
+    baseline = None
+    for label, app in cases:
+        size, cpu = await measure(app, args.iterations)
+        baseline = baseline or cpu
+        print(f"{label:<12}{size:>10}{cpu:>10.2f}ms{baseline / cpu:>7.1f}x")
+    if orjson is None:
+        print("ℹ️  orjson ignoré : paquet orjson non installé")
+
+def chat_round_trip(responses: list, iterations: int) -> None:
+    """Sérialisation serveur + décodage client d'une ChatResponse, par format"""
+    print(f"\n📊 ChatResponse : {len(responses)} réponses du corpus, {iterations} passes")
+    print(f"{'format':<12}{'octets':>10}{'serveur':>12}{'client':>12}")
+    for label, message_format in (("texte", None), ("arbre", TREE)):
+        shaped = [format_chat_response(response, message_format) for response in responses]
+        started = time.process_time()
+        for _ in range(iterations):
+            bodies = [response.model_dump_json() for response in shaped]
+        server = (time.process_time() - started) / iterations / len(shaped) * 1000
+        decoded = 0
+        started = time.process_time()
+        for _ in range(iterations):
+            for body in bodies:
+                payload = json.loads(body)["assistant_response"]
+                # Équivalent du JSON.parse de ChatApp sur content
+                tree = payload["data"] if payload["data"] is not None else json.loads(payload["content"])
+                decoded += len(tree)
+        client = (time.process_time() - started) / iterations / len(shaped) * 1000
+        size = sum(len(body) for body in bodies) // len(bodies)
+        # Les deux formats doivent livrer le même arbre au client
+        assert decoded == iterations * sum(len(response.assistant_response.data) for response in responses)
+        print(f"{label:<12}{size:>10}{server:>10.3f}ms{client:>10.3f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la sérialisation des réponses")
+    parser.add_argument("--messages", type=int, default=1000, help="Messages dans l'historique")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    normalized = [
+        normalize_response(json.loads(line)["content"])
+        for line in CORPUS.read_text(encoding="utf-8").splitlines() if line
+    ]
+    corpus = [response.text for response in normalized]
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"id": f"m{index:06d}", "role": "assistant" if index % 2 else "user",
+         "content": corpus[index % len(corpus)] if index % 2 else "Montre-moi des vestes", "createdAt": now}
+        for index in range(args.messages)
+    ]
+    asyncio.run(run(rows, args))
+
+    user = MessageResponse(id="u", role="user", content="Montre-moi des vestes", created_at=now)
+    chat_round_trip([
+        ChatResponse(message=user, assistant_response=MessageResponse(
+            id="a", role="assistant", content=response.text, created_at=now, data=response.data
+        ))
+        for response in normalized if response.parsed
+    ], args.iterations)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from typing import Any, Dict, List
+from prisma import Prisma
+
+# Champs comparés pour décider si une ligne du cart doit être réécrite
+_ITEM_FIELDS = ("productName", "quantity", "unitPrice", "totalPrice")
+
+class CartRepository:
+    """Accès au cart : lecture et synchronisation par différentiel en une seule transaction"""
+
+    def normalize_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalise un item reçu (format camelCase du useState) en données Prisma"""
+        return {
+            "productId": item.get("productId", ""),
+            "productName": item.get("productName", ""),
+            "quantity": item.get("quantity", 1),
+            "unitPrice": float(item.get("unitPrice", 0)),
+            "totalPrice": float(item.get("totalPrice", 0))
+        }
+
+    async def list_items(self, prisma: Prisma, user_id: str) -> list:
+        """Récupère les items du cart de l'utilisateur"""
+        return await prisma.cartitem.find_many(
+            where={"userId": user_id},
+            order={"createdAt": "asc"}
+        )
+
+    async def version(self, prisma: Prisma, user_id: str) -> tuple:
+        """Version du cart (nombre d'items, dernière modification) en une agrégation, sans lire les lignes"""
+        groups = await prisma.cartitem.group_by(
+            ["userId"],
+            where={"userId": user_id},
+            count=True,
+            max={"updatedAt": True}
+        )
+        if not groups:
+            return (0, None)
+        return (groups[0]["_count"]["_all"], groups[0]["_max"]["updatedAt"])
+
+    async def sync(self, prisma: Prisma, user_id: str, items: List[Dict[str, Any]]) -> bool:
+        """Remplace le cart par les items reçus en n'appliquant que le différentiel"""
+        existing_items = await prisma.cartitem.find_many(where={"userId": user_id})
+        existing_products = {item.productId: item for item in existing_items}
+        received_products = {}
+        for item in items:
+            data = self.normalize_item(item)
+            received_products[data["productId"]] = data
+
+        # Items qui ne sont plus dans le cart reçu
+        items_to_delete = [
+            existing_item.id
+            for product_id, existing_item in existing_products.items()
+            if product_id not in received_products
+        ]
+
+        items_to_create = []
+        items_to_update = []
+        for product_id, data in received_products.items():
+            existing_item = existing_products.get(product_id)
+            if existing_item is None:
+                items_to_create.append({"userId": user_id, **data})
+            elif any(getattr(existing_item, field) != data[field] for field in _ITEM_FIELDS):
+                items_to_update.append(data)
+
+        if not (items_to_delete or items_to_create or items_to_update):
+            return False
+
+        # Toutes les écritures partent en un seul aller-retour transactionnel
+        async with prisma.batch_() as batcher:
+            if items_to_delete:
+                batcher.cartitem.delete_many(where={"id": {"in": items_to_delete}})
+            if items_to_create:
+                batcher.cartitem.create_many(data=items_to_create)
+            for data in items_to_update:
+                fields = {field: data[field] for field in _ITEM_FIELDS}
+                batcher.cartitem.upsert(
+                    where={"userId_productId": {"userId": user_id, "productId": data["productId"]}},
+                    data={
+                        "create": {"userId": user_id, "productId": data["productId"], **fields},
+                        "update": fields
+                    }
+                )
+        return True
+
+# Instance globale du repository
+cart_repository = CartRepository()
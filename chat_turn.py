@@ -0,0 +1,204 @@
+from datetime import datetime, timezone
+from typing import Any, Optional, Tuple
+import asyncio
+import json
+from prisma import Prisma
+from config import settings
+from database import new_id
+from message_codec import message_codec
+from models import ChatResponse, MessageResponse
+from metrics import phase
+from openai_service import openai_service
+from scheduler import run_scheduler
+from session_threads import session_threads
+
+# Format de réponse où l'arbre de composants est imbriqué tel quel dans le JSON
+TREE = "tree"
+
+async def run_chat_turn(prisma: Prisma, session, user_id: str, content: str) -> ChatResponse:
+    """Exécute un tour de chat complet : message utilisateur, run de l'assistant et enregistrement de la réponse"""
+    # Avec la création paresseuse, une session qui a déjà un thread a déjà eu un échange
+    had_thread = settings.lazy_thread_creation and session.openaiThreadId is not None
+    
+    # Thread OpenAI de la session, créé au premier message si besoin
+    with phase("thread_create"):
+        thread_id = await session_threads.ensure(prisma, session)
+    
+    # Un run à la fois par thread, dans la limite globale et le quota de l'utilisateur
+    async with run_scheduler.slot(user_id, thread_id):
+        # Premier tour sans historique : réponse éligible au cache. Décidé dans le créneau du
+        # thread, pour qu'un premier message concurrent sur la session voie celui-ci
+        first_turn = False
+        if settings.response_cache_enabled and not had_thread:
+            first_turn = await prisma.message.find_first(where={"sessionId": session.id}) is None
+        
+        # Sauvegarder le message utilisateur et l'envoyer à OpenAI
+        user_message, openai_message_id, linked = await post_user_message(
+            prisma, session.id, thread_id, content
+        )
+        
+        # Exécuter l'assistant et récupérer la réponse
+        # (phases run_wait, fetch_reply, response_processing et cart_sync mesurées par le service)
+        try:
+            assistant_response, assistant_message_id, suggestion = await openai_service.run_assistant(
+                thread_id,
+                user_id,
+                prompt=content if first_turn else None
+            )
+        except Exception:
+            if not linked:
+                await link_user_message(prisma, user_message.id, openai_message_id)
+            raise
+    
+    with phase("final_writes"):
+        assistant_message = await save_assistant_message(
+            prisma, session.id, assistant_response.text, assistant_message_id,
+            user_link=None if linked else (user_message.id, openai_message_id),
+            data=assistant_response.data
+        )
+    
+    return ChatResponse(
+        message=user_message,
+        assistant_response=assistant_message,
+        suggestion=suggestion
+    )
+
+async def post_user_message(prisma: Prisma, session_id: str, thread_id: str, content: str) -> Tuple[MessageResponse, str, bool]:
+    """Enregistre le message utilisateur et l'ajoute au thread OpenAI
+
+    Avec CHAT_CONCURRENT_IO, l'insertion et l'appel OpenAI partent en parallèle : la ligne
+    est insérée sans son ID OpenAI (linked=False) et le lien est écrit avec la réponse de
+    l'assistant. Si un côté échoue, l'autre est défait avant de relever l'erreur.
+    """
+    message = MessageResponse(
+        id=new_id(),
+        role="user",
+        content=content,
+        created_at=datetime.now(timezone.utc)
+    )
+    
+    if not settings.chat_concurrent_io:
+        with phase("openai_add_message"):
+            openai_message_id = await openai_service.add_message_to_thread(thread_id, content)
+        with phase("message_insert"):
+            await _insert_message(prisma, session_id, message, openai_message_id)
+        return message, openai_message_id, True
+    
+    async def insert() -> None:
+        with phase("message_insert"):
+            await _insert_message(prisma, session_id, message, None)
+    
+    async def add() -> str:
+        with phase("openai_add_message"):
+            return await openai_service.add_message_to_thread(thread_id, content)
+    
+    inserted, openai_message_id = await asyncio.gather(insert(), add(), return_exceptions=True)
+    if not isinstance(inserted, BaseException) and not isinstance(openai_message_id, BaseException):
+        return message, openai_message_id, False
+    
+    # Compensation : ne garder ni ligne sans message OpenAI, ni message OpenAI sans ligne
+    if not isinstance(inserted, BaseException):
+        try:
+            await prisma.message.delete(where={"id": message.id})
+        except Exception as e:
+            print(f"Erreur lors de la suppression du message {message.id}: {e}")
+    if not isinstance(openai_message_id, BaseException):
+        try:
+            await openai_service.delete_message(thread_id, openai_message_id)
+        except Exception as e:
+            print(f"Erreur lors du retrait du message {openai_message_id} du thread: {e}")
+    # L'erreur OpenAI prime : c'est elle que les routes traduisent (429, 503...)
+    raise openai_message_id if isinstance(openai_message_id, BaseException) else inserted
+
+def message_data(session_id: str, message: MessageResponse, openai_message_id: Optional[str]) -> dict:
+    """Ligne Message à insérer pour un message déjà horodaté (contenu compressé selon MESSAGE_COMPRESSION)"""
+    return {
+        "id": message.id,
+        "sessionId": session_id,
+        "role": message.role,
+        **message_codec.fields(message.content),
+        "openaiMessageId": openai_message_id,
+        "createdAt": message.created_at
+    }
+
+async def _insert_message(prisma: Prisma, session_id: str, message: MessageResponse, openai_message_id: Optional[str]) -> None:
+    if openai_message_id is None:
+        await prisma.message.create(data=message_data(session_id, message, None))
+        return
+    # Écriture idempotente : un message OpenAI n'a qu'une ligne (historique en ajout seul)
+    await prisma.message.upsert(
+        where={"openaiMessageId": openai_message_id},
+        data={"create": message_data(session_id, message, openai_message_id), "update": {}}
+    )
+
+async def link_user_message(prisma: Prisma, message_id: str, openai_message_id: str) -> None:
+    """Enregistre l'ID OpenAI d'un message utilisateur quand le tour échoue avant la réponse"""
+    try:
+        await prisma.message.update(
+            where={"id": message_id},
+            data={"openaiMessageId": openai_message_id}
+        )
+    except Exception as e:
+        print(f"Erreur lors de la liaison du message {message_id}: {e}")
+
+async def save_assistant_message(
+    prisma: Prisma,
+    session_id: str,
+    content: str,
+    openai_message_id: str,
+    user_link: Optional[Tuple[str, str]] = None,
+    data: Any = None
+) -> MessageResponse:
+    """Enregistre la réponse de l'assistant et touche la session en un seul aller-retour
+
+    user_link (ID local, ID OpenAI) complète au passage le message utilisateur inséré sans son ID OpenAI ;
+    si le batch échoue, ce lien est écrit seul, sans quoi la synchronisation réimporterait le message.
+    data, l'arbre déjà analysé par le normaliseur, accompagne le message retourné (pas la ligne).
+    """
+    # Le batch ne retourne pas les lignes créées : ID et date sont fixés ici
+    message = MessageResponse(
+        id=new_id(),
+        role="assistant",
+        content=content,
+        created_at=datetime.now(timezone.utc),
+        data=data
+    )
+    try:
+        async with prisma.batch_() as batcher:
+            if user_link is not None:
+                batcher.message.update(
+                    where={"id": user_link[0]},
+                    data={"openaiMessageId": user_link[1]}
+                )
+            batcher.message.upsert(
+                where={"openaiMessageId": openai_message_id},
+                data={"create": message_data(session_id, message, openai_message_id), "update": {}}
+            )
+            batcher.session.update(
+                where={"id": session_id},
+                data={"updatedAt": message.created_at}
+            )
+    except Exception:
+        if user_link is not None:
+            await link_user_message(prisma, *user_link)
+        raise
+    return message
+
+def format_chat_response(response: ChatResponse, message_format: Optional[str]) -> ChatResponse:
+    """Met la réponse de l'assistant au format demandé par X-Accept-Message-Format
+
+    "tree" : arbre de composants dans data et content vide, sans chaîne JSON à re-décoder.
+    Sinon : texte JSON dans content, comme dans l'historique. Une réponse qui n'est pas
+    du JSON reste toujours dans content.
+    """
+    message = response.assistant_response
+    if message.data is None:
+        return response
+    if message_format == TREE:
+        if not message.content:
+            return response
+        update = {"content": ""}
+    else:
+        # Réponse stockée au format arbre (jobs) : texte reconstruit pour les anciens clients
+        update = {"content": message.content or json.dumps(message.data), "data": None}
+    return response.model_copy(update={"assistant_response": message.model_copy(update=update)})
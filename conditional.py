@@ -0,0 +1,40 @@
+from typing import Any, Optional
+import hashlib
+from fastapi import Response
+
+# Suffixes ajoutés à l'ETag par CompressionMiddleware (une représentation par codage)
+_CODING_SUFFIXES = ("-gzip", "-br")
+
+def make_etag(*parts: Any) -> str:
+    """ETag fort dérivé de la version des lignes et des paramètres de la requête"""
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in _CODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """Validateur de If-None-Match qui désigne la représentation courante (None sinon)
+
+    Il est renvoyé tel quel dans la 304 : un client qui a reçu "…-gzip" doit
+    retrouver "…-gzip", pas l'ETag non compressé.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    return next((tag.strip() for tag in if_none_match.split(",") if _opaque(tag) == etag), None)
+
+def not_modified(etag: str) -> Response:
+    """Réponse 304 : le client réutilise sa copie, aucune ligne n'est lue ni sérialisée"""
+    return Response(status_code=304, headers=cache_headers(etag))
+
+def cache_headers(etag: str) -> dict:
+    """En-têtes d'une réponse revalidable (le navigateur renvoie If-None-Match à chaque appel)"""
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
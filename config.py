@@ -6,21 +6,125 @@ class Settings(BaseSettings):
     # OpenAI Configuration
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_assistant_id: str = os.getenv("OPENAI_ASSISTANT_ID", "")
+    openai_base_url: Optional[str] = None  # API compatible (ex. serveur factice des benchmarks)
+    
+    # Thread OpenAI créé au premier message plutôt qu'à la création de la session
+    lazy_thread_creation: bool = True
+    
+    # Insertion du message utilisateur et envoi à OpenAI menés en parallèle
+    chat_concurrent_io: bool = True
+    
+    # Réserve de threads OpenAI pré-créés (0 = création à la demande)
+    thread_pool_size: int = 0
+    thread_pool_low_water: int = 5  # Réalimentation sous ce seuil
+    thread_pool_refill_concurrency: int = 4
+    thread_pool_max_age: float = 86400.0  # Threads inutilisés supprimés après ce délai (s)
+    
+    # Résilience des appels OpenAI (délais en secondes)
+    openai_request_timeout: float = 30.0
+    openai_max_retries: int = 3
+    openai_retry_initial_interval: float = 0.5
+    openai_retry_max_interval: float = 8.0
+    run_timeout: float = 120.0  # Échéance d'un run, annulé au-delà
+    circuit_failure_threshold: int = 5  # Échecs consécutifs avant ouverture (0 = jamais)
+    circuit_reset_timeout: float = 30.0
+    
+    # Attente des runs : "poll" (backoff exponentiel), "sdk" (runs.poll du SDK) ou "stream"
+    run_wait_mode: str = "poll"
+    run_poll_initial_interval: float = 0.1
+    run_poll_max_interval: float = 2.0
+    run_poll_multiplier: float = 1.6
+    run_poll_jitter: float = 0.1
+    
+    # Ordonnancement des runs (0 = illimité ; attente maximale en secondes)
+    run_max_concurrency: int = 32
+    run_max_per_user: int = 2
+    run_max_queue: int = 256
+    run_queue_timeout: float = 30.0
+    
+    # Tours de chat asynchrones (POST .../chat/jobs)
+    job_workers: int = 8  # Tâches de traitement par worker HTTP
+    job_queue_size: int = 1000
+    job_long_poll_max: float = 30.0  # Attente maximale de GET /jobs/{id}?wait=
+    job_retention: float = 3600.0  # Jobs terminés supprimés après ce délai (s)
+    job_max_per_user: int = 4  # Jobs en file ou en cours par utilisateur (0 = illimité)
+    
+    # Réconciliation de l'historique avec les threads OpenAI (0 = désactivée ; secondes)
+    history_sync_interval: float = 600.0
+    history_sync_batch_size: int = 20  # Sessions réconciliées par passage
+    history_sync_grace: float = 300.0  # Messages plus récents ignorés (>= RUN_TIMEOUT)
     
     # JWT Configuration
     secret_key: str = os.getenv("SECRET_KEY", "your-secret-key-change-this")
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    jwt_stateless: bool = False  # Identité lue dans les claims, sans lecture de l'utilisateur
+    
+    # Cache des réponses de l'assistant (premiers tours sans état)
+    response_cache_enabled: bool = False
+    response_cache_size: int = 1000
+    response_cache_ttl: float = 3600.0
+    response_cache_similarity: float = 0.0  # Seuil cosinus (0 = correspondance exacte seule)
+    response_cache_bypass_pattern: str = "panier|cart|commande|checkout|achet|ajout|retir|supprim"
+    catalogue_version: str = ""  # Changer cette valeur invalide le cache des réponses
+    
+    # Cache des clés API
+    api_key_cache_size: int = 10000
+    api_key_cache_ttl: float = 300.0
+    api_key_negative_cache_size: int = 10000
+    api_key_negative_cache_ttl: float = 30.0
     
     # Database
-    database_url: str = "file:./dev.db"
+    database_url: str = "file:./dev.db"  # file:... (SQLite) ou postgresql://...
+    sqlite_wal: bool = True
+    sqlite_busy_timeout: int = 5  # secondes d'attente d'un verrou d'écriture
+    db_pool_size: int = 1
+    db_pool_max_leases_per_client: int = 0  # 0 = illimité
+    expose_db_query_count: bool = False  # En-tête X-DB-Queries sur chaque réponse
+    
+    # Stockage compressé de Message.content
+    message_compression: str = ""  # "" (texte brut), "zlib" ou "zstd" (paquet zstandard)
+    message_compression_min_size: int = 512  # Octets en dessous desquels un message reste en clair
+    
+    # Compression des réponses HTTP (brotli si le paquet est installé, sinon gzip)
+    compression_enabled: bool = True
+    compression_min_size: int = 1024  # Octets en dessous desquels la réponse part en clair
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    
+    # Métriques Prometheus (GET /metrics)
+    metrics_enabled: bool = True
+    # Répertoire partagé pour agréger les workers (fixé par server.py si plusieurs workers)
+    metrics_multiprocess_dir: str = ""
+    metrics_flush_interval: float = 5.0  # Export des valeurs de chaque worker (secondes)
+    
+    # Pagination de l'historique et des sessions (taille par défaut avec un curseur sans limit)
+    page_default_limit: int = 50
+    page_max_limit: int = 200
     
     # API Configuration
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     
+    # Serveur de production (server.py)
+    server_workers: int = 0  # 0 = un worker par CPU disponible
+    server_backlog: int = 2048
+    server_keep_alive: int = 5
+    server_graceful_timeout: int = 30
+    server_limit_concurrency: int = 0  # 0 = illimité
+    server_forwarded_allow_ips: str = "127.0.0.1"
+    server_access_log: bool = False
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
+
+def provider_for_url(url: str) -> str:
+    """Déduit le provider Prisma à partir de l'URL de base de données"""
+    if url.startswith(("postgres://", "postgresql://")):
+        return "postgresql"
+    if url.startswith("file:"):
+        return "sqlite"
+    raise ValueError(f"URL de base de données non supportée: {url}")
\ No newline at end of file
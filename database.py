@@ -0,0 +1,197 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import os
+import secrets
+import time
+from config import settings, provider_for_url
+from prisma import Prisma
+
+# Client Prisma déjà emprunté par la tâche courante (emprunts imbriqués)
+_current_client: ContextVar[Optional[Prisma]] = ContextVar("current_prisma_client", default=None)
+
+class QueryCounter:
+    """Nombre d'allers-retours vers le moteur Prisma pendant une requête HTTP"""
+
+    def __init__(self):
+        self.count = 0
+
+# Compteur de la requête HTTP en cours (partagé avec les tâches filles)
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("prisma_query_counter", default=None)
+
+def track_queries() -> QueryCounter:
+    """Démarre le comptage des requêtes Prisma pour le contexte courant"""
+    counter = QueryCounter()
+    _query_counter.set(counter)
+    return counter
+
+def new_id() -> str:
+    """Identifiant généré côté client (triable par date comme un cuid), pour les écritures en batch"""
+    return f"c{time.time_ns() // 1_000_000:011x}{secrets.token_hex(8)}"
+
+def sqlite_url(url: str) -> str:
+    """Ajoute à une URL SQLite le délai d'attente de verrou s'il est absent"""
+    if "socket_timeout=" in url:
+        return url
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}socket_timeout={settings.sqlite_busy_timeout}"
+
+async def configure_sqlite(client: Prisma) -> None:
+    """Passe SQLite en mode WAL pour les écritures concurrentes
+
+    Seul journal_mode est réglé : il est persistant dans le fichier. Les pragmas propres
+    à une connexion (synchronous...) ne toucheraient qu'une des connexions du moteur Prisma.
+    """
+    if settings.sqlite_wal:
+        # Les lecteurs ne bloquent plus l'écrivain
+        await client.query_raw("PRAGMA journal_mode=WAL")
+
+class PrismaPool:
+    """Pool de clients Prisma partagés par l'application, connectés au démarrage"""
+
+    def __init__(self, size: int = 1, max_leases_per_client: int = 0):
+        self.size = max(1, size)
+        self.max_leases_per_client = max(0, max_leases_per_client)
+        self._clients: List[Prisma] = []
+        self._leases: List[int] = []
+        self._condition: Optional[asyncio.Condition] = None
+        self._connected = False
+        self._pid: Optional[int] = None
+        self.provider: Optional[str] = None
+
+        # Compteurs exposés pour le dimensionnement du pool
+        self.acquisitions = 0
+        self.reuses = 0
+        self.queries = 0
+        self.waits = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    async def connect(self) -> None:
+        """Crée et connecte les clients du pool"""
+        if self._connected and self._pid == os.getpid():
+            return
+        # Clients hérités d'un processus parent (fork) : inutilisables ici, on les abandonne
+        self._connected = False
+        self._pid = os.getpid()
+        self._condition = asyncio.Condition()
+        url = settings.database_url
+        provider = provider_for_url(url)
+        if provider == "sqlite":
+            url = sqlite_url(url)
+        self._clients = [Prisma(datasource={"url": url}) for _ in range(self.size)]
+        self._leases = [0] * self.size
+        await asyncio.gather(*(client.connect() for client in self._clients))
+        for client in self._clients:
+            self._count_queries(client)
+        if provider == "sqlite":
+            await asyncio.gather(*(configure_sqlite(client) for client in self._clients))
+        self.provider = provider
+        self._connected = True
+
+    async def disconnect(self) -> None:
+        """Déconnecte proprement tous les clients du pool"""
+        if not self._connected or self._pid != os.getpid():
+            return
+        self._connected = False
+        clients, self._clients = self._clients, []
+        self._leases = []
+        await asyncio.gather(
+            *(client.disconnect() for client in clients if client.is_connected()),
+            return_exceptions=True
+        )
+
+    def _count_queries(self, client: Prisma) -> None:
+        """Compte chaque aller-retour vers le moteur de requêtes (requêtes simples et batchs)"""
+        engine = client._engine
+        query = engine.query
+
+        async def counted_query(*args, **kwargs):
+            self.queries += 1
+            counter = _query_counter.get()
+            if counter is not None:
+                counter.count += 1
+            return await query(*args, **kwargs)
+
+        engine.query = counted_query
+
+    def _pick_client(self) -> Optional[int]:
+        """Retourne l'index du client le moins chargé, ou None si tous sont saturés"""
+        index = min(range(len(self._clients)), key=self._leases.__getitem__)
+        if self.max_leases_per_client and self._leases[index] >= self.max_leases_per_client:
+            return None
+        return index
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Prisma]:
+        """Emprunte un client du pool pour la durée du bloc"""
+        current = _current_client.get()
+        if current is not None:
+            # La tâche détient déjà un client : on le réutilise sans attendre
+            self.reuses += 1
+            yield current
+            return
+
+        if not self._connected:
+            raise RuntimeError("Le pool Prisma n'est pas connecté")
+
+        started = time.perf_counter()
+        async with self._condition:
+            index = self._pick_client()
+            if index is None:
+                self.waits += 1
+                while index is None:
+                    await self._condition.wait()
+                    index = self._pick_client()
+            self._leases[index] += 1
+        waited = time.perf_counter() - started
+
+        self.acquisitions += 1
+        self.total_wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+
+        client = self._clients[index]
+        token = _current_client.set(client)
+        try:
+            yield client
+        finally:
+            try:
+                _current_client.reset(token)
+            except ValueError:
+                # Sortie depuis un autre contexte (dépendance FastAPI)
+                _current_client.set(None)
+            if self._connected and index < len(self._leases):
+                async with self._condition:
+                    self._leases[index] -= 1
+                    self._condition.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs du pool"""
+        return {
+            "size": self.size,
+            "provider": self.provider,
+            "connected": self._connected,
+            "in_use": sum(self._leases),
+            "acquisitions": self.acquisitions,
+            "reuses": self.reuses,
+            "queries": self.queries,
+            "waits": self.waits,
+            "total_wait_ms": round(self.total_wait_time * 1000, 3),
+            "max_wait_ms": round(self.max_wait_time * 1000, 3),
+        }
+
+async def get_db() -> AsyncIterator[Prisma]:
+    """Dépendance FastAPI fournissant un client Prisma du pool"""
+    async with db_pool.acquire() as prisma:
+        yield prisma
+
+# Instance globale du pool
+db_pool = PrismaPool(
+    size=settings.db_pool_size,
+    max_leases_per_client=settings.db_pool_max_leases_per_client
+)
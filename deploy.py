@@ -85,18 +85,11 @@ def setup_environment():
         print(f"❌ Erreur lors de l'installation des dépendances: {stderr}")
         return False
     
-    # Générer le client Prisma
-    print("🗄️  Génération du client Prisma...")
-    success, _, stderr = run_command("uv run prisma generate")
+    # Générer le client Prisma et créer la base de données (SQLite ou Postgres selon DATABASE_URL)
+    print("🗄️  Génération du client Prisma et création de la base de données...")
+    success, _, stderr = run_command("uv run python setup_database.py")
     if not success:
-        print(f"❌ Erreur lors de la génération Prisma: {stderr}")
-        return False
-    
-    # Créer la base de données
-    print("🗄️  Création de la base de données...")
-    success, _, stderr = run_command("uv run prisma db push")
-    if not success:
-        print(f"❌ Erreur lors de la création de la base: {stderr}")
+        print(f"❌ Erreur lors de la préparation de la base: {stderr}")
         return False
     
     # Installer les dépendances frontend
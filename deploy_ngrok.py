@@ -41,7 +41,7 @@ def start_api_server():
     try:
         # Démarrer le serveur en arrière-plan
         process = subprocess.Popen(
-            ['uv', 'run', 'uvicorn', 'main:app', '--host', '0.0.0.0', '--port', '8000'],
+            ['uv', 'run', 'python', 'server.py', '--host', '0.0.0.0', '--port', '8000'],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
         )
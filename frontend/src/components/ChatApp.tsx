@@ -387,9 +387,10 @@ export const ChatApp: React.FC<ChatAppProps> = ({ className = '' }) => {
       let cartUpdated = false;
       
       // Si pas de composants directs, vérifier si c'est dans une structure avec template
-      if (!componentsToRender && response.assistant_response?.content) {
+      // (arbre déjà analysé avec X-Accept-Message-Format: tree, sinon texte JSON à parser)
+      if (!componentsToRender && (response.assistant_response?.data || response.assistant_response?.content)) {
         try {
-          const parsedContent = JSON.parse(response.assistant_response.content);
+          const parsedContent = response.assistant_response.data ?? JSON.parse(response.assistant_response.content);
           console.log('📋 Contenu parsé:', parsedContent);
           
           // Vérifier si le cart a été mis à jour
@@ -1,5 +1,5 @@
 import { API_BASE_URL } from '../config';
-import type { Session, Message, ChatResponse, Cart } from '../types';
+import type { Session, Message, ChatResponse, ChatJob, Cart } from '../types';
 
 const API_URL = API_BASE_URL;
 
@@ -43,6 +43,27 @@ export const createSession = async (apiKey: string): Promise<Session> => {
 
 export const sendMessage = async (sessionId: string, apiKey: string, content: string): Promise<ChatResponse> => {
   const response = await fetch(`${API_URL}/sessions/${sessionId}/chat`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Authorization': `Bearer ${apiKey}`,
+      'X-Accept-Message-Format': 'tree'
+    },
+    body: JSON.stringify({
+      content
+    })
+  });
+
+  if (!response.ok) {
+    throw new Error(`Erreur lors de l'envoi du message: ${response.statusText}`);
+  }
+
+  return response.json();
+};
+
+// Tour de chat asynchrone : soumission du job puis long-poll jusqu'à sa fin
+export const sendMessageAsJob = async (sessionId: string, apiKey: string, content: string): Promise<ChatResponse> => {
+  const response = await fetch(`${API_URL}/sessions/${sessionId}/chat/jobs`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -57,9 +78,92 @@ export const sendMessage = async (sessionId: string, apiKey: string, content: st
     throw new Error(`Erreur lors de l'envoi du message: ${response.statusText}`);
   }
 
+  const { job_id } = await response.json();
+  for (;;) {
+    const job = await getChatJob(job_id, apiKey, 25);
+    if (job.status === 'succeeded' && job.result) {
+      return job.result;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Erreur lors du chat');
+    }
+  }
+};
+
+export const getChatJob = async (jobId: string, apiKey: string, wait = 0): Promise<ChatJob> => {
+  const response = await fetch(`${API_URL}/jobs/${jobId}?wait=${wait}`, {
+    headers: {
+      'Authorization': `Bearer ${apiKey}`,
+      'X-Accept-Message-Format': 'tree'
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error(`Erreur lors de la récupération du job: ${response.statusText}`);
+  }
+
   return response.json();
 };
 
+export const sendMessageStream = async (
+  sessionId: string,
+  apiKey: string,
+  content: string,
+  onDelta: (text: string) => void
+): Promise<ChatResponse> => {
+  const response = await fetch(`${API_URL}/sessions/${sessionId}/chat/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+      'Authorization': `Bearer ${apiKey}`,
+      'X-Accept-Message-Format': 'tree'
+    },
+    body: JSON.stringify({
+      content
+    })
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Erreur lors de l'envoi du message: ${response.statusText}`);
+  }
+
+  // Lecture du flux Server-Sent Events événement par événement
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let separator = buffer.indexOf('\n\n');
+    while (separator !== -1) {
+      const rawEvent = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+      separator = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+
+      if (event === 'delta') {
+        onDelta(JSON.parse(data).text);
+      } else if (event === 'done') {
+        return JSON.parse(data);
+      } else if (event === 'error') {
+        throw new Error(JSON.parse(data).detail);
+      }
+    }
+  }
+
+  throw new Error('Flux interrompu avant la fin de la réponse');
+};
+
 export const getMessages = async (sessionId: string, apiKey: string): Promise<Message[]> => {
   const response = await fetch(`${API_URL}/sessions/${sessionId}/messages`, {
     headers: {
@@ -74,6 +178,34 @@ export const getMessages = async (sessionId: string, apiKey: string): Promise<Me
   return response.json();
 };
 
+export const getMessagesPage = async (
+  sessionId: string,
+  apiKey: string,
+  options: { before?: string; after?: string; limit?: number } = {}
+): Promise<{ messages: Message[]; olderCursor: string | null; newerCursor: string | null }> => {
+  const params = new URLSearchParams();
+  if (options.before) params.set('before', options.before);
+  if (options.after) params.set('after', options.after);
+  if (options.limit) params.set('limit', String(options.limit));
+
+  const response = await fetch(`${API_URL}/sessions/${sessionId}/messages?${params}`, {
+    headers: {
+      'Authorization': `Bearer ${apiKey}`
+    }
+  });
+
+  if (!response.ok) {
+    throw new Error(`Erreur lors de la récupération des messages: ${response.statusText}`);
+  }
+
+  // Curseurs pour charger l'historique plus ancien ou plus récent à la demande
+  return {
+    messages: await response.json(),
+    olderCursor: response.headers.get('X-Cursor-Before'),
+    newerCursor: response.headers.get('X-Cursor-After')
+  };
+};
+
 export const getCart = async (apiKey: string): Promise<Cart> => {
   const response = await fetch(`${API_URL}/cart`, {
     headers: {
@@ -7,7 +7,7 @@ export interface User {
 export interface Session {
   id: string;
   title: string;
-  openai_thread_id: string;
+  openai_thread_id: string | null;
   created_at: string;
   updated_at: string;
 }
@@ -17,6 +17,8 @@ export interface Message {
   role: 'user' | 'assistant';
   content: string;
   created_at: string;
+  encoding?: string | null;  // Octets compressés en base64 (X-Accept-Message-Encoding)
+  data?: any;  // Arbre de composants déjà analysé (X-Accept-Message-Format: tree), content vide
 }
 
 export interface ChatResponse {
@@ -26,6 +28,16 @@ export interface ChatResponse {
   suggestion?: string;
 }
 
+export interface ChatJob {
+  id: string;
+  session_id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  result?: ChatResponse | null;
+  error?: string | null;
+  created_at: string;
+  updated_at: string;
+}
+
 // Types pour les composants
 export type ComponentType = 
   | 'Button' | 'Card' | 'Text' | 'Heading' | 'Image' | 'Input'
@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+import asyncio
+import openai
+from prisma import Prisma
+from config import settings
+from database import db_pool, new_id
+from message_codec import message_codec
+from metrics import history_sync_imported
+from openai_service import openai_service, openai_resilience
+from response_normalizer import normalize_response
+import leases
+
+# Messages lus par appel OpenAI (maximum de l'API)
+PAGE_SIZE = 100
+
+# Un seul worker réconcilie à la fois : celui qui détient ce bail
+LEASE = "history_sync"
+
+class HistorySync:
+    """Réconciliation en tâche de fond de la table Message avec les threads OpenAI
+
+    La table Message fait foi et les lectures d'historique n'appellent jamais OpenAI.
+    Ce job importe seulement les messages d'un thread absents de la base (tour
+    interrompu entre l'envoi à OpenAI et l'écriture locale). Chaque worker lance la
+    tâche, mais seul le détenteur du bail "history_sync" réconcilie. Ses appels ont
+    leur propre coupe-circuit, distinct de celui du chat.
+    """
+
+    def __init__(self, interval: float = 600.0, batch_size: int = 20, grace: float = 300.0):
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        # Messages plus récents ignorés : leur tour peut encore être en train de les écrire
+        self.grace = grace
+        self._cursor = ""
+        self._task: Optional[asyncio.Task] = None
+        self.resilience = openai_resilience("history_sync")
+
+        # Compteurs exposés sur /health
+        self.passes = 0
+        self.skipped = 0
+        self.sessions = 0
+        self.imported = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    async def start(self) -> None:
+        """Lance la réconciliation périodique (une tâche par worker, un seul actif grâce au bail)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrête la réconciliation"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Le bail est rendu pour qu'un autre worker reprenne sans attendre son expiration
+        try:
+            async with db_pool.acquire() as prisma:
+                await leases.release(prisma, LEASE)
+        except Exception as e:
+            print(f"Erreur lors de la libération du bail de réconciliation: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with db_pool.acquire() as prisma:
+                    # Bail valable deux passages : un détenteur arrêté est remplacé au plus tard après 2 intervalles
+                    leader = await leases.acquire(prisma, LEASE, self.interval * 2)
+                if not leader:
+                    self.skipped += 1
+                    continue
+                await self.sync_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Erreur lors de la réconciliation de l'historique: {e}")
+
+    async def sync_once(self) -> int:
+        """Réconcilie le lot de sessions suivant (parcours circulaire par ID) ; retourne le nombre de messages importés"""
+        imported = 0
+        async with db_pool.acquire() as prisma:
+            sessions = await prisma.session.find_many(
+                where={"id": {"gt": self._cursor}, "openaiThreadId": {"not": None}},
+                order={"id": "asc"},
+                take=self.batch_size
+            )
+            # Fin du parcours : le prochain lot repart de la première session
+            self._cursor = sessions[-1].id if len(sessions) == self.batch_size else ""
+            for session in sessions:
+                try:
+                    imported += await self._sync_session(prisma, session)
+                except openai.NotFoundError:
+                    # Thread supprimé côté OpenAI : rien à réconcilier
+                    continue
+                self.sessions += 1
+        self.passes += 1
+        return imported
+
+    async def _sync_session(self, prisma: Prisma, session) -> int:
+        known = {
+            message.openaiMessageId
+            for message in await prisma.message.find_many(
+                where={"sessionId": session.id, "openaiMessageId": {"not": None}}
+            )
+        }
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace)
+        imported = 0
+        after = None
+        while True:
+            page = await openai_service.list_thread_messages(
+                session.openaiThreadId, after=after, limit=PAGE_SIZE, resilience=self.resilience
+            )
+            for message in page:
+                created_at = datetime.fromtimestamp(message["created_at"], timezone.utc)
+                if message["id"] in known or created_at > cutoff:
+                    continue
+                content = message["content"]
+                if message["role"] == "assistant":
+                    # Même texte que celui enregistré par le tour, sans ses effets de bord (cart)
+                    content = normalize_response(content).text
+                # Écriture idempotente : plusieurs workers peuvent réconcilier la même session
+                await prisma.message.upsert(
+                    where={"openaiMessageId": message["id"]},
+                    data={
+                        "create": {
+                            "id": new_id(),
+                            "sessionId": session.id,
+                            "role": message["role"],
+                            **message_codec.fields(content),
+                            "openaiMessageId": message["id"],
+                            "createdAt": created_at
+                        },
+                        "update": {}
+                    }
+                )
+                imported += 1
+            if len(page) < PAGE_SIZE:
+                break
+            after = page[-1]["id"]
+        if imported:
+            self.imported += imported
+            history_sync_imported.inc(imported)
+        return imported
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs de la réconciliation"""
+        return {
+            "enabled": self.enabled,
+            "passes": self.passes,
+            "skipped": self.skipped,
+            "sessions": self.sessions,
+            "imported": self.imported,
+            "errors": self.errors,
+            "resilience": self.resilience.stats(),
+        }
+
+# Instance globale de la réconciliation de l'historique
+history_sync = HistorySync(
+    interval=settings.history_sync_interval,
+    batch_size=settings.history_sync_batch_size,
+    grace=settings.history_sync_grace
+)
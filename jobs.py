@@ -0,0 +1,280 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import asyncio
+import secrets
+from prisma import Prisma
+from config import settings
+from database import db_pool
+from chat_turn import run_chat_turn, format_chat_response, TREE
+import leases
+from scheduler import SchedulerBusy
+from metrics import job_queue_depth, job_duration, jobs_total
+
+FINISHED = ("succeeded", "failed")
+PENDING = ("queued", "running")
+
+# Bail de ce processus : tant qu'il est valide, ses jobs en file ou en cours sont vivants
+WORKER_LEASE = f"jobs:{leases.WORKER_ID}"
+WORKER_LEASE_TTL = 180.0
+
+# Soumissions d'un utilisateur sérialisées entre workers : comptage et création sous ce bail
+SUBMIT_LEASE_TTL = 10.0
+SUBMIT_LEASE_WAIT = 1.0
+
+class JobQueueFull(Exception):
+    """File des jobs pleine, ou quota de l'utilisateur atteint ; le client doit réessayer plus tard"""
+
+    def __init__(self, retry_after: int, reason: str = "File des jobs pleine"):
+        super().__init__(f"{reason}, réessayez dans {retry_after}s")
+        self.retry_after = retry_after
+
+class JobQueue:
+    """Tours de chat exécutés en tâche de fond ; l'état des jobs est persisté dans ChatJob"""
+
+    def __init__(self, workers: int = 8, maxsize: int = 1000, retention: float = 3600.0, max_per_user: int = 0):
+        self.workers = max(1, workers)
+        self.maxsize = max(0, maxsize)
+        self.retention = retention
+        self.max_per_user = max(0, max_per_user)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Jobs refusés par l'ordonnanceur, remis en file après leur Retry-After
+        self._delayed: Dict[str, asyncio.TimerHandle] = {}
+        # Jobs traités par ce worker : événement déclenché à chaque changement d'état
+        self._events: Dict[str, asyncio.Event] = {}
+
+        # Compteurs exposés pour le dimensionnement
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.requeued = 0
+        self.recovered = 0
+
+    async def start(self) -> None:
+        """Lance les tâches de traitement et de purge (une série par worker HTTP)"""
+        if self._tasks:
+            return
+        # Bail pris avant d'accepter des jobs, puis reprise des jobs de processus disparus
+        async with db_pool.acquire() as prisma:
+            await leases.acquire(prisma, WORKER_LEASE, WORKER_LEASE_TTL)
+            await self._recover_orphans(prisma)
+        # File non bornée : la limite JOB_QUEUE_SIZE est appliquée à la soumission
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_periodically()))
+
+    async def stop(self) -> None:
+        """Arrête les tâches ; les jobs non terminés sont marqués en échec"""
+        if not self._tasks:
+            return
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for job_id, handle in self._delayed.items():
+            handle.cancel()
+            pending.append(job_id)
+        self._delayed.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        async with db_pool.acquire() as prisma:
+            if pending:
+                await prisma.chatjob.update_many(
+                    where={"id": {"in": pending}},
+                    data={"status": "failed", "error": "Interrompu par l'arrêt du serveur"}
+                )
+            await leases.release(prisma, WORKER_LEASE)
+
+    async def submit(self, prisma: Prisma, user_id: str, session_id: str, content: str):
+        """Enregistre un job et le place dans la file"""
+        if self._queue is None or (self.maxsize and self._queue.qsize() + len(self._delayed) >= self.maxsize):
+            raise JobQueueFull(retry_after=5)
+        if self.max_per_user:
+            job = await self._create_within_quota(prisma, user_id, session_id, content)
+        else:
+            job = await self._create(prisma, user_id, session_id, content)
+        self._events[job.id] = asyncio.Event()
+        self._queue.put_nowait(job.id)
+        self.submitted += 1
+        job_queue_depth.set(self._queue.qsize())
+        return job
+
+    async def _create(self, prisma: Prisma, user_id: str, session_id: str, content: str):
+        return await prisma.chatjob.create(
+            data={
+                "userId": user_id,
+                "sessionId": session_id,
+                "status": "queued",
+                "content": content,
+                "worker": leases.WORKER_ID
+            }
+        )
+
+    async def _create_within_quota(self, prisma: Prisma, user_id: str, session_id: str, content: str):
+        """Crée le job si l'utilisateur est sous son quota, compté en base pour tous les workers
+
+        Le comptage et la création ont lieu sous un bail propre à l'utilisateur : deux
+        soumissions simultanées, même sur deux workers, ne peuvent pas dépasser le quota.
+        """
+        name = f"jobs-submit:{user_id}"
+        holder = f"{leases.WORKER_ID}:{secrets.token_hex(4)}"
+        deadline = asyncio.get_running_loop().time() + SUBMIT_LEASE_WAIT
+        while not await leases.acquire(prisma, name, SUBMIT_LEASE_TTL, holder=holder):
+            if asyncio.get_running_loop().time() >= deadline:
+                raise JobQueueFull(retry_after=1, reason="Soumission concurrente en cours pour cet utilisateur")
+            await asyncio.sleep(0.02)
+        try:
+            pending = await prisma.chatjob.count(where={"userId": user_id, "status": {"in": list(PENDING)}})
+            if pending >= self.max_per_user:
+                raise JobQueueFull(retry_after=5, reason="Trop de jobs en attente pour cet utilisateur")
+            return await self._create(prisma, user_id, session_id, content)
+        finally:
+            await leases.release(prisma, name, holder=holder)
+
+    async def get(self, prisma: Prisma, job_id: str, user_id: str):
+        """Retourne le job s'il appartient à l'utilisateur"""
+        return await prisma.chatjob.find_first(where={"id": job_id, "userId": user_id})
+
+    async def wait_for_change(self, job_id: str, timeout: float) -> None:
+        """Attend un changement d'état du job, au plus timeout secondes"""
+        event = self._events.get(job_id)
+        if event is None:
+            # Job traité par un autre worker : relecture périodique
+            await asyncio.sleep(min(timeout, 1.0))
+            return
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except TimeoutError:
+            pass
+
+    async def wait(self, prisma: Prisma, job_id: str, user_id: str, timeout: float):
+        """Long-poll : retourne le job dès qu'il est terminé, ou à l'expiration du délai"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            job = await self.get(prisma, job_id, user_id)
+            remaining = deadline - asyncio.get_running_loop().time()
+            if job is None or job.status in FINISHED or remaining <= 0:
+                return job
+            await self.wait_for_change(job_id, remaining)
+
+    def _notify(self, job_id: str, finished: bool = False) -> None:
+        event = self._events.pop(job_id, None) if finished else self._events.get(job_id)
+        if event is not None:
+            event.set()
+            if not finished:
+                self._events[job_id] = asyncio.Event()
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job_queue_depth.set(self._queue.qsize())
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                print(f"Erreur lors du traitement du job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str) -> None:
+        async with db_pool.acquire() as prisma:
+            job = await prisma.chatjob.update(where={"id": job_id}, data={"status": "running"})
+            self._notify(job_id)
+            try:
+                session = await prisma.session.find_unique(where={"id": job.sessionId})
+                if session is None:
+                    raise Exception("Session non trouvée")
+                response = await run_chat_turn(prisma, session, job.userId, job.content)
+            except SchedulerBusy as e:
+                # Le job attend son tour hors des tâches de traitement, qui restent aux autres utilisateurs
+                await prisma.chatjob.update(where={"id": job_id}, data={"status": "queued"})
+                self._notify(job_id)
+                self._requeue_later(job_id, e.retry_after)
+                return
+            except asyncio.CancelledError:
+                await prisma.chatjob.update(
+                    where={"id": job_id},
+                    data={"status": "failed", "error": "Interrompu par l'arrêt du serveur"}
+                )
+                self._notify(job_id, finished=True)
+                raise
+            except Exception as e:
+                await prisma.chatjob.update(
+                    where={"id": job_id},
+                    data={"status": "failed", "error": f"Erreur lors du chat: {str(e)}"}
+                )
+                self.failed += 1
+                status = "failed"
+            else:
+                await prisma.chatjob.update(
+                    where={"id": job_id},
+                    # Stockée au format arbre : l'arbre de composants n'est pas dupliqué en texte
+                    data={"status": "succeeded", "result": format_chat_response(response, TREE).model_dump_json()}
+                )
+                self.succeeded += 1
+                status = "succeeded"
+        jobs_total.inc(status=status)
+        job_duration.observe((datetime.now(timezone.utc) - job.createdAt).total_seconds())
+        self._notify(job_id, finished=True)
+
+    def _requeue_later(self, job_id: str, delay: float) -> None:
+        def requeue() -> None:
+            del self._delayed[job_id]
+            self._queue.put_nowait(job_id)
+            job_queue_depth.set(self._queue.qsize())
+
+        self._delayed[job_id] = asyncio.get_running_loop().call_later(delay, requeue)
+        self.requeued += 1
+
+    async def _recover_orphans(self, prisma: Prisma) -> None:
+        """Marque en échec les jobs en file ou en cours dont le processus n'a plus de bail"""
+        alive = [name.removeprefix("jobs:") for name in await leases.live(prisma, "jobs:")]
+        recovered = await prisma.chatjob.update_many(
+            where={
+                "status": {"in": list(PENDING)},
+                "OR": [{"worker": None}, {"worker": {"not_in": alive}}]
+            },
+            data={"status": "failed", "error": "Interrompu par l'arrêt du serveur"}
+        )
+        if recovered:
+            print(f"🧹 {recovered} job(s) d'un processus arrêté marqué(s) en échec")
+            self.recovered += recovered
+
+    async def _purge_periodically(self) -> None:
+        """Prolonge le bail du processus, reprend les jobs orphelins et supprime les jobs terminés"""
+        while True:
+            await asyncio.sleep(60)
+            try:
+                async with db_pool.acquire() as prisma:
+                    await leases.acquire(prisma, WORKER_LEASE, WORKER_LEASE_TTL)
+                    await self._recover_orphans(prisma)
+                    await prisma.chatjob.delete_many(
+                        where={
+                            "status": {"in": list(FINISHED)},
+                            "updatedAt": {"lt": datetime.now(timezone.utc) - timedelta(seconds=self.retention)}
+                        }
+                    )
+            except Exception as e:
+                print(f"Erreur lors de la purge des jobs: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs de la file"""
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "delayed": len(self._delayed),
+            "max_per_user": self.max_per_user,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "requeued": self.requeued,
+            "recovered": self.recovered,
+        }
+
+# Instance globale de la file des jobs
+job_queue = JobQueue(
+    workers=settings.job_workers,
+    maxsize=settings.job_queue_size,
+    retention=settings.job_retention,
+    max_per_user=settings.job_max_per_user
+)
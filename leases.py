@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+from typing import List
+import os
+import secrets
+import socket
+from prisma import Prisma
+from prisma.errors import UniqueViolationError
+
+# Identité de ce processus : les workers uvicorn se partagent la base, pas la mémoire
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+async def acquire(prisma: Prisma, name: str, ttl: float, holder: str = WORKER_ID) -> bool:
+    """Prend ou prolonge le bail name pour ttl secondes ; False s'il est détenu par un autre processus"""
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=ttl)
+    # Prolongation par le détenteur, ou reprise d'un bail expiré, en une écriture conditionnelle
+    taken = await prisma.lease.update_many(
+        where={"name": name, "OR": [{"holder": holder}, {"expiresAt": {"lt": now}}]},
+        data={"holder": holder, "expiresAt": expires_at}
+    )
+    if taken:
+        return True
+    try:
+        await prisma.lease.create(data={"name": name, "holder": holder, "expiresAt": expires_at})
+    except UniqueViolationError:
+        return False
+    return True
+
+async def release(prisma: Prisma, name: str, holder: str = WORKER_ID) -> None:
+    """Rend le bail s'il est encore détenu par ce processus"""
+    await prisma.lease.delete_many(where={"name": name, "holder": holder})
+
+async def live(prisma: Prisma, prefix: str) -> List[str]:
+    """Noms des baux non expirés qui commencent par prefix"""
+    leases = await prisma.lease.find_many(
+        where={"name": {"startswith": prefix}, "expiresAt": {"gt": datetime.now(timezone.utc)}}
+    )
+    return [lease.name for lease in leases]
@@ -1,7 +1,9 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request, Header
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timedelta
 from typing import Optional, List
+import json
 import uvicorn
 from dotenv import load_dotenv
 
@@ -12,18 +14,46 @@ from config import settings
 from models import (
     UserCreate, UserResponse, ApiKeyResponse, SessionCreate, SessionResponse,
     MessageCreate, MessageResponse, ChatResponse, ErrorResponse, HealthResponse,
-    CartItemCreate, CartItemResponse, CartResponse, CartUpdateRequest
+    CartItemCreate, CartItemResponse, CartResponse, CartUpdateRequest,
+    JobAccepted, JobResponse
 )
-from auth import generate_api_key, create_access_token, get_current_user, verify_api_key
+from auth import (
+    generate_api_key, create_access_token, get_current_user, verify_api_key,
+    invalidate_api_key, api_key_cache_stats, user_token_claims, revoke_token,
+    verify_token, security
+)
+from fastapi.security import HTTPAuthorizationCredentials
 from openai_service import openai_service
+from thread_pool import thread_pool
+from session_threads import session_threads
+from scheduler import run_scheduler, SchedulerBusy
+from chat_turn import run_chat_turn, post_user_message, link_user_message, save_assistant_message, format_chat_response
+from jobs import job_queue, JobQueueFull, FINISHED
+from history_sync import history_sync
+from message_codec import message_codec, DICTIONARIES
+from resilience import CircuitOpen, RunTimeout
+from database import db_pool, get_db
+from cart_repository import cart_repository
+from pagination import paginate
+from middleware import QueryCountMiddleware, MetricsMiddleware, CompressionMiddleware
+from conditional import make_etag, matching_etag, not_modified, cache_headers
+from responses import FastJSONResponse, render
+from pydantic import TypeAdapter
+from metrics import shared_metrics, phase, db_pool_gauge, cache_gauge
 from prisma import Prisma
 
 app = FastAPI(
     title="Rasa Fraym API Proxy",
     description="API Proxy entre l'application web et OpenAI Assistant API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
+# Sérialiseurs des réponses volumineuses : une passe pydantic-core, sans re-validation du response_model
+_session_list = TypeAdapter(List[SessionResponse])
+_message_list = TypeAdapter(List[MessageResponse])
+_cart = TypeAdapter(CartResponse)
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,30 +61,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cursor-Before", "X-Cursor-After", "X-DB-Queries", "Retry-After", "ETag"],
 )
 
+# Nombre de requêtes Prisma par requête HTTP (benchmarks)
+if settings.expose_db_query_count:
+    app.add_middleware(QueryCountMiddleware)
+
+# Compression gzip/brotli des réponses complètes au-delà du seuil
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality
+    )
+
+# Durée des requêtes par route et requêtes en cours (GET /metrics)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # Initialisation de la base de données
 @app.on_event("startup")
 async def startup():
-    prisma = Prisma()
-    await prisma.connect()
-    print("Base de données connectée")
+    await db_pool.connect()
+    print(f"Base de données connectée (pool de {db_pool.size} client(s))")
+    await thread_pool.start()
+    await job_queue.start()
+    await history_sync.start()
+    if settings.metrics_enabled:
+        await shared_metrics.start(collect=_collect_gauges)
 
 @app.on_event("shutdown")
 async def shutdown():
-    prisma = Prisma()
-    await prisma.disconnect()
+    await shared_metrics.stop()
+    await history_sync.stop()
+    await job_queue.stop()
+    await thread_pool.stop()
+    await openai_service.close()
+    await db_pool.disconnect()
     print("Base de données déconnectée")
 
 # Routes d'authentification
 @app.post("/auth/auto-register", response_model=ApiKeyResponse)
-async def auto_register_user(request: Request):
+async def auto_register_user(request: Request, prisma: Prisma = Depends(get_db)):
     """Enregistrement automatique basé sur l'adresse IP"""
     client_ip = request.client.host
     
-    prisma = Prisma()
-    await prisma.connect()
-    
     try:
         # Vérifier si un utilisateur existe déjà pour cette IP
         existing_user = await prisma.user.find_first(
@@ -82,6 +135,7 @@ async def auto_register_user(request: Request):
                 "apiKey": api_key
             }
         )
+        invalidate_api_key(api_key)
         
         return ApiKeyResponse(
             api_key=api_key,
@@ -95,34 +149,28 @@ async def auto_register_user(request: Request):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'enregistrement automatique: {str(e)}")
-    finally:
-        await prisma.disconnect()
 
 @app.post("/auth/register", response_model=ApiKeyResponse)
-async def register_user(user_data: UserCreate):
+async def register_user(user_data: UserCreate, prisma: Prisma = Depends(get_db)):
     """Enregistre un nouvel utilisateur et génère une clé API"""
-    prisma = Prisma()
-    await prisma.connect()
-    try:
-        api_key = generate_api_key()
-        user = await prisma.user.create(
-            data={
-                "apiKey": api_key,
-                "name": user_data.name,
-                "email": user_data.email
-            }
-        )
-        return ApiKeyResponse(
-            api_key=api_key,
-            user=UserResponse(
-                id=user.id,
-                name=user.name,
-                email=user.email,
-                created_at=user.createdAt
-            )
+    api_key = generate_api_key()
+    user = await prisma.user.create(
+        data={
+            "apiKey": api_key,
+            "name": user_data.name,
+            "email": user_data.email
+        }
+    )
+    invalidate_api_key(api_key)
+    return ApiKeyResponse(
+        api_key=api_key,
+        user=UserResponse(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            created_at=user.createdAt
         )
-    finally:
-        await prisma.disconnect()
+    )
 
 @app.post("/auth/login")
 async def login(api_key: str = Header(..., alias="X-API-Key")):
@@ -130,15 +178,23 @@ async def login(api_key: str = Header(..., alias="X-API-Key")):
     user = await verify_api_key(api_key)
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user.id}, expires_delta=access_token_expires
+        data=user_token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.post("/auth/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Révoque le token JWT courant jusqu'à son expiration"""
+    payload = verify_token(credentials.credentials)
+    await revoke_token(payload)
+    return {"revoked": True}
+
 # Routes de gestion des sessions
 @app.post("/sessions", response_model=SessionResponse)
 async def create_session(
     session_data: SessionCreate,
-    api_key: str = Header(..., alias="Authorization")
+    api_key: str = Header(..., alias="Authorization"),
+    prisma: Prisma = Depends(get_db)
 ):
     """Crée une nouvelle session de chat"""
     # Extraire la clé API du header Authorization (format: "Bearer <api_key>")
@@ -148,59 +204,74 @@ async def create_session(
     actual_api_key = api_key.replace("Bearer ", "")
     current_user = await verify_api_key(actual_api_key)
     
-    # Créer un thread OpenAI
-    thread_id = await openai_service.create_thread()
+    # Thread OpenAI pré-créé par la réserve, créé à la demande, ou au premier message
+    thread_id = None if settings.lazy_thread_creation else await thread_pool.acquire()
     
-    prisma = Prisma()
-    await prisma.connect()
-    try:
-        session = await prisma.session.create(
-            data={
-                "userId": current_user.id,
-                "openaiThreadId": thread_id,
-                "openaiAssistantId": settings.openai_assistant_id,
-                "title": session_data.title or f"Session {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            }
-        )
-        return SessionResponse(
+    session = await prisma.session.create(
+        data={
+            "userId": current_user.id,
+            "openaiThreadId": thread_id,
+            "openaiAssistantId": settings.openai_assistant_id,
+            "title": session_data.title or f"Session {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        }
+    )
+    return SessionResponse(
+        id=session.id,
+        title=session.title,
+        openai_thread_id=session.openaiThreadId,
+        created_at=session.createdAt,
+        updated_at=session.updatedAt
+    )
+
+@app.get("/sessions", response_model=List[SessionResponse])
+async def get_user_sessions(
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.page_max_limit),
+    current_user = Depends(get_current_user),
+    prisma: Prisma = Depends(get_db)
+):
+    """Récupère les sessions de l'utilisateur, de la plus récente à la plus ancienne"""
+    page = await paginate(
+        prisma.session,
+        where={"userId": current_user.id},
+        order=[{"updatedAt": "desc"}, {"id": "desc"}],
+        limit=limit,
+        before=before,
+        after=after
+    )
+    page.apply_headers(response)
+    sessions = page.items
+    return render(_session_list, [
+        SessionResponse(
             id=session.id,
             title=session.title,
             openai_thread_id=session.openaiThreadId,
             created_at=session.createdAt,
             updated_at=session.updatedAt
         )
-    finally:
-        await prisma.disconnect()
-
-@app.get("/sessions", response_model=List[SessionResponse])
-async def get_user_sessions(current_user = Depends(get_current_user)):
-    """Récupère toutes les sessions de l'utilisateur"""
-    prisma = Prisma()
-    await prisma.connect()
-    try:
-        sessions = await prisma.session.find_many(
-            where={"userId": current_user.id},
-            order={"updatedAt": "desc"}
-        )
-        return [
-            SessionResponse(
-                id=session.id,
-                title=session.title,
-                openai_thread_id=session.openaiThreadId,
-                created_at=session.createdAt,
-                updated_at=session.updatedAt
-            )
-            for session in sessions
-        ]
-    finally:
-        await prisma.disconnect()
+        for session in sessions
+    ], response)
 
 @app.get("/sessions/{session_id}/messages", response_model=List[MessageResponse])
 async def get_session_messages(
     session_id: str,
-    api_key: str = Header(..., alias="Authorization")
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.page_max_limit),
+    accept_message_encoding: Optional[str] = Header(None, alias="X-Accept-Message-Encoding"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    api_key: str = Header(..., alias="Authorization"),
+    prisma: Prisma = Depends(get_db)
 ):
-    """Récupère les messages d'une session"""
+    """Récupère les messages d'une session, en ordre chronologique (tout l'historique sans pagination)
+
+    Les messages compressés sont décodés, sauf si le client annonce savoir décoder leur
+    encodage (X-Accept-Message-Encoding: zlib+d1, ...) : ils sont alors envoyés tels que
+    stockés, en base64, avec leur encodage. Un historique inchangé répond 304 (If-None-Match).
+    """
     # Extraire la clé API du header Authorization (format: "Bearer <api_key>")
     if not api_key.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Format d'autorisation invalide")
@@ -208,127 +279,331 @@ async def get_session_messages(
     actual_api_key = api_key.replace("Bearer ", "")
     current_user = await verify_api_key(actual_api_key)
     
-    prisma = Prisma()
-    await prisma.connect()
-    try:
-        session = await prisma.session.find_first(
-            where={"id": session_id, "userId": current_user.id}
-        )
-        if not session:
-            raise HTTPException(status_code=404, detail="Session non trouvée")
-        
-        messages = await prisma.message.find_many(
-            where={"sessionId": session_id},
-            order={"createdAt": "asc"}
-        )
-        
-        return [
-            MessageResponse(
-                id=message.id,
-                role=message.role,
-                content=message.content,
-                created_at=message.createdAt
-            )
-            for message in messages
-        ]
-    finally:
-        await prisma.disconnect()
+    session = await prisma.session.find_first(
+        where={"id": session_id, "userId": current_user.id}
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    # Historique en ajout seul : nombre de messages et date du dernier suffisent à le versionner
+    accepted = {item.strip() for item in (accept_message_encoding or "").split(",") if item.strip()}
+    version = await prisma.message.group_by(
+        ["sessionId"],
+        where={"sessionId": session_id},
+        count=True,
+        max={"createdAt": True}
+    )
+    etag = make_etag("messages", session_id, version, before, after, limit, sorted(accepted))
+    validator = matching_etag(if_none_match, etag)
+    if validator:
+        return not_modified(validator)
+    
+    page = await paginate(
+        prisma.message,
+        where={"sessionId": session_id},
+        order=[{"createdAt": "asc"}, {"id": "asc"}],
+        limit=limit,
+        before=before,
+        after=after,
+        from_end=True
+    )
+    page.apply_headers(response)
+    messages = page.items
+    response.headers["Vary"] = "X-Accept-Message-Encoding"
+    response.headers.update(cache_headers(etag))
+    
+    results = []
+    for message in messages:
+        stored = message_codec.passthrough(message, accepted)
+        results.append(MessageResponse(
+            id=message.id,
+            role=message.role,
+            content=stored[1] if stored else message_codec.content_of(message),
+            created_at=message.createdAt,
+            encoding=stored[0] if stored else None
+        ))
+    return render(_message_list, results, response)
+
+@app.get("/messages/dictionaries/{version}", include_in_schema=False)
+async def get_message_dictionary(version: int):
+    """Dictionnaire de compression des messages, pour les clients qui décodent eux-mêmes"""
+    dictionary = DICTIONARIES.get(version)
+    if dictionary is None:
+        raise HTTPException(status_code=404, detail="Dictionnaire inconnu")
+    # Une version publiée ne change jamais
+    return Response(
+        content=dictionary,
+        media_type="application/octet-stream",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
 
 # Route principale de chat
 @app.post("/sessions/{session_id}/chat", response_model=ChatResponse)
 async def chat(
     session_id: str,
     message_data: MessageCreate,
-    api_key: str = Header(..., alias="Authorization")
+    message_format: Optional[str] = Header(None, alias="X-Accept-Message-Format"),
+    api_key: str = Header(..., alias="Authorization"),
+    prisma: Prisma = Depends(get_db)
 ):
-    """Envoie un message à OpenAI et retourne la réponse"""
+    """Envoie un message à OpenAI et retourne la réponse
+
+    Avec X-Accept-Message-Format: tree, l'arbre de composants de l'assistant est imbriqué
+    dans assistant_response.data au lieu d'une chaîne JSON dans content.
+    """
     # Extraire la clé API du header Authorization (format: "Bearer <api_key>")
     if not api_key.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Format d'autorisation invalide")
     
     actual_api_key = api_key.replace("Bearer ", "")
-    current_user = await verify_api_key(actual_api_key)
+    with phase("auth"):
+        current_user = await verify_api_key(actual_api_key)
     
-    prisma = Prisma()
-    await prisma.connect()
     try:
         # Vérifier que la session appartient à l'utilisateur
-        session = await prisma.session.find_first(
-            where={"id": session_id, "userId": current_user.id}
-        )
+        with phase("session_lookup"):
+            session = await prisma.session.find_first(
+                where={"id": session_id, "userId": current_user.id}
+            )
         if not session:
             raise HTTPException(status_code=404, detail="Session non trouvée")
         
-        # Sauvegarder le message utilisateur
-        user_message = await prisma.message.create(
-            data={
-                "sessionId": session_id,
-                "role": "user",
-                "content": message_data.content
-            }
-        )
-        
-        # Envoyer le message à OpenAI
-        openai_message_id = await openai_service.add_message_to_thread(
-            session.openaiThreadId,
-            message_data.content
-        )
-        
-        # Mettre à jour le message avec l'ID OpenAI
-        await prisma.message.update(
-            where={"id": user_message.id},
-            data={"openaiMessageId": openai_message_id}
-        )
-        
-        # Exécuter l'assistant et récupérer la réponse
-        assistant_response, assistant_message_id, suggestion = await openai_service.run_assistant(
-            session.openaiThreadId,
-            current_user.id
+        response = await run_chat_turn(prisma, session, current_user.id, message_data.content)
+        return format_chat_response(response, message_format)
+    
+    except HTTPException:
+        raise
+    except SchedulerBusy as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
-        
-        # Sauvegarder la réponse de l'assistant
-        assistant_message = await prisma.message.create(
-            data={
-                "sessionId": session_id,
-                "role": "assistant",
-                "content": assistant_response,
-                "openaiMessageId": assistant_message_id
-            }
+    except CircuitOpen as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
-        
-        # Mettre à jour la session
-        await prisma.session.update(
-            where={"id": session_id},
-            data={"updatedAt": datetime.now()}
+    except RunTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors du chat: {str(e)}")
+
+@app.post("/sessions/{session_id}/chat/stream")
+async def chat_stream(
+    session_id: str,
+    message_data: MessageCreate,
+    message_format: Optional[str] = Header(None, alias="X-Accept-Message-Format"),
+    api_key: str = Header(..., alias="Authorization")
+):
+    """Envoie un message à OpenAI et diffuse la réponse en Server-Sent Events"""
+    # Extraire la clé API du header Authorization (format: "Bearer <api_key>")
+    if not api_key.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Format d'autorisation invalide")
+    
+    actual_api_key = api_key.replace("Bearer ", "")
+    current_user = await verify_api_key(actual_api_key)
+    
+    # Vérifier que la session appartient à l'utilisateur avant d'ouvrir le flux
+    async with db_pool.acquire() as prisma:
+        session = await prisma.session.find_first(
+            where={"id": session_id, "userId": current_user.id}
         )
-        
-        return ChatResponse(
-            message=MessageResponse(
-                id=user_message.id,
-                role=user_message.role,
-                content=user_message.content,
-                created_at=user_message.createdAt
-            ),
-            assistant_response=MessageResponse(
-                id=assistant_message.id,
-                role=assistant_message.role,
-                content=assistant_message.content,
-                created_at=assistant_message.createdAt
-            ),
-            suggestion=suggestion
+    if not session:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    async def event_stream():
+        # Premier octet envoyé immédiatement, avant tout appel OpenAI
+        yield _sse("start", {"session_id": session_id})
+        try:
+            async with db_pool.acquire() as prisma:
+                # Thread OpenAI de la session, créé au premier message si besoin
+                thread_id = await session_threads.ensure(prisma, session)
+                
+                # Un run à la fois par thread, dans la limite globale et le quota de l'utilisateur
+                async with run_scheduler.slot(current_user.id, thread_id):
+                    # Sauvegarder le message utilisateur et l'envoyer à OpenAI
+                    user_message, openai_message_id, linked = await post_user_message(
+                        prisma, session_id, thread_id, message_data.content
+                    )
+                    
+                    # Relayer les fragments de texte au fil de l'eau
+                    try:
+                        async for event, payload in openai_service.stream_assistant(thread_id):
+                            if event == "delta":
+                                yield _sse("delta", {"text": payload})
+                            else:
+                                raw_content, assistant_message_id = payload
+                    except Exception:
+                        if not linked:
+                            await link_user_message(prisma, user_message.id, openai_message_id)
+                        raise
+                
+                # Effets de bord (cart, useState) appliqués une seule fois, en fin de flux
+                try:
+                    assistant_response, suggestion = await openai_service.finalize_response(
+                        raw_content,
+                        current_user.id
+                    )
+                except Exception:
+                    if not linked:
+                        await link_user_message(prisma, user_message.id, openai_message_id)
+                    raise
+                
+                assistant_message = await save_assistant_message(
+                    prisma, session_id, assistant_response.text, assistant_message_id,
+                    user_link=None if linked else (user_message.id, openai_message_id),
+                    data=assistant_response.data
+                )
+            
+            response = format_chat_response(ChatResponse(
+                message=user_message,
+                assistant_response=assistant_message,
+                suggestion=suggestion
+            ), message_format)
+            yield f"event: done\ndata: {response.model_dump_json()}\n\n"
+        except (SchedulerBusy, CircuitOpen) as e:
+            yield _sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Erreur lors du chat: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse(event: str, data: dict) -> str:
+    """Formate un événement Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Tours de chat asynchrones
+@app.post("/sessions/{session_id}/chat/jobs", response_model=JobAccepted, status_code=202)
+async def submit_chat_job(
+    session_id: str,
+    message_data: MessageCreate,
+    api_key: str = Header(..., alias="Authorization"),
+    prisma: Prisma = Depends(get_db)
+):
+    """Place un tour de chat dans la file et retourne immédiatement l'ID du job"""
+    # Extraire la clé API du header Authorization (format: "Bearer <api_key>")
+    if not api_key.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Format d'autorisation invalide")
+    
+    actual_api_key = api_key.replace("Bearer ", "")
+    current_user = await verify_api_key(actual_api_key)
+    
+    session = await prisma.session.find_first(
+        where={"id": session_id, "userId": current_user.id}
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    
+    try:
+        job = await job_queue.submit(prisma, current_user.id, session_id, message_data.content)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
         )
+    return JobAccepted(
+        job_id=job.id,
+        status=job.status,
+        status_url=f"/jobs/{job.id}",
+        events_url=f"/jobs/{job.id}/events"
+    )
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_chat_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Attente maximale (s) de la fin du job (long-poll)"),
+    message_format: Optional[str] = Header(None, alias="X-Accept-Message-Format"),
+    api_key: str = Header(..., alias="Authorization"),
+    prisma: Prisma = Depends(get_db)
+):
+    """Retourne l'état d'un job, en attendant sa fin jusqu'à `wait` secondes"""
+    # Extraire la clé API du header Authorization (format: "Bearer <api_key>")
+    if not api_key.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Format d'autorisation invalide")
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur lors du chat: {str(e)}")
-    finally:
-        await prisma.disconnect()
+    actual_api_key = api_key.replace("Bearer ", "")
+    current_user = await verify_api_key(actual_api_key)
+    
+    job = await job_queue.wait(prisma, job_id, current_user.id, min(wait, settings.job_long_poll_max))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    return _job_response(job, message_format)
+
+@app.get("/jobs/{job_id}/events")
+async def chat_job_events(
+    job_id: str,
+    message_format: Optional[str] = Header(None, alias="X-Accept-Message-Format"),
+    api_key: str = Header(..., alias="Authorization")
+):
+    """Diffuse les changements d'état d'un job en Server-Sent Events jusqu'à sa fin"""
+    # Extraire la clé API du header Authorization (format: "Bearer <api_key>")
+    if not api_key.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Format d'autorisation invalide")
+    
+    actual_api_key = api_key.replace("Bearer ", "")
+    current_user = await verify_api_key(actual_api_key)
+    
+    async with db_pool.acquire() as prisma:
+        job = await job_queue.get(prisma, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    
+    async def event_stream():
+        current = job
+        last_status = None
+        while True:
+            if current.status != last_status:
+                last_status = current.status
+                if current.status in FINISHED:
+                    event = "done" if current.status == "succeeded" else "error"
+                    yield f"event: {event}\ndata: {_job_response(current, message_format).model_dump_json()}\n\n"
+                    return
+                yield _sse("status", {"id": current.id, "status": current.status})
+            await job_queue.wait_for_change(job_id, 15.0)
+            async with db_pool.acquire() as prisma:
+                current = await job_queue.get(prisma, job_id, current_user.id)
+            if current is None:
+                yield _sse("error", {"detail": "Job non trouvé"})
+                return
+            if current.status == last_status:
+                # Commentaire SSE : garde la connexion ouverte derrière les proxys
+                yield ": keep-alive\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _job_response(job, message_format: Optional[str] = None) -> JobResponse:
+    """Construit la réponse d'un job à partir de sa ligne ChatJob"""
+    result = ChatResponse.model_validate_json(job.result) if job.result else None
+    return JobResponse(
+        id=job.id,
+        session_id=job.sessionId,
+        status=job.status,
+        result=format_chat_response(result, message_format) if result else None,
+        error=job.error,
+        created_at=job.createdAt,
+        updated_at=job.updatedAt
+    )
 
 # Routes de gestion du cart
 @app.get("/cart", response_model=CartResponse)
 async def get_user_cart(
-    api_key: str = Header(..., alias="Authorization")
+    response: Response,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    api_key: str = Header(..., alias="Authorization"),
+    prisma: Prisma = Depends(get_db)
 ):
-    """Récupère le cart de l'utilisateur"""
+    """Récupère le cart de l'utilisateur (304 si inchangé depuis l'ETag fourni)"""
     # Extraire la clé API du header Authorization
     if not api_key.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Format d'autorisation invalide")
@@ -336,42 +611,20 @@ async def get_user_cart(
     actual_api_key = api_key.replace("Bearer ", "")
     current_user = await verify_api_key(actual_api_key)
     
-    prisma = Prisma()
-    await prisma.connect()
-    try:
-        cart_items = await prisma.cartitem.find_many(
-            where={"userId": current_user.id},
-            order={"createdAt": "asc"}
-        )
-        
-        # Calculer les totaux
-        total_amount = sum(item.totalPrice for item in cart_items)
-        total_items = sum(item.quantity for item in cart_items)
-        
-        return CartResponse(
-            items=[
-                CartItemResponse(
-                    id=item.id,
-                    product_id=item.productId,
-                    product_name=item.productName,
-                    quantity=item.quantity,
-                    unit_price=item.unitPrice,
-                    total_price=item.totalPrice,
-                    created_at=item.createdAt,
-                    updated_at=item.updatedAt
-                )
-                for item in cart_items
-            ],
-            total_amount=total_amount,
-            total_items=total_items
-        )
-    finally:
-        await prisma.disconnect()
+    etag = make_etag("cart", current_user.id, await cart_repository.version(prisma, current_user.id))
+    validator = matching_etag(if_none_match, etag)
+    if validator:
+        return not_modified(validator)
+    response.headers.update(cache_headers(etag))
+    
+    cart_items = await cart_repository.list_items(prisma, current_user.id)
+    return render(_cart, _cart_response(cart_items), response)
 
 @app.put("/cart", response_model=CartResponse)
 async def update_user_cart(
     cart_data: CartUpdateRequest,
-    api_key: str = Header(..., alias="Authorization")
+    api_key: str = Header(..., alias="Authorization"),
+    prisma: Prisma = Depends(get_db)
 ):
     """Met à jour le cart de l'utilisateur"""
     # Extraire la clé API du header Authorization
@@ -381,54 +634,50 @@ async def update_user_cart(
     actual_api_key = api_key.replace("Bearer ", "")
     current_user = await verify_api_key(actual_api_key)
     
-    prisma = Prisma()
-    await prisma.connect()
     try:
-        # Supprimer tous les items existants du cart
-        await prisma.cartitem.delete_many(
-            where={"userId": current_user.id}
-        )
-        
-        # Ajouter les nouveaux items
-        created_items = []
-        for item in cart_data.cart:
-            created_item = await prisma.cartitem.create(
-                data={
-                    "userId": current_user.id,
+        # Appliquer le différentiel du cart en une seule transaction
+        await cart_repository.sync(
+            prisma,
+            current_user.id,
+            [
+                {
                     "productId": item.product_id,
                     "productName": item.product_name,
                     "quantity": item.quantity,
                     "unitPrice": item.unit_price,
                     "totalPrice": item.total_price
                 }
-            )
-            created_items.append(created_item)
-        
-        # Calculer les totaux
-        total_amount = sum(item.total_price for item in cart_data.cart)
-        total_items = sum(item.quantity for item in cart_data.cart)
-        
-        return CartResponse(
-            items=[
-                CartItemResponse(
-                    id=item.id,
-                    product_id=item.productId,
-                    product_name=item.productName,
-                    quantity=item.quantity,
-                    unit_price=item.unitPrice,
-                    total_price=item.totalPrice,
-                    created_at=item.createdAt,
-                    updated_at=item.updatedAt
-                )
-                for item in created_items
-            ],
-            total_amount=total_amount,
-            total_items=total_items
+                for item in cart_data.cart
+            ]
         )
+        cart_items = await cart_repository.list_items(prisma, current_user.id)
+        return render(_cart, _cart_response(cart_items))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la mise à jour du cart: {str(e)}")
-    finally:
-        await prisma.disconnect()
+
+def _cart_response(cart_items: list) -> CartResponse:
+    """Construit la réponse du cart à partir des lignes Prisma"""
+    # Calculer les totaux
+    total_amount = sum(item.totalPrice for item in cart_items)
+    total_items = sum(item.quantity for item in cart_items)
+    
+    return CartResponse(
+        items=[
+            CartItemResponse(
+                id=item.id,
+                product_id=item.productId,
+                product_name=item.productName,
+                quantity=item.quantity,
+                unit_price=item.unitPrice,
+                total_price=item.totalPrice,
+                created_at=item.createdAt,
+                updated_at=item.updatedAt
+            )
+            for item in cart_items
+        ],
+        total_amount=total_amount,
+        total_items=total_items
+    )
 
 # Routes utilitaires
 @app.get("/")
@@ -438,9 +687,41 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     return HealthResponse(
-        status="healthy",
+        status="healthy" if db_pool.connected else "degraded",
         service="rasa-fraym-proxy",
-        timestamp=datetime.now()
+        timestamp=datetime.now(),
+        database={**db_pool.stats(), "message_codec": message_codec.stats()},
+        caches={**api_key_cache_stats(), "responses": openai_service.response_cache.stats()},
+        openai={
+            "run_polling": openai_service.polling_stats.stats(),
+            "thread_pool": thread_pool.stats(),
+            "session_threads": session_threads.stats(),
+            "run_scheduler": run_scheduler.stats(),
+            "resilience": openai_service.resilience.stats(),
+            "jobs": job_queue.stats(),
+            "history_sync": history_sync.stats()
+        }
+    )
+
+def _collect_gauges():
+    """Relève les compteurs du pool et des caches (collecte et export des métriques)"""
+    for stat, value in db_pool.stats().items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            db_pool_gauge.set(value, stat=stat)
+    caches = {**api_key_cache_stats(), "responses": openai_service.response_cache.stats()}
+    for cache, stats in caches.items():
+        for stat, value in stats.items():
+            cache_gauge.set(value, cache=cache, stat=stat)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose les métriques au format texte Prometheus, agrégées sur tous les workers"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Métriques désactivées")
+    
+    return Response(
+        content=shared_metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+import json
+import zlib
+from prisma.fields import Base64
+from config import settings
+
+try:
+    import zstandard
+except ImportError:  # Dépendance optionnelle : pip install zstandard
+    zstandard = None
+
+IDENTITY = "identity"
+
+# Squelettes de l'arbre de composants (prompt.txt, COMPONENTS_REFERENCE.md) qui amorcent
+# la compression. Une version publiée ne doit jamais changer : les messages stockés la
+# référencent ("zlib+d1"). Pour l'enrichir, ajouter une version 2.
+_TEMPLATES = ("base", "centered", "grid", "dashboard", "landing")
+_COMPONENT_TYPES = (
+    "Button", "Card", "Text", "Heading", "Image", "Input", "Container", "Grid", "Flex",
+    "ProductCard", "ProductDetail", "Hero", "Navigation", "ZaraHeader", "ZaraWelcome",
+    "ZaraCategoryButtons", "ZaraProductGrid", "ZaraProductCard", "ZaraMessageInput",
+    "ZaraContainer", "Header", "Footer", "Sidebar", "Welcome",
+)
+_PROPS = {
+    "id": "", "name": "", "price": 0.0, "image": "/images/", "images": [], "description": "",
+    "title": "", "subtitle": "", "level": 2, "columns": 3, "gap": "md", "sizes": [],
+    "categories": [], "buttonText": "", "alt": "", "src": "", "variant": "primary",
+    "className": "text-2xl font-light mb-6 hover:shadow-lg", "children": "",
+}
+_CART = {"productId": "", "productName": "", "quantity": 1, "unitPrice": 0.0, "totalPrice": 0.0}
+
+def _dictionary_v1() -> bytes:
+    components = [{"type": name, "props": dict(_PROPS)} for name in _COMPONENT_TYPES]
+    samples = [
+        {"template": template, "components": components, "templateProps": {"className": ""}}
+        for template in _TEMPLATES
+    ]
+    samples.append({"useState": {"cart": [_CART]}, "suggestion": "", "cart_updated": True})
+    # Les réponses arrivent indentées (texte de l'assistant) ou compactes (re-sérialisées)
+    text = "".join(
+        json.dumps(sample, indent=2, ensure_ascii=False) + json.dumps(sample, ensure_ascii=False)
+        for sample in samples
+    )
+    # zlib n'exploite que les 32 derniers Ko du dictionnaire, les plus proches de la fin comptant le plus
+    return text.encode("utf-8")[-32768:]
+
+DICTIONARIES: Dict[int, bytes] = {1: _dictionary_v1()}
+DICTIONARY_VERSION = 1
+
+class MessageCodec:
+    """Encodage compact de Message.content : zlib ou zstd amorcés par un dictionnaire de squelettes"""
+
+    def __init__(self, algorithm: str = "", min_size: int = 512, level: int = 6):
+        if algorithm == "zstd" and zstandard is None:
+            print("⚠️  zstandard n'est pas installé : compression des messages en zlib")
+            algorithm = "zlib"
+        if algorithm not in ("", "zlib", "zstd"):
+            raise ValueError(f"Compression des messages inconnue: {algorithm}")
+        self.algorithm = algorithm
+        self.min_size = min_size
+        self.level = level
+        self._zstd_dicts: Dict[int, Any] = {}
+
+        # Compteurs exposés sur /health
+        self.encoded = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    @property
+    def encoding(self) -> str:
+        """Encodage appliqué aux nouveaux messages"""
+        if not self.algorithm:
+            return IDENTITY
+        return f"{self.algorithm}+d{DICTIONARY_VERSION}"
+
+    def encode(self, content: str) -> Tuple[str, Optional[bytes]]:
+        """Retourne (encodage, octets compressés), ou (identity, None) si la compression n'apporte rien"""
+        raw = content.encode("utf-8")
+        if not self.algorithm or len(raw) < self.min_size:
+            return IDENTITY, None
+        payload = self._compress(raw)
+        if len(payload) >= len(raw):
+            return IDENTITY, None
+        self.encoded += 1
+        self.raw_bytes += len(raw)
+        self.stored_bytes += len(payload)
+        return self.encoding, payload
+
+    def decode(self, encoding: str, content: str, payload: Optional[bytes]) -> str:
+        """Retourne le texte d'un message, quel que soit son encodage de stockage"""
+        if encoding == IDENTITY or payload is None:
+            return content
+        algorithm, version = _parse(encoding)
+        if algorithm == "zlib":
+            decompressor = zlib.decompressobj(zdict=DICTIONARIES[version])
+            raw = decompressor.decompress(payload) + decompressor.flush()
+        elif algorithm == "zstd":
+            if zstandard is None:
+                raise RuntimeError(f"Message encodé en {encoding} mais zstandard n'est pas installé")
+            raw = zstandard.ZstdDecompressor(dict_data=self._zstd_dict(version)).decompress(payload)
+        else:
+            raise ValueError(f"Encodage de message inconnu: {encoding}")
+        return raw.decode("utf-8")
+
+    def fields(self, content: str) -> Dict[str, Any]:
+        """Colonnes content/encoding/compressed d'une ligne Message à écrire"""
+        encoding, payload = self.encode(content)
+        if payload is None:
+            return {"content": content}
+        return {"content": "", "encoding": encoding, "compressed": Base64.encode(payload)}
+
+    def content_of(self, message) -> str:
+        """Texte d'une ligne Message lue par Prisma"""
+        if message.encoding == IDENTITY or message.compressed is None:
+            return message.content
+        return self.decode(message.encoding, message.content, message.compressed.decode())
+
+    def passthrough(self, message, accepted: Iterable[str]) -> Optional[Tuple[str, str]]:
+        """(encodage, octets stockés en base64) si le client sait les décoder, sinon None"""
+        if message.encoding == IDENTITY or message.compressed is None or message.encoding not in accepted:
+            return None
+        # Base64 garde la forme texte renvoyée par le moteur : ni décodage ni décompression
+        return message.encoding, str(message.compressed)
+
+    def _compress(self, raw: bytes) -> bytes:
+        if self.algorithm == "zstd":
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self._zstd_dict(DICTIONARY_VERSION))
+            return compressor.compress(raw)
+        compressor = zlib.compressobj(self.level, zdict=DICTIONARIES[DICTIONARY_VERSION])
+        return compressor.compress(raw) + compressor.flush()
+
+    def _zstd_dict(self, version: int):
+        dictionary = self._zstd_dicts.get(version)
+        if dictionary is None:
+            dictionary = self._zstd_dicts[version] = zstandard.ZstdCompressionDict(
+                DICTIONARIES[version], dict_type=zstandard.DICT_TYPE_RAWCONTENT
+            )
+        return dictionary
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne l'encodage courant et le gain de place des messages compressés par ce worker"""
+        return {
+            "encoding": self.encoding,
+            "encoded": self.encoded,
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": self.stored_bytes,
+            "ratio": round(self.stored_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+        }
+
+def _parse(encoding: str) -> Tuple[str, int]:
+    """Décompose un encodage : "zlib+d1" -> ("zlib", 1)"""
+    algorithm, _, dictionary = encoding.partition("+d")
+    try:
+        version = int(dictionary)
+    except ValueError:
+        raise ValueError(f"Encodage de message inconnu: {encoding}")
+    if version not in DICTIONARIES:
+        raise ValueError(f"Dictionnaire de compression inconnu: {encoding}")
+    return algorithm, version
+
+# Instance globale du codec des messages
+message_codec = MessageCodec(
+    algorithm=settings.message_compression,
+    min_size=settings.message_compression_min_size
+)
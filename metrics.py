@@ -0,0 +1,371 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import bisect
+import json
+import os
+import time
+from config import settings
+
+# Bornes par défaut des histogrammes de durée (secondes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Compteur monotone"""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> list:
+        return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, samples: list, worker: str) -> None:
+        """Ajoute les valeurs d'un autre worker (somme)"""
+        for key, value in samples:
+            key = tuple(key)
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+class Gauge(_Metric):
+    """Valeur instantanée pouvant monter et descendre"""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def snapshot(self) -> list:
+        return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, samples: list, worker: str) -> None:
+        """Ajoute les valeurs d'un autre worker, sous son label worker"""
+        for key, value in samples:
+            self._values[tuple(key) + (worker,)] = value
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+class Histogram(_Metric):
+    """Distribution d'observations réparties en buckets cumulés"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            # [compteurs par bucket (+Inf inclus), somme, nombre]
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def snapshot(self) -> list:
+        return [[list(key), series] for key, series in self._series.items()]
+
+    def merge(self, samples: list, worker: str) -> None:
+        """Ajoute les observations d'un autre worker (somme par bucket)"""
+        for key, (counts, total, count) in samples:
+            series = self._series.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0, 0])
+            series[0] = [mine + theirs for mine, theirs in zip(series[0], counts)]
+            series[1] += total
+            series[2] += count
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Chronomètre le bloc et enregistre sa durée"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Ensemble de métriques exportées au format texte Prometheus"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def dump(self, directory: str) -> None:
+        """Écrit les valeurs du worker dans le répertoire partagé (remplacement atomique)"""
+        path = Path(directory) / f"{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({metric.name: metric.snapshot() for metric in self._metrics}), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def render_shared(self, directory: str) -> str:
+        """Agrège les valeurs de tous les workers du répertoire partagé
+
+        Compteurs et histogrammes sont additionnés, y compris ceux des workers
+        arrêtés pour rester monotones. Les jauges restent par worker (label
+        worker = pid) et celles d'un worker arrêté disparaissent.
+        """
+        self.dump(directory)
+        merged = Registry()
+        for metric in self._metrics:
+            labelnames = metric.labelnames + (("worker",) if isinstance(metric, Gauge) else ())
+            if isinstance(metric, Histogram):
+                merged.register(Histogram(metric.name, metric.documentation, labelnames, metric.buckets))
+            else:
+                merged.register(type(metric)(metric.name, metric.documentation, labelnames))
+        by_name = {metric.name: metric for metric in merged._metrics}
+        for path in sorted(Path(directory).glob("*.json")):
+            try:
+                samples = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            worker = path.stem
+            alive = _is_alive(int(worker)) if worker.isdigit() else False
+            for name, values in samples.items():
+                metric = by_name.get(name)
+                if metric is not None and (alive or not isinstance(metric, Gauge)):
+                    metric.merge(values, worker)
+        return merged.render()
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class SharedMetrics:
+    """Export périodique des métriques du worker vers un répertoire partagé
+
+    Avec plusieurs workers, chacun n'a que ses propres valeurs : chaque worker écrit
+    les siennes toutes les `interval` secondes et à l'arrêt, et /metrics agrège le
+    répertoire. Sans répertoire, /metrics ne voit que le worker qui répond.
+    """
+
+    def __init__(self, directory: str = "", interval: float = 5.0):
+        self.directory = directory
+        self.interval = interval
+        self._collect: Optional[Callable[[], None]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    async def start(self, collect: Optional[Callable[[], None]] = None) -> None:
+        """Lance l'export ; collect relève les jauges calculées à la demande avant chaque écriture"""
+        self._collect = collect
+        if not self.enabled or self._task is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrête l'export après une dernière écriture"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.flush()
+
+    def flush(self) -> None:
+        if self._collect is not None:
+            self._collect()
+        registry.dump(self.directory)
+
+    def render(self) -> str:
+        """Métriques de tous les workers, ou du seul worker courant sans répertoire partagé"""
+        if self._collect is not None:
+            self._collect()
+        if not self.enabled:
+            return registry.render()
+        return registry.render_shared(self.directory)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Erreur lors de l'export des métriques: {e}")
+
+# Registre global (propre à chaque worker, agrégé par SharedMetrics)
+registry = Registry()
+
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requêtes HTTP en cours de traitement"
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP", ["method", "route", "status"]
+)
+chat_phase_duration = registry.histogram(
+    "chat_phase_duration_seconds", "Durée de chaque phase d'un tour de chat", ["phase"]
+)
+openai_request_duration = registry.histogram(
+    "openai_request_duration_seconds", "Durée des appels à l'API OpenAI", ["operation"]
+)
+openai_errors = registry.counter(
+    "openai_errors_total", "Erreurs des appels à l'API OpenAI", ["operation", "error"]
+)
+openai_run_polls = registry.histogram(
+    "openai_run_polls", "Nombre d'interrogations par run OpenAI", buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+openai_retries = registry.counter(
+    "openai_retries_total", "Nouvelles tentatives d'appels OpenAI", ["operation"]
+)
+circuit_state = registry.gauge(
+    "openai_circuit_open", "Coupe-circuit OpenAI ouvert (1) ou fermé (0)", ["circuit"]
+)
+response_cache_lookups = registry.counter(
+    "response_cache_lookups_total", "Consultations du cache des réponses de l'assistant", ["result"]
+)
+thread_pool_depth = registry.gauge(
+    "openai_thread_pool_depth", "Threads OpenAI pré-créés disponibles"
+)
+thread_pool_requests = registry.counter(
+    "openai_thread_pool_requests_total", "Demandes de thread à la réserve", ["result"]
+)
+scheduler_active = registry.gauge(
+    "run_scheduler_active", "Runs OpenAI en cours"
+)
+scheduler_queue_depth = registry.gauge(
+    "run_scheduler_queue_depth", "Runs OpenAI en attente d'une place"
+)
+scheduler_wait = registry.histogram(
+    "run_scheduler_wait_seconds", "Attente d'une place avant le lancement d'un run"
+)
+scheduler_rejections = registry.counter(
+    "run_scheduler_rejections_total", "Runs refusés avec un 429", ["reason"]
+)
+job_queue_depth = registry.gauge(
+    "chat_job_queue_depth", "Jobs de chat en attente de traitement"
+)
+jobs_total = registry.counter(
+    "chat_jobs_total", "Jobs de chat terminés", ["status"]
+)
+job_duration = registry.histogram(
+    "chat_job_duration_seconds", "Durée d'un job de chat, de la soumission à la fin"
+)
+history_sync_imported = registry.counter(
+    "history_sync_imported_total", "Messages de thread absents de la base, importés par la réconciliation"
+)
+compression_bytes = registry.counter(
+    "http_compression_bytes_total", "Octets des réponses avant (input) et après (output) compression", ["coding", "stage"]
+)
+compression_seconds = registry.counter(
+    "http_compression_seconds_total", "Temps passé à compresser les réponses", ["coding"]
+)
+db_pool_gauge = registry.gauge(
+    "db_pool", "Compteurs du pool Prisma", ["stat"]
+)
+cache_gauge = registry.gauge(
+    "cache", "Compteurs des caches mémoire", ["cache", "stat"]
+)
+
+def phase(name: str):
+    """Chronomètre une phase d'un tour de chat"""
+    return chat_phase_duration.time(phase=name)
+
+@contextmanager
+def track_openai(operation: str) -> Iterator[None]:
+    """Chronomètre un appel OpenAI et compte ses erreurs par type"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        openai_errors.inc(operation=operation, error=type(e).__name__)
+        raise
+    finally:
+        openai_request_duration.observe(time.perf_counter() - started, operation=operation)
+
+# Instance globale de l'export des métriques entre workers
+shared_metrics = SharedMetrics(settings.metrics_multiprocess_dir, settings.metrics_flush_interval)
@@ -0,0 +1,169 @@
+import gzip
+import time
+from database import track_queries
+from metrics import http_requests_in_flight, http_request_duration, compression_bytes, compression_seconds
+
+try:
+    import brotli
+except ImportError:  # Dépendance optionnelle : pip install brotli
+    brotli = None
+
+class QueryCountMiddleware:
+    """Ajoute l'en-tête X-DB-Queries : nombre de requêtes Prisma émises par la requête HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = track_queries()
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(counter.count).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_count)
+
+class MetricsMiddleware:
+    """Mesure la durée des requêtes HTTP par route et le nombre de requêtes en cours"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            # Gabarit de la route (ex. /sessions/{session_id}/chat) pour borner la cardinalité
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code)
+            )
+
+# Types de contenu compressés (les flux text/event-stream ne le sont jamais)
+_COMPRESSIBLE_TYPES = (b"application/json", b"text/html", b"text/plain", b"text/css", b"application/javascript")
+
+def _accepted_codings(header: bytes) -> set:
+    """Codages acceptés par le client (ceux de qualité nulle sont exclus)"""
+    codings = set()
+    for item in header.decode("latin-1").split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if coding:
+            codings.add(coding.strip().lower())
+    return codings
+
+class CompressionMiddleware:
+    """Compresse en brotli (si installé) ou gzip les réponses complètes au-delà d'un seuil"""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose(self, scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                codings = _accepted_codings(value)
+                if brotli is not None and "br" in codings:
+                    return "br"
+                if "gzip" in codings:
+                    return "gzip"
+        return ""
+
+    def _compress(self, coding: str, body: bytes) -> bytes:
+        started = time.perf_counter()
+        if coding == "br":
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level)
+        compression_seconds.inc(time.perf_counter() - started, coding=coding)
+        compression_bytes.inc(len(body), coding=coding, stage="input")
+        compression_bytes.inc(len(compressed), coding=coding, stage="output")
+        return compressed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = self._choose(scope)
+        if not coding:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            if start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            headers = response_start.get("headers", [])
+            body = message.get("body", b"")
+            content_type = next((value for name, value in headers if name == b"content-type"), b"")
+            compressible = (
+                not message.get("more_body", False)
+                and len(body) >= self.minimum_size
+                and content_type.split(b";")[0].strip() in _COMPRESSIBLE_TYPES
+                and not any(name == b"content-encoding" for name, _ in headers)
+            )
+            if not compressible:
+                # Réponse en flux (SSE) ou trop petite : transmise telle quelle
+                passthrough = True
+                await send(response_start)
+                await send(message)
+                return
+
+            body = self._compress(coding, body)
+            rewritten = []
+            for name, value in headers:
+                if name == b"content-length":
+                    continue
+                if name == b"etag" and value.endswith(b'"') and not value.startswith(b"W/"):
+                    # Une représentation compressée a son propre ETag fort
+                    value = value[:-1] + f"-{coding}\"".encode()
+                rewritten.append((name, value))
+            rewritten += [
+                (b"content-encoding", coding.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**response_start, "headers": rewritten})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
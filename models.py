@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 # Auth Models
@@ -24,7 +24,7 @@ class SessionCreate(BaseModel):
 class SessionResponse(BaseModel):
     id: str
     title: Optional[str]
-    openai_thread_id: str
+    openai_thread_id: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -37,12 +37,30 @@ class MessageResponse(BaseModel):
     role: str
     content: str
     created_at: datetime
+    encoding: Optional[str] = None  # Renseigné si content contient les octets stockés, en base64
+    data: Optional[Any] = None  # Arbre de composants analysé (X-Accept-Message-Format: tree), content vide
 
 class ChatResponse(BaseModel):
     message: MessageResponse
     assistant_response: MessageResponse
     suggestion: Optional[str] = None
 
+# Job Models
+class JobAccepted(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+class JobResponse(BaseModel):
+    id: str
+    session_id: str
+    status: str  # "queued", "running", "succeeded" ou "failed"
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 # Error Models
 class ErrorResponse(BaseModel):
     error: str
@@ -78,4 +96,7 @@ class CartUpdateRequest(BaseModel):
 class HealthResponse(BaseModel):
     status: str
     service: str
-    timestamp: datetime
\ No newline at end of file
+    timestamp: datetime
+    database: Optional[Dict[str, Any]] = None
+    caches: Optional[Dict[str, Any]] = None
+    openai: Optional[Dict[str, Any]] = None
\ No newline at end of file
@@ -1,281 +1,450 @@
 from openai import AsyncOpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from config import settings
-from prisma import Prisma
+from database import db_pool
+from cart_repository import cart_repository
+from polling import PollingStrategy, PollingStats
+from response_normalizer import NormalizedResponse, normalize_response
+from response_cache import ResponseCache
+from metrics import openai_run_polls, phase, track_openai, response_cache_lookups
+from resilience import CircuitBreaker, Resilience, RunTimeout, active_run_id
 import asyncio
-import re
-import json
+import os
+import secrets
+import time
 from openai import AsyncOpenAI
 
+# Statuts d'un run qui occupe encore son thread
+ACTIVE_RUN_STATUSES = ("queued", "in_progress", "cancelling")
+
+# Métadonnée qui identifie une création (message, run) pour la retrouver si sa réponse est perdue
+REQUEST_KEY = "fraym_request"
+# Éléments les plus récents du thread parcourus pour la retrouver
+RECOVERY_WINDOW = 20
+
+def openai_resilience(name: str = "chat") -> Resilience:
+    """Nouvelles tentatives et coupe-circuit réglés par la configuration (un coupe-circuit par usage)"""
+    return Resilience(
+        max_retries=settings.openai_max_retries,
+        backoff=PollingStrategy(
+            initial=settings.openai_retry_initial_interval,
+            maximum=settings.openai_retry_max_interval,
+            multiplier=2.0,
+            jitter=0.2
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=settings.circuit_failure_threshold,
+            reset_timeout=settings.circuit_reset_timeout,
+            name=name
+        )
+    )
+
 class OpenAIService:
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        self._client: Optional[AsyncOpenAI] = None
+        self._client_pid: Optional[int] = None
         self.assistant_id = settings.openai_assistant_id
+        self.polling_strategy = PollingStrategy(
+            initial=settings.run_poll_initial_interval,
+            maximum=settings.run_poll_max_interval,
+            multiplier=settings.run_poll_multiplier,
+            jitter=settings.run_poll_jitter
+        )
+        self.polling_stats = PollingStats()
+        self.response_cache = ResponseCache(
+            maxsize=settings.response_cache_size,
+            ttl=settings.response_cache_ttl,
+            similarity=settings.response_cache_similarity,
+            bypass_pattern=settings.response_cache_bypass_pattern
+        )
+        self.resilience = openai_resilience()
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Client OpenAI propre au processus courant (recréé après un fork)"""
+        if self._client is None or self._client_pid != os.getpid():
+            # Nouvelles tentatives gérées par self.resilience (coupe-circuit, Retry-After)
+            self._client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                timeout=settings.openai_request_timeout,
+                max_retries=0
+            )
+            self._client_pid = os.getpid()
+        return self._client
+    
+    async def close(self) -> None:
+        """Ferme les connexions HTTP du client OpenAI du processus courant"""
+        if self._client is not None and self._client_pid == os.getpid():
+            await self._client.close()
+        self._client = None
+        self._client_pid = None
     
     async def create_thread(self) -> str:
         """Crée un nouveau thread OpenAI"""
-        thread = await self.client.beta.threads.create()
+        thread = await self.resilience.call("create_thread", self.client.beta.threads.create)
         return thread.id
     
+    async def delete_thread(self, thread_id: str) -> None:
+        """Supprime un thread OpenAI"""
+        await self.resilience.call("delete_thread", self.client.beta.threads.delete, thread_id)
+    
     async def add_message_to_thread(self, thread_id: str, content: str, role: str = "user") -> str:
-        """Ajoute un message à un thread"""
-        message = await self.client.beta.threads.messages.create(
+        """Ajoute un message à un thread (jamais en double, même si une réponse d'OpenAI est perdue)"""
+        key = secrets.token_hex(8)
+        message = await self._call_when_idle(
+            thread_id,
+            "add_message",
+            self.client.beta.threads.messages.create,
             thread_id=thread_id,
             role=role,
-            content=content
+            content=content,
+            metadata={REQUEST_KEY: key},
+            recover=lambda: self._find_created(self.client.beta.threads.messages.list, thread_id, key)
         )
         return message.id
     
-    async def run_assistant(self, thread_id: str, user_id: str = None) -> str:
-        """Lance l'assistant sur un thread et attend la réponse"""
-        run = await self.client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=self.assistant_id
+    async def delete_message(self, thread_id: str, message_id: str) -> None:
+        """Retire un message d'un thread"""
+        await self.resilience.call(
+            "delete_message",
+            self.client.beta.threads.messages.delete,
+            message_id,
+            thread_id=thread_id
         )
+    
+    async def run_assistant(self, thread_id: str, user_id: str = None, prompt: Optional[str] = None) -> Tuple[NormalizedResponse, str, Optional[str]]:
+        """Lance l'assistant sur un thread et attend la réponse
+
+        prompt n'est fourni que pour un premier tour sans état : la réponse peut alors
+        être servie par le cache (ou y être enregistrée) sans lancer de run.
+        """
+        cacheable = False
+        if prompt is not None and settings.response_cache_enabled:
+            if self.response_cache.bypass(prompt):
+                response_cache_lookups.inc(result="bypass")
+            else:
+                content = self.response_cache.get(prompt, self.assistant_id, settings.catalogue_version)
+                if content is not None:
+                    response_cache_lookups.inc(result="hit")
+                    return await self._replay_cached(thread_id, content, user_id)
+                response_cache_lookups.inc(result="miss")
+                cacheable = True
         
-        # Attendre que le run soit terminé
-        while run.status in ["queued", "in_progress", "cancelling"]:
-            await asyncio.sleep(1)
-            run = await self.client.beta.threads.runs.retrieve(
-                thread_id=thread_id,
-                run_id=run.id
-            )
+        with phase("run_wait"):
+            run = await self._create_and_wait_run(thread_id)
         
         if run.status == "completed":
             # Récupérer les messages du thread
-            messages = await self.client.beta.threads.messages.list(
-                thread_id=thread_id,
-                order="desc",
-                limit=1
-            )
+            with phase("fetch_reply"):
+                messages = await self.resilience.call(
+                    "list_messages",
+                    self.client.beta.threads.messages.list,
+                    thread_id=thread_id,
+                    order="desc",
+                    limit=1
+                )
             
             if messages.data:
                 latest_message = messages.data[0]
                 if latest_message.role == "assistant":
-                    # Extraire le contenu texte du message
-                    content = ""
-                    for content_block in latest_message.content:
-                        if content_block.type == "text":
-                            content += content_block.text.value
-                    
-                    # Traiter la réponse pour enlever les backticks et 'json'
-                    processed_content = self._process_response(content)
-                    
-                    # Traiter le useState si présent et user_id fourni
-                    suggestion = None
-                    if user_id:
-                        processed_content, cart_updated, suggestion = await self._handle_use_state(processed_content, user_id)
-                    
-                    return processed_content, latest_message.id, suggestion
+                    content = self._extract_text(latest_message)
+                    response, suggestion = await self.finalize_response(content, user_id)
+                    # Les réponses qui modifient le cart dépendent de l'utilisateur
+                    if cacheable and isinstance(response.data, dict) and "cart_updated" not in response.data:
+                        self.response_cache.set(prompt, content, self.assistant_id, settings.catalogue_version)
+                    return response, latest_message.id, suggestion
             
             raise Exception("Aucune réponse de l'assistant trouvée")
         else:
             raise Exception(f"Erreur lors de l'exécution de l'assistant: {run.status}")
     
-    async def get_thread_messages(self, thread_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """Récupère les messages d'un thread"""
-        messages = await self.client.beta.threads.messages.list(
+    async def _replay_cached(self, thread_id: str, content: str, user_id: str = None) -> Tuple[NormalizedResponse, str, Optional[str]]:
+        """Sert une réponse du cache en l'ajoutant au thread pour garder le contexte des tours suivants"""
+        message_id = await self.add_message_to_thread(thread_id, content, role="assistant")
+        response, suggestion = await self.finalize_response(content, user_id)
+        return response, message_id, suggestion
+    
+    async def _create_and_wait_run(self, thread_id: str):
+        """Crée un run et attend sa fin selon le mode configuré (poll, sdk ou stream)"""
+        mode = settings.run_wait_mode
+        
+        if mode == "sdk":
+            # Interrogation déléguée au SDK (intervalle fixe côté SDK). Création et attente
+            # sont rejouées séparément : rejouer create_and_poll sur une erreur d'interrogation
+            # relancerait un run sur un thread qui en a déjà un actif (400 non transitoire)
+            run = None
+            try:
+                async with asyncio.timeout(settings.run_timeout):
+                    run = await self._create_run(thread_id)
+                    return await self.resilience.call(
+                        "poll_run",
+                        self.client.beta.threads.runs.poll,
+                        run.id,
+                        thread_id=thread_id,
+                        poll_interval_ms=int(settings.run_poll_initial_interval * 1000)
+                    )
+            except TimeoutError:
+                if run is not None:
+                    await self._cancel_run(thread_id, run.id)
+                error = RunTimeout(f"Run non terminé après {settings.run_timeout}s")
+                self.resilience.record(error)
+                raise error
+        
+        if mode == "stream":
+            # Fin du run signalée par le flux d'événements, sans aucune interrogation
+            self.resilience.guard()
+            error = None
+            stream = None
+            try:
+                with track_openai("run_stream"):
+                    async with asyncio.timeout(settings.run_timeout):
+                        async with self.client.beta.threads.runs.stream(
+                            thread_id=thread_id,
+                            assistant_id=self.assistant_id
+                        ) as stream:
+                            await stream.until_done()
+                            return await stream.get_final_run()
+            except TimeoutError:
+                if stream is not None and stream.current_run is not None:
+                    await self._cancel_run(thread_id, stream.current_run.id)
+                error = RunTimeout(f"Run non terminé après {settings.run_timeout}s")
+                raise error
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self.resilience.record(error)
+        
+        run = await self._create_run(thread_id)
+        return await self._wait_for_run(thread_id, run)
+    
+    async def _create_run(self, thread_id: str):
+        """Crée un run sur le thread (jamais deux, même si une réponse d'OpenAI est perdue)"""
+        key = secrets.token_hex(8)
+        return await self._call_when_idle(
+            thread_id,
+            "create_run",
+            self.client.beta.threads.runs.create,
             thread_id=thread_id,
-            order="asc",
-            limit=limit
+            assistant_id=self.assistant_id,
+            metadata={REQUEST_KEY: key},
+            recover=lambda: self._find_created(self.client.beta.threads.runs.list, thread_id, key)
         )
+    
+    async def _find_created(self, list_items, thread_id: str, key: str) -> Any:
+        """Message ou run déjà créé par une tentative dont la réponse a été perdue (None s'il n'existe pas)"""
+        page = await list_items(thread_id=thread_id, order="desc", limit=RECOVERY_WINDOW)
+        return next((item for item in page.data if (item.metadata or {}).get(REQUEST_KEY) == key), None)
+    
+    async def _wait_for_run(self, thread_id: str, run):
+        """Attend la fin d'un run avec un backoff exponentiel plafonné et du jitter, dans la limite de run_timeout"""
+        polls = 0
+        wait_time = 0.0
+        last_interval = 0.0
+        intervals = self.polling_strategy.intervals()
+        deadline = time.monotonic() + settings.run_timeout
         
-        formatted_messages = []
-        for message in messages.data:
-            content = ""
-            for content_block in message.content:
-                if content_block.type == "text":
-                    content += content_block.text.value
-            
-            formatted_messages.append({
-                "id": message.id,
-                "role": message.role,
-                "content": content,
-                "created_at": message.created_at
-            })
+        # Attendre que le run soit terminé
+        while run.status in ACTIVE_RUN_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.polling_stats.record(polls, wait_time, last_interval)
+                openai_run_polls.observe(polls)
+                await self._cancel_run(thread_id, run.id)
+                error = RunTimeout(f"Run non terminé après {settings.run_timeout}s")
+                self.resilience.record(error)
+                raise error
+            last_interval = min(next(intervals), remaining)
+            started = time.perf_counter()
+            await asyncio.sleep(last_interval)
+            wait_time += time.perf_counter() - started
+            polls += 1
+            run = await self.resilience.call(
+                "retrieve_run",
+                self.client.beta.threads.runs.retrieve,
+                thread_id=thread_id,
+                run_id=run.id,
+                deadline=deadline
+            )
         
-        return formatted_messages
+        self.polling_stats.record(polls, wait_time, last_interval)
+        openai_run_polls.observe(polls)
+        return run
     
-    def _process_response(self, content: str) -> str:
-        """Traite la réponse pour enlever les backticks et 'json' du début et s'assurer que le JSON est valide"""
-        import json
-        
-        # Enlever les backticks de début et de fin avec 'json'
-        # Pattern pour matcher ```json au début et ``` à la fin
-        pattern = r'^```json\s*\n?(.*?)\n?```$'
-        match = re.match(pattern, content.strip(), re.DOTALL | re.MULTILINE)
+    async def _call_when_idle(self, thread_id: str, operation: str, fn, /, *args, recover=None, **kwargs) -> Any:
+        """Création refusée tant qu'un run occupe le thread : attend la fin de ce run puis réessaie
+
+        L'ordonnanceur sérialise les runs d'un thread dans un worker ; un message envoyé
+        sur la même session par un autre worker trouve le thread occupé (400 "active run").
+        recover retrouve une création déjà aboutie (voir Resilience.call).
+        """
+        deadline = time.monotonic() + settings.run_timeout
+        while True:
+            try:
+                return await self.resilience.call(operation, fn, *args, deadline=deadline, recover=recover, **kwargs)
+            except Exception as e:
+                run_id = active_run_id(e)
+                if run_id is None or time.monotonic() >= deadline:
+                    raise
+            # Le run actif peut être le nôtre, créé par une tentative dont la réponse s'est perdue
+            if recover is not None:
+                created = await self.resilience.call(f"{operation}_lookup", recover, deadline=deadline)
+                if created is not None:
+                    return created
+            await self._wait_for_other_run(thread_id, run_id, deadline)
+    
+    async def _wait_for_other_run(self, thread_id: str, run_id: str, deadline: float) -> None:
+        """Attend la fin d'un run lancé par un autre worker, sans l'annuler : son worker s'en charge"""
+        intervals = self.polling_strategy.intervals()
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(next(intervals), max(0.0, deadline - time.monotonic())))
+            run = await self.resilience.call(
+                "retrieve_run",
+                self.client.beta.threads.runs.retrieve,
+                thread_id=thread_id,
+                run_id=run_id,
+                deadline=deadline
+            )
+            if run.status not in ACTIVE_RUN_STATUSES:
+                return
+    
+    async def _cancel_run(self, thread_id: str, run_id: str) -> None:
+        """Annule un run hors délai pour libérer le thread (hors coupe-circuit : simple tentative)"""
+        try:
+            with track_openai("cancel_run"):
+                await self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+        except Exception as e:
+            print(f"Erreur lors de l'annulation du run {run_id}: {e}")
+    
+    async def stream_assistant(self, thread_id: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Lance l'assistant en streaming et produit les fragments de texte au fil de l'eau"""
+        self.resilience.guard()
+        deadline = time.monotonic() + settings.run_timeout
+        error = None
+        try:
+            with track_openai("run_stream"):
+                async with self.client.beta.threads.runs.stream(
+                    thread_id=thread_id,
+                    assistant_id=self.assistant_id
+                ) as stream:
+                    deltas = stream.text_deltas.__aiter__()
+                    while True:
+                        # Chaque fragment doit arriver avant l'échéance du run
+                        try:
+                            text = await asyncio.wait_for(anext(deltas), deadline - time.monotonic())
+                        except StopAsyncIteration:
+                            break
+                        except TimeoutError:
+                            if stream.current_run is not None:
+                                await self._cancel_run(thread_id, stream.current_run.id)
+                            raise RunTimeout(f"Run non terminé après {settings.run_timeout}s")
+                        yield "delta", text
+                    run = await stream.get_final_run()
+                    messages = await stream.get_final_messages()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.resilience.record(error)
         
-        if match:
-            # Extraire le contenu sans les backticks et 'json'
-            json_content = match.group(1).strip()
-        else:
-            # Essayer de détecter d'autres patterns de backticks
-            # Pattern pour ```json sans fermeture ou avec variations
-            patterns = [
-                r'^```json\s*\n?(.*?)$',  # ```json sans fermeture
-                r'^```\s*\n?(.*?)\n?```$',  # ``` sans json
-                r'^```.*?\n(.*?)\n?```$',  # ```quelquechose
-            ]
-            
-            json_content = content.strip()
-            for pattern in patterns:
-                match = re.match(pattern, json_content, re.DOTALL | re.MULTILINE)
-                if match:
-                    json_content = match.group(1).strip()
-                    break
+        if run.status != "completed":
+            raise Exception(f"Erreur lors de l'exécution de l'assistant: {run.status}")
         
-        # Nettoyer le contenu JSON
-        json_content = self._clean_json_content(json_content)
+        latest_message = next((m for m in reversed(messages) if m.role == "assistant"), None)
+        if latest_message is None:
+            raise Exception("Aucune réponse de l'assistant trouvée")
         
-        # Valider que le JSON est parsable
-        try:
-            json.loads(json_content)
-            return json_content
-        except json.JSONDecodeError as e:
-            # Si le JSON n'est pas valide, essayer de le corriger
-            corrected_json = self._fix_json_format(json_content)
-            try:
-                json.loads(corrected_json)
-                return corrected_json
-            except json.JSONDecodeError:
-                # Si impossible à corriger, retourner le contenu original
-                return content
+        # Dernier événement : contenu brut complet et ID du message OpenAI
+        yield "completed", (self._extract_text(latest_message), latest_message.id)
     
-    def _clean_json_content(self, content: str) -> str:
-        """Nettoie le contenu JSON des caractères indésirables"""
-        # Enlever les backticks restants
-        content = re.sub(r'`+', '', content)
-        
-        # Enlever les marqueurs markdown restants
-        content = re.sub(r'^(json|JSON)\s*\n?', '', content, flags=re.MULTILINE)
+    async def finalize_response(self, content: str, user_id: str = None) -> Tuple[NormalizedResponse, Optional[str]]:
+        """Nettoie et analyse la réponse brute une seule fois, puis applique les effets de bord du useState"""
+        # Enlever les backticks et 'json', puis analyser le JSON
+        with phase("response_processing"):
+            response = normalize_response(content)
         
-        # Enlever les espaces en début et fin
-        content = content.strip()
+        # Traiter le useState si présent et user_id fourni
+        suggestion = None
+        if user_id:
+            cart_updated, suggestion = await self._handle_use_state(response, user_id)
         
+        return response, suggestion
+    
+    def _extract_text(self, message) -> str:
+        """Extrait le contenu texte d'un message OpenAI"""
+        content = ""
+        for content_block in message.content:
+            if content_block.type == "text":
+                content += content_block.text.value
         return content
     
-    def _fix_json_format(self, content: str) -> str:
-        """Essaie de corriger les erreurs communes de formatage JSON"""
-        # Enlever les virgules en fin d'objet ou de tableau
-        content = re.sub(r',\s*}', '}', content)
-        content = re.sub(r',\s*]', ']', content)
-        
-        # Corriger les guillemets simples en guillemets doubles
-        content = re.sub(r"'([^']*)':", r'"\1":', content)
-        content = re.sub(r":\s*'([^']*)'", r': "\1"', content)
+    async def list_thread_messages(
+        self,
+        thread_id: str,
+        after: Optional[str] = None,
+        limit: int = 100,
+        resilience: Optional[Resilience] = None
+    ) -> List[Dict[str, Any]]:
+        """Récupère une page de messages d'un thread (réconciliation en tâche de fond uniquement)
+
+        resilience : coupe-circuit de l'appelant, pour que ses échecs n'ouvrent pas celui du chat.
+        """
+        params = {"thread_id": thread_id, "order": "asc", "limit": limit}
+        if after is not None:
+            params["after"] = after
+        messages = await (resilience or self.resilience).call(
+            "list_messages",
+            self.client.beta.threads.messages.list,
+            **params
+        )
         
-        # Enlever les commentaires
-        content = re.sub(r'//.*?\n', '\n', content)
-        content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
+        formatted_messages = []
+        for message in messages.data:
+            formatted_messages.append({
+                "id": message.id,
+                "role": message.role,
+                "content": self._extract_text(message),
+                "created_at": message.created_at
+            })
         
-        return content
+        return formatted_messages
     
-    async def _handle_use_state(self, content: str, user_id: str) -> tuple[str, bool, str]:
-        """Traite le useState dans la réponse et met à jour le cart si nécessaire"""
+    async def _handle_use_state(self, response: NormalizedResponse, user_id: str) -> tuple[bool, Optional[str]]:
+        """Traite le useState dans la réponse analysée et met à jour le cart si nécessaire"""
         cart_updated = False
         suggestion = None
+        response_data = response.data
         
-        try:
-            # Parser le JSON de la réponse
-            response_data = json.loads(content)
-            
-            # Extraire la suggestion si présente
-            if "suggestion" in response_data:
-                suggestion = response_data["suggestion"]
+        # Réponse non JSON ou non objet : rien à traiter
+        if not isinstance(response_data, dict):
+            return cart_updated, suggestion
+        
+        # Extraire la suggestion si présente
+        suggestion = response_data.get("suggestion")
+        
+        # Vérifier s'il y a un useState avec un cart
+        use_state = response_data.get("useState")
+        if isinstance(use_state, dict) and "cart" in use_state:
+            # Mettre à jour le cart dans la base de données
+            cart_updated = await self._update_user_cart(user_id, use_state["cart"])
             
-            # Vérifier s'il y a un useState avec un cart
-            if "useState" in response_data and "cart" in response_data["useState"]:
-                cart_items = response_data["useState"]["cart"]
-                
-                # Mettre à jour le cart dans la base de données
-                cart_updated = await self._update_user_cart(user_id, cart_items)
-                
-                # Supprimer le cart du useState et ajouter cart_updated
-                del response_data["useState"]["cart"]
-                response_data["cart_updated"] = cart_updated
-                
-                # Retourner le JSON modifié
-                return json.dumps(response_data), cart_updated, suggestion
-                
-        except (json.JSONDecodeError, KeyError) as e:
-            # Si le parsing échoue ou si les clés n'existent pas, on ignore silencieusement
-            pass
+            # Supprimer le cart du useState et ajouter cart_updated
+            del use_state["cart"]
+            response_data["cart_updated"] = cart_updated
+            response.mark_modified()
         
-        return content, cart_updated, suggestion
+        return cart_updated, suggestion
     
     async def _update_user_cart(self, user_id: str, cart_items: List[Dict[str, Any]]) -> bool:
         """Met à jour le cart de l'utilisateur dans la base de données avec synchronisation intelligente"""
-        prisma = Prisma()
-        await prisma.connect()
-        cart_updated = False
-        
         try:
-            # Récupérer les items existants du cart
-            existing_items = await prisma.cartitem.find_many(
-                where={"userId": user_id}
-            )
-            
-            # Créer des dictionnaires pour faciliter la comparaison
-            existing_products = {item.productId: item for item in existing_items}
-            received_products = {item.get("productId", ""): item for item in cart_items}
-            
-            # Supprimer les items qui ne sont plus dans le cart reçu
-            items_to_delete = []
-            for product_id, existing_item in existing_products.items():
-                if product_id not in received_products:
-                    items_to_delete.append(existing_item.id)
-            
-            if items_to_delete:
-                await prisma.cartitem.delete_many(
-                    where={"id": {"in": items_to_delete}}
-                )
-                cart_updated = True
-            
-            # Mettre à jour ou créer les items du cart reçu
-            for item in cart_items:
-                product_id = item.get("productId", "")
-                
-                item_data = {
-                    "productName": item.get("productName", ""),
-                    "quantity": item.get("quantity", 1),
-                    "unitPrice": float(item.get("unitPrice", 0)),
-                    "totalPrice": float(item.get("totalPrice", 0))
-                }
-                
-                if product_id in existing_products:
-                    # Mettre à jour l'item existant
-                    existing_item = existing_products[product_id]
-                    # Vérifier si une mise à jour est nécessaire
-                    needs_update = (
-                        existing_item.productName != item_data["productName"] or
-                        existing_item.quantity != item_data["quantity"] or
-                        existing_item.unitPrice != item_data["unitPrice"] or
-                        existing_item.totalPrice != item_data["totalPrice"]
-                    )
-                    
-                    if needs_update:
-                        await prisma.cartitem.update(
-                            where={"id": existing_item.id},
-                            data=item_data
-                        )
-                        cart_updated = True
-                else:
-                    # Créer un nouvel item
-                    await prisma.cartitem.create(
-                        data={
-                            "userId": user_id,
-                            "productId": product_id,
-                            **item_data
-                        }
-                    )
-                    cart_updated = True
-                
+            with phase("cart_sync"):
+                async with db_pool.acquire() as prisma:
+                    return await cart_repository.sync(prisma, user_id, cart_items)
         except Exception as e:
             print(f"Erreur lors de la mise à jour du cart: {e}")
-        finally:
-            await prisma.disconnect()
-        
-        return cart_updated
+            return False
 
 # Instance globale du service
 openai_service = OpenAIService()
\ No newline at end of file
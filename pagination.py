@@ -0,0 +1,67 @@
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException, Response
+
+from config import settings
+
+class Page:
+    """Page de résultats avec les curseurs vers les pages voisines"""
+
+    def __init__(self, items: list, before_cursor: Optional[str], after_cursor: Optional[str]):
+        self.items = items
+        self.before_cursor = before_cursor
+        self.after_cursor = after_cursor
+
+    def apply_headers(self, response: Response) -> None:
+        """Expose les curseurs dans les en-têtes de la réponse"""
+        if self.before_cursor:
+            response.headers["X-Cursor-Before"] = self.before_cursor
+        if self.after_cursor:
+            response.headers["X-Cursor-After"] = self.after_cursor
+
+async def paginate(
+    delegate: Any,
+    where: Dict[str, Any],
+    order: List[Dict[str, str]],
+    limit: Optional[int],
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    from_end: bool = False
+) -> Page:
+    """Pagine une requête Prisma par curseur (id), dans l'ordre donné
+
+    Sans limite ni curseur, renvoie tout le résultat, comme avant la pagination.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Utilisez 'before' ou 'after', pas les deux")
+
+    if limit is None:
+        if before is None and after is None:
+            return Page(await delegate.find_many(where=where, order=order), None, None)
+        limit = settings.page_default_limit
+
+    # Une ligne de plus que demandé pour savoir s'il reste des résultats
+    backward = before is not None or (after is None and from_end)
+    cursor = before or after
+    query: Dict[str, Any] = {
+        "where": where,
+        "order": order,
+        "take": -(limit + 1) if backward else limit + 1,
+    }
+    if cursor:
+        query["cursor"] = {"id": cursor}
+        query["skip"] = 1
+
+    items = await delegate.find_many(**query)
+
+    has_more = len(items) > limit
+    if has_more:
+        items = items[1:] if backward else items[:-1]
+
+    # Côté du curseur fourni, il reste au moins la ligne du curseur
+    more_before = has_more if backward else after is not None
+    more_after = has_more if not backward else before is not None
+    return Page(
+        items,
+        before_cursor=items[0].id if items and more_before else None,
+        after_cursor=items[-1].id if items and more_after else None
+    )
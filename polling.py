@@ -0,0 +1,47 @@
+from typing import Any, Dict, Iterator
+import random
+
+class PollingStrategy:
+    """Intervalles d'interrogation d'un run : démarrage rapide, backoff exponentiel plafonné et jitter"""
+
+    def __init__(self, initial: float = 0.1, maximum: float = 2.0, multiplier: float = 1.6, jitter: float = 0.1):
+        self.initial = max(0.0, initial)
+        self.maximum = max(self.initial, maximum)
+        self.multiplier = max(1.0, multiplier)
+        self.jitter = max(0.0, jitter)
+
+    def intervals(self) -> Iterator[float]:
+        """Produit la suite (infinie) des délais d'attente entre deux interrogations"""
+        interval = self.initial
+        while True:
+            # Jitter proportionnel pour désynchroniser les runs concurrents
+            spread = interval * self.jitter
+            yield max(0.0, interval + random.uniform(-spread, spread))
+            interval = min(self.maximum, interval * self.multiplier)
+
+class PollingStats:
+    """Compteurs d'interrogation des runs OpenAI pour régler la stratégie"""
+
+    def __init__(self):
+        self.runs = 0
+        self.polls = 0
+        self.total_wait_time = 0.0
+        self.wasted_wait_time = 0.0
+
+    def record(self, polls: int, wait_time: float, wasted_wait_time: float) -> None:
+        """Enregistre les interrogations d'un run terminé"""
+        self.runs += 1
+        self.polls += polls
+        self.total_wait_time += wait_time
+        self.wasted_wait_time += wasted_wait_time
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs agrégés"""
+        return {
+            "runs": self.runs,
+            "polls": self.polls,
+            "polls_per_run": round(self.polls / self.runs, 2) if self.runs else 0.0,
+            "total_wait_ms": round(self.total_wait_time * 1000, 3),
+            # Borne haute : le run a pu se terminer n'importe quand pendant la dernière attente
+            "wasted_wait_ms": round(self.wasted_wait_time * 1000, 3),
+        }
@@ -0,0 +1,215 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import re
+import time
+import openai
+from metrics import openai_retries, circuit_state, track_openai
+from polling import PollingStrategy
+
+class CircuitOpen(Exception):
+    """Appel refusé sans être tenté : OpenAI est considéré comme dégradé"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Service OpenAI indisponible, réessayez dans {int(retry_after) + 1}s")
+        self.retry_after = int(retry_after) + 1
+
+class RunTimeout(Exception):
+    """Run OpenAI qui n'a pas abouti avant son échéance (il a été annulé)"""
+
+def is_transient(error: BaseException) -> bool:
+    """Erreurs qui signalent un OpenAI dégradé : 429, 5xx, coupure ou délai réseau, run hors délai"""
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (openai.APIConnectionError, RunTimeout))
+
+def not_applied(error: BaseException) -> bool:
+    """Erreurs qui prouvent que la requête n'a pas été traitée : 429, ou connexion jamais établie
+
+    Un 5xx ou un délai dépassé laisse l'issue inconnue : la création a pu aboutir.
+    """
+    if isinstance(error, openai.RateLimitError):
+        return True
+    # Cause httpx (ou httpx2, selon la version du SDK) : le nom de la classe suffit
+    return isinstance(error, openai.APIConnectionError) and type(error.__cause__).__name__ in ("ConnectError", "ConnectTimeout")
+
+_ACTIVE_RUN = re.compile(r"\b(run_[A-Za-z0-9]+)\b is active|active run (run_[A-Za-z0-9]+)")
+
+def active_run_id(error: BaseException) -> Optional[str]:
+    """ID du run qui occupe le thread si OpenAI a refusé l'appel pour cette raison (400), sinon None"""
+    if not isinstance(error, openai.BadRequestError):
+        return None
+    match = _ACTIVE_RUN.search(str(error))
+    return (match.group(1) or match.group(2)) if match else None
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Délai imposé par OpenAI (en-têtes retry-after-ms ou retry-after), en secondes"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+class CircuitBreaker:
+    """Coupe-circuit : s'ouvre après N échecs consécutifs, puis laisse passer un essai après reset_timeout"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = "chat"):
+        self.name = name
+        self.failure_threshold = max(0, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.rejections = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        """Lève CircuitOpen si l'appel ne doit pas être tenté"""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._trial_in_flight:
+            # Un seul appel d'essai à la fois pour sonder OpenAI
+            self._trial_in_flight = True
+            return
+        self.rejections += 1
+        remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+        raise CircuitOpen(max(0.0, remaining))
+
+    def release_trial(self) -> None:
+        """Libère l'essai en cours sans conclure (appel annulé)"""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        circuit_state.set(0, circuit=self.name)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or (self.failure_threshold and self.failures >= self.failure_threshold):
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            circuit_state.set(1, circuit=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejections": self.rejections,
+        }
+
+class Resilience:
+    """Nouvelles tentatives avec backoff (en respectant Retry-After) derrière un coupe-circuit"""
+
+    def __init__(self, max_retries: int, backoff: PollingStrategy, breaker: CircuitBreaker):
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.breaker = breaker
+        self.retries = 0
+
+    async def call(
+        self,
+        operation: str,
+        fn: Callable[..., Awaitable[Any]],
+        /,
+        *args,
+        deadline: Optional[float] = None,
+        recover: Optional[Callable[[], Awaitable[Any]]] = None,
+        **kwargs
+    ) -> Any:
+        """Appelle fn avec nouvelles tentatives sur erreur transitoire
+
+        deadline (horloge time.monotonic) borne chaque attente, Retry-After compris.
+        recover signale un appel qui crée une ressource : il n'est rejoué tel quel qu'après
+        une erreur qui prouve qu'il n'a pas abouti (not_applied). Après une autre erreur
+        transitoire, recover() cherche d'abord la ressource peut-être créée et la retourne.
+        """
+        self.breaker.before_call()
+        try:
+            return await self._call_with_retries(operation, fn, args, kwargs, deadline, recover)
+        except asyncio.CancelledError:
+            self.breaker.release_trial()
+            raise
+
+    async def _call_with_retries(
+        self,
+        operation: str,
+        fn: Callable[..., Awaitable[Any]],
+        args: tuple,
+        kwargs: dict,
+        deadline: Optional[float],
+        recover: Optional[Callable[[], Awaitable[Any]]]
+    ) -> Any:
+        intervals = self.backoff.intervals()
+        attempt = 0
+        # Création dont l'issue est inconnue : à rechercher avant toute nouvelle tentative
+        uncertain = False
+        while True:
+            try:
+                result = None
+                if uncertain:
+                    with track_openai(f"{operation}_lookup"):
+                        result = await recover()
+                    uncertain = False
+                if result is None:
+                    with track_openai(operation):
+                        result = await fn(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    # Erreur du client (4xx) : OpenAI répond, le circuit reste fermé
+                    self.breaker.record_success()
+                    raise
+                if recover is not None and not not_applied(e):
+                    uncertain = True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if attempt >= self.max_retries or (remaining is not None and remaining <= 0):
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self.retries += 1
+                openai_retries.inc(operation=operation)
+                delay = next(intervals)
+                imposed = retry_after(e)
+                if imposed is not None:
+                    delay = max(delay, imposed)
+                if remaining is not None:
+                    delay = min(delay, remaining)
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def guard(self) -> None:
+        """Vérifie le coupe-circuit avant un appel non rejouable (flux)"""
+        self.breaker.before_call()
+
+    def record(self, error: Optional[BaseException]) -> None:
+        """Rapporte au coupe-circuit l'issue d'un appel non rejouable"""
+        if isinstance(error, asyncio.CancelledError):
+            self.breaker.release_trial()
+        elif error is not None and is_transient(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"retries": self.retries, "circuit": self.breaker.stats()}
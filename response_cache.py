@@ -0,0 +1,113 @@
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+import math
+import re
+import unicodedata
+from cache import TTLCache
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+def normalize_prompt(prompt: str) -> str:
+    """Clé canonique d'un prompt : sans accents, casse, ponctuation ni espaces superflus"""
+    decomposed = unicodedata.normalize("NFKD", prompt)
+    ascii_text = "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+    return _NON_WORD.sub(" ", ascii_text).strip()
+
+def _embed(key: str) -> Tuple[Counter, float]:
+    """Vecteur local (trigrammes de caractères) et sa norme, pour la similarité cosinus"""
+    padded = f" {key} "
+    vector = Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+    return vector, math.sqrt(sum(count * count for count in vector.values()))
+
+def _cosine(a: Tuple[Counter, float], b: Tuple[Counter, float]) -> float:
+    (va, na), (vb, nb) = a, b
+    if not na or not nb:
+        return 0.0
+    if len(va) > len(vb):
+        va, vb = vb, va
+    return sum(count * vb[gram] for gram, count in va.items() if gram in vb) / (na * nb)
+
+class ResponseCache:
+    """Cache des réponses brutes de l'assistant pour les premiers tours sans état"""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 3600.0, similarity: float = 0.0, bypass_pattern: str = ""):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Index de similarité : clé normalisée -> vecteur (vide si similarity = 0)
+        self._vectors: Dict[str, Tuple[Counter, float]] = {}
+        self.similarity = similarity
+        self._bypass = re.compile(bypass_pattern, re.IGNORECASE) if bypass_pattern else None
+        self._generation: Optional[Tuple[str, str]] = None
+
+        # Compteurs exposés pour le dimensionnement du cache
+        self.bypasses = 0
+        self.similar_hits = 0
+        self.invalidations = 0
+
+    def bypass(self, prompt: str) -> bool:
+        """Indique si le prompt dépend du cart de l'utilisateur et ne doit pas passer par le cache"""
+        if self._bypass is not None and self._bypass.search(prompt):
+            self.bypasses += 1
+            return True
+        return False
+
+    def _check_generation(self, assistant_id: str, catalogue_version: str) -> None:
+        """Vide le cache quand l'assistant ou la version du catalogue change"""
+        generation = (assistant_id, catalogue_version)
+        if generation != self._generation:
+            if self._generation is not None:
+                self.invalidations += 1
+            self.clear()
+            self._generation = generation
+
+    def get(self, prompt: str, assistant_id: str, catalogue_version: str = "") -> Optional[str]:
+        """Retourne la réponse brute associée au prompt (exacte, puis la plus proche)"""
+        self._check_generation(assistant_id, catalogue_version)
+        key = normalize_prompt(prompt)
+        content = self._entries.get(key, count=False)
+        if content is None and self.similarity > 0 and self._vectors:
+            content = self._get_similar(key)
+            if content is not None:
+                self.similar_hits += 1
+        if content is None:
+            self._entries.misses += 1
+        else:
+            self._entries.hits += 1
+        return content
+
+    def _get_similar(self, key: str) -> Optional[str]:
+        query = _embed(key)
+        best_score, best_content = self.similarity, None
+        for other, vector in list(self._vectors.items()):
+            content = self._entries.get(other, count=False)
+            if content is None:
+                # Entrée expirée ou évincée : on la retire de l'index
+                del self._vectors[other]
+                continue
+            score = _cosine(query, vector)
+            if score >= best_score:
+                best_score, best_content = score, content
+        return best_content
+
+    def set(self, prompt: str, content: str, assistant_id: str, catalogue_version: str = "") -> None:
+        """Enregistre la réponse brute de l'assistant pour ce prompt"""
+        self._check_generation(assistant_id, catalogue_version)
+        key = normalize_prompt(prompt)
+        self._entries.set(key, content)
+        if self.similarity > 0:
+            self._vectors[key] = _embed(key)
+            if len(self._vectors) > 2 * self._entries.maxsize:
+                self._vectors = {k: v for k, v in self._vectors.items() if k in self._entries}
+
+    def clear(self) -> None:
+        """Vide le cache (changement d'assistant ou de catalogue)"""
+        self._entries.clear()
+        self._vectors.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs du cache"""
+        return {
+            **self._entries.stats(),
+            "similar_hits": self.similar_hits,
+            "bypasses": self.bypasses,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,94 @@
+from typing import Any, Optional
+import json
+import re
+
+# Motifs compilés une seule fois au chargement du module
+_FENCED_JSON = re.compile(r'^```json\s*\n?(.*?)\n?```$', re.DOTALL | re.MULTILINE)
+_FENCE_PATTERNS = (
+    re.compile(r'^```json\s*\n?(.*?)$', re.DOTALL | re.MULTILINE),  # ```json sans fermeture
+    re.compile(r'^```\s*\n?(.*?)\n?```$', re.DOTALL | re.MULTILINE),  # ``` sans json
+    re.compile(r'^```.*?\n(.*?)\n?```$', re.DOTALL | re.MULTILINE),  # ```quelquechose
+)
+_BACKTICKS = re.compile(r'`+')
+_JSON_MARKER = re.compile(r'^(json|JSON)\s*\n?', re.MULTILINE)
+_TRAILING_COMMA_OBJECT = re.compile(r',\s*}')
+_TRAILING_COMMA_ARRAY = re.compile(r',\s*]')
+_SINGLE_QUOTED_KEY = re.compile(r"'([^']*)':")
+_SINGLE_QUOTED_VALUE = re.compile(r":\s*'([^']*)'")
+_LINE_COMMENT = re.compile(r'//.*?\n')
+_BLOCK_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+class NormalizedResponse:
+    """Réponse de l'assistant analysée une seule fois et sérialisée à la demande"""
+
+    def __init__(self, text: str, data: Any = None, parsed: bool = False):
+        self._text = text
+        self.data = data
+        self.parsed = parsed
+        self._dirty = False
+
+    def mark_modified(self) -> None:
+        """Signale que l'objet analysé a été modifié et doit être re-sérialisé"""
+        self._dirty = True
+
+    @property
+    def text(self) -> str:
+        """Texte de la réponse, sérialisé au plus une fois après modification"""
+        if self._dirty:
+            self._text = json.dumps(self.data)
+            self._dirty = False
+        return self._text
+
+def _strip_fences(content: str) -> str:
+    """Enlève les backticks et le marqueur 'json' qui entourent la réponse"""
+    match = _FENCED_JSON.match(content)
+    if match:
+        return match.group(1).strip()
+    for pattern in _FENCE_PATTERNS:
+        match = pattern.match(content)
+        if match:
+            return match.group(1).strip()
+    return content
+
+def _clean_json_content(content: str) -> str:
+    """Nettoie le contenu JSON des caractères indésirables"""
+    if '`' in content:
+        content = _BACKTICKS.sub('', content)
+    content = _JSON_MARKER.sub('', content)
+    return content.strip()
+
+def _fix_json_format(content: str) -> str:
+    """Essaie de corriger les erreurs communes de formatage JSON"""
+    content = _TRAILING_COMMA_OBJECT.sub('}', content)
+    content = _TRAILING_COMMA_ARRAY.sub(']', content)
+    content = _SINGLE_QUOTED_KEY.sub(r'"\1":', content)
+    content = _SINGLE_QUOTED_VALUE.sub(r': "\1"', content)
+    content = _LINE_COMMENT.sub('\n', content)
+    content = _BLOCK_COMMENT.sub('', content)
+    return content
+
+def _try_parse(content: str) -> tuple[bool, Optional[Any]]:
+    try:
+        return True, json.loads(content)
+    except json.JSONDecodeError:
+        return False, None
+
+def normalize_response(content: str) -> NormalizedResponse:
+    """Nettoie la réponse brute de l'assistant et l'analyse en un seul passage"""
+    stripped = content.strip()
+    json_content = _clean_json_content(
+        _strip_fences(stripped) if stripped.startswith('```') else stripped
+    )
+
+    ok, data = _try_parse(json_content)
+    if ok:
+        return NormalizedResponse(json_content, data, parsed=True)
+
+    # Si le JSON n'est pas valide, essayer de le corriger
+    corrected = _fix_json_format(json_content)
+    ok, data = _try_parse(corrected)
+    if ok:
+        return NormalizedResponse(corrected, data, parsed=True)
+
+    # Si impossible à corriger, conserver le contenu original
+    return NormalizedResponse(content)
@@ -0,0 +1,29 @@
+from typing import Any, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # Dépendance optionnelle : pip install orjson
+    orjson = None
+
+class FastJSONResponse(JSONResponse):
+    """Réponse JSON par défaut, sérialisée par orjson s'il est installé"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def render(adapter: TypeAdapter, content: Any, response: Optional[Response] = None, status_code: int = 200) -> Response:
+    """Sérialise des modèles déjà validés en une passe pydantic-core
+
+    Court-circuite la re-validation du response_model (modèles -> dicts -> modèles -> JSON) ;
+    le response_model de la route reste déclaré pour la documentation OpenAPI. Les en-têtes
+    posés sur le paramètre Response de la route (curseurs, ETag) sont repris.
+    """
+    rendered = Response(content=adapter.dump_json(content), status_code=status_code, media_type="application/json")
+    if response is not None:
+        rendered.headers.update(response.headers)
+    return rendered
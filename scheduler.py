@@ -0,0 +1,143 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import math
+import time
+from config import settings
+from metrics import scheduler_active, scheduler_queue_depth, scheduler_wait, scheduler_rejections
+
+class SchedulerBusy(Exception):
+    """Run refusé faute de capacité ; le client doit réessayer après retry_after secondes"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Trop de runs en cours ({reason}), réessayez dans {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class RunScheduler:
+    """Ordonnanceur des runs OpenAI : limite globale, quota par utilisateur et un run à la fois par thread"""
+
+    def __init__(self, max_concurrent: int = 0, max_per_user: int = 0, max_queue: int = 0, queue_timeout: float = 30.0):
+        self.max_concurrent = max(0, max_concurrent)
+        self.max_per_user = max(0, max_per_user)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Runs en cours ou en attente par utilisateur
+        self._user_load: Dict[str, int] = {}
+        # Verrou par thread et nombre de requêtes qui le référencent
+        self._thread_locks: Dict[str, List[Any]] = {}
+
+        # Compteurs exposés pour le dimensionnement
+        self.waiting = 0
+        self.active = 0
+        self.rejections = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self._average_run_time = 5.0
+
+    def _retry_after(self) -> int:
+        """Estimation du délai avant qu'une place se libère, d'après la durée moyenne des runs"""
+        slots = self.max_concurrent or 1
+        return max(1, math.ceil(self._average_run_time * (1 + self.waiting / slots)))
+
+    def _reject(self, reason: str) -> None:
+        self.rejections += 1
+        scheduler_rejections.inc(reason=reason)
+        raise SchedulerBusy(reason, self._retry_after())
+
+    def _lock_for(self, thread_id: str) -> asyncio.Lock:
+        entry = self._thread_locks.get(thread_id)
+        if entry is None:
+            entry = self._thread_locks[thread_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_lock_ref(self, thread_id: str) -> None:
+        entry = self._thread_locks[thread_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._thread_locks[thread_id]
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, thread_id: str) -> AsyncIterator[None]:
+        """Réserve le droit de lancer un run sur le thread pour la durée du bloc"""
+        if self.max_per_user and self._user_load.get(user_id, 0) >= self.max_per_user:
+            self._reject("user")
+        if self.max_queue and self.waiting >= self.max_queue:
+            self._reject("queue")
+        if self.max_concurrent and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        self._user_load[user_id] = self._user_load.get(user_id, 0) + 1
+        lock = self._lock_for(thread_id)
+        started = time.perf_counter()
+        self.waiting += 1
+        scheduler_queue_depth.set(self.waiting)
+        entered = False
+        try:
+            try:
+                async with asyncio.timeout(self.queue_timeout or None):
+                    # Un seul run à la fois par thread, puis une place dans la limite globale
+                    await lock.acquire()
+                    try:
+                        if self._semaphore is not None:
+                            await self._semaphore.acquire()
+                    except BaseException:
+                        lock.release()
+                        raise
+                entered = True
+            except TimeoutError:
+                pass
+            finally:
+                self.waiting -= 1
+                scheduler_queue_depth.set(self.waiting)
+            if not entered:
+                self._reject("timeout")
+
+            waited = time.perf_counter() - started
+            self.total_wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+            scheduler_wait.observe(waited)
+
+            self.active += 1
+            scheduler_active.set(self.active)
+            run_started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.active -= 1
+                scheduler_active.set(self.active)
+                if self._semaphore is not None:
+                    self._semaphore.release()
+                lock.release()
+                # Moyenne glissante de la durée des runs, pour le Retry-After
+                self._average_run_time += 0.2 * (time.perf_counter() - run_started - self._average_run_time)
+        finally:
+            self._release_lock_ref(thread_id)
+            load = self._user_load[user_id] - 1
+            if load:
+                self._user_load[user_id] = load
+            else:
+                del self._user_load[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs de l'ordonnanceur"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_per_user": self.max_per_user,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejections": self.rejections,
+            "total_wait_ms": round(self.total_wait_time * 1000, 3),
+            "max_wait_ms": round(self.max_wait_time * 1000, 3),
+            "average_run_ms": round(self._average_run_time * 1000, 3),
+        }
+
+# Instance globale de l'ordonnanceur
+run_scheduler = RunScheduler(
+    max_concurrent=settings.run_max_concurrency,
+    max_per_user=settings.run_max_per_user,
+    max_queue=settings.run_max_queue,
+    queue_timeout=settings.run_queue_timeout
+)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Point d'entrée de production de l'API Rasa Fraym
+- plusieurs workers uvicorn (nombre déduit des CPU disponibles)
+- uvloop/httptools lorsqu'ils sont installés (uvicorn[standard])
+- keep-alive, backlog et drain gracieux sur SIGTERM configurables
+
+Chaque worker ouvre son propre pool Prisma et son propre client OpenAI dans
+le hook de démarrage de l'application, après la création du processus.
+
+Les limites de l'ordonnanceur des runs (scheduler.py) sont propres à chaque
+worker : avec N workers, RUN_MAX_PER_USER et RUN_MAX_CONCURRENCY valent N fois
+leur réglage pour le serveur. Les runs d'un même thread restent sérialisés entre
+workers : un worker qui trouve le thread occupé attend la fin du run en cours.
+
+Avec plusieurs workers, chacun exporte ses métriques dans METRICS_MULTIPROCESS_DIR
+(un répertoire temporaire si vide), vidé au démarrage, et /metrics les agrège.
+"""
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import settings
+
+def available_cpus() -> int:
+    """Nombre de CPU réellement utilisables par le processus (affinité, conteneur)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def default_workers() -> int:
+    """Nombre de workers : valeur configurée, sinon un par CPU disponible"""
+    if settings.server_workers > 0:
+        return settings.server_workers
+    return available_cpus()
+
+def prepare_metrics_dir(workers: int) -> None:
+    """Répertoire partagé des métriques, transmis aux workers par l'environnement"""
+    if not settings.metrics_enabled or workers <= 1:
+        return
+    directory = settings.metrics_multiprocess_dir or tempfile.mkdtemp(prefix="fraym-metrics-")
+    os.makedirs(directory, exist_ok=True)
+    # Les valeurs d'une exécution précédente fausseraient les compteurs (et les pids peuvent être réutilisés)
+    for path in Path(directory).glob("*.json"):
+        path.unlink()
+    os.environ["METRICS_MULTIPROCESS_DIR"] = directory
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de production Rasa Fraym")
+    parser.add_argument("--host", default=settings.api_host)
+    parser.add_argument("--port", type=int, default=settings.api_port)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    args = parser.parse_args()
+    prepare_metrics_dir(args.workers)
+
+    print(f"🚀 Démarrage de {args.workers} worker(s) sur {args.host}:{args.port}")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        # "auto" choisit uvloop et httptools lorsqu'ils sont installés
+        loop="auto",
+        http="auto",
+        backlog=settings.server_backlog,
+        timeout_keep_alive=settings.server_keep_alive,
+        # Sur SIGTERM : plus de nouvelles connexions, les requêtes en cours ont ce délai pour finir
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+        limit_concurrency=settings.server_limit_concurrency or None,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.server_forwarded_allow_ips,
+        access_log=settings.server_access_log
+    )
+
+if __name__ == "__main__":
+    main()
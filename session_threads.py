@@ -0,0 +1,63 @@
+from typing import Dict
+import asyncio
+from prisma import Prisma
+from openai_service import openai_service
+from thread_pool import thread_pool
+
+class SessionThreads:
+    """Création paresseuse du thread OpenAI d'une session, au premier message"""
+
+    def __init__(self):
+        # Créations en cours par session (premiers messages concurrents du worker)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.created = 0
+        self.shared = 0
+        self.conflicts = 0
+
+    async def ensure(self, prisma: Prisma, session) -> str:
+        """Retourne le thread de la session, en le créant une seule fois si nécessaire"""
+        if session.openaiThreadId:
+            return session.openaiThreadId
+
+        future = self._pending.get(session.id)
+        if future is None:
+            future = asyncio.ensure_future(self._attach(prisma, session.id))
+            self._pending[session.id] = future
+            future.add_done_callback(lambda _: self._pending.pop(session.id, None))
+        else:
+            self.shared += 1
+        # La création se poursuit même si la requête qui l'a lancée est annulée
+        return await asyncio.shield(future)
+
+    async def _attach(self, prisma: Prisma, session_id: str) -> str:
+        thread_id = await thread_pool.acquire()
+        # N'attache le thread que si aucun autre worker ne l'a fait entre-temps
+        claimed = await prisma.session.update_many(
+            where={"id": session_id, "openaiThreadId": None},
+            data={"openaiThreadId": thread_id}
+        )
+        if claimed:
+            self.created += 1
+            return thread_id
+
+        self.conflicts += 1
+        try:
+            await openai_service.delete_thread(thread_id)
+        except Exception as e:
+            print(f"Erreur lors de la suppression d'un thread en double: {e}")
+        session = await prisma.session.find_unique(where={"id": session_id})
+        if session is None or not session.openaiThreadId:
+            raise Exception("Session supprimée pendant la création de son thread")
+        return session.openaiThreadId
+
+    def stats(self) -> Dict[str, int]:
+        """Retourne les compteurs de création paresseuse"""
+        return {
+            "created": self.created,
+            "shared": self.shared,
+            "conflicts": self.conflicts,
+            "pending": len(self._pending),
+        }
+
+# Instance globale
+session_threads = SessionThreads()
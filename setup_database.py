@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Prépare la base de données Rasa Fraym à partir de DATABASE_URL
+- choisit le schéma du provider (sqlite : schema.prisma ; sinon une copie dérivée,
+  schema.<provider>.prisma, non suivie par git : le fichier suivi n'est jamais modifié)
+- génère le client Prisma et pousse le schéma
+"""
+
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import settings, provider_for_url
+
+SCHEMA = Path(__file__).parent / "schema.prisma"
+
+def schema_for(provider: str) -> Path:
+    """Schéma à utiliser pour le provider : schema.prisma s'il correspond, sinon une copie dérivée"""
+    content = SCHEMA.read_text(encoding="utf-8")
+    updated = re.sub(
+        r'(datasource db \{\s*provider\s*=\s*)"[^"]*"',
+        rf'\1"{provider}"',
+        content,
+        count=1
+    )
+    if updated == content:
+        return SCHEMA
+    # À côté du fichier suivi : les URL SQLite relatives sont résolues depuis le dossier du schéma
+    derived = SCHEMA.with_name(f"schema.{provider}.prisma")
+    derived.write_text(updated, encoding="utf-8")
+    return derived
+
+def run(cmd: list) -> None:
+    """Exécute une commande Prisma en s'arrêtant à la première erreur"""
+    print(f"▶️  {' '.join(cmd)}")
+    result = subprocess.run(cmd)
+    if result.returncode != 0:
+        sys.exit(result.returncode)
+
+def main():
+    provider = provider_for_url(settings.database_url)
+    schema = schema_for(provider)
+    print(f"🗄️  Provider: {provider} ({schema.name})")
+
+    run([sys.executable, "-m", "prisma", "generate", f"--schema={schema}"])
+    run([sys.executable, "-m", "prisma", "db", "push", f"--schema={schema}"])
+    print("✅ Base de données prête")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Tests de l'API Rasa Fraym"""
@@ -0,0 +1,69 @@
+import os
+
+import prisma
+
+from tests.fakes import FakePrisma
+
+try:
+    prisma.Prisma
+except RuntimeError:
+    # Client non généré (prisma generate télécharge ses moteurs) : les tests n'utilisent que FakePrisma
+    prisma.Prisma = FakePrisma
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+import database
+from benchmarks.fake_openai import FakeAssistants, create_app
+from config import settings
+from openai_service import openai_resilience, openai_service
+
+# Délais réduits pour que nouvelles tentatives, attentes de run et échéances tiennent en quelques dixièmes
+FAST_SETTINGS = {
+    "openai_assistant_id": "asst_fake",
+    "openai_max_retries": 2,
+    "openai_retry_initial_interval": 0.01,
+    "openai_retry_max_interval": 0.05,
+    "circuit_failure_threshold": 3,
+    "circuit_reset_timeout": 30.0,
+    "run_timeout": 2.0,
+    "run_wait_mode": "poll",
+    "run_poll_initial_interval": 0.01,
+    "run_poll_max_interval": 0.05,
+    "thread_pool_size": 0,
+}
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def db(monkeypatch):
+    """Pool global connecté à un client Prisma en mémoire ; retourne ce client"""
+    monkeypatch.setattr(database, "Prisma", FakePrisma)
+    monkeypatch.setattr(database.settings, "database_url", "file:./test.db")
+    await database.db_pool.connect()
+    try:
+        yield database.db_pool._clients[0]
+    finally:
+        await database.db_pool.disconnect()
+
+@pytest.fixture
+async def fake_openai(monkeypatch):
+    """Serveur OpenAI factice des benchmarks, servi en processus au service OpenAI global"""
+    for name, value in FAST_SETTINGS.items():
+        monkeypatch.setattr(settings, name, value)
+    fake = FakeAssistants(run_latency=0.05, api_latency=0.0, jitter=0.0, first_token=0.0, chunk_size=64)
+    client = AsyncOpenAI(
+        api_key="sk-test",
+        base_url="http://fake-openai/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(fake)))
+    )
+    monkeypatch.setattr(openai_service, "_client", client)
+    monkeypatch.setattr(openai_service, "_client_pid", os.getpid())
+    monkeypatch.setattr(openai_service, "assistant_id", settings.openai_assistant_id)
+    monkeypatch.setattr(openai_service, "resilience", openai_resilience())
+    yield fake
+    await client.close()
@@ -0,0 +1,285 @@
+"""Doublures des tests : client Prisma en mémoire (allers-retours comptés comme le vrai moteur)"""
+
+import asyncio
+import secrets
+from copy import deepcopy
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from prisma.errors import RecordNotFoundError, UniqueViolationError
+
+# Modèles de schema.prisma et leurs clés uniques (champ ou tuple de champs)
+MODELS = {
+    "user": ("id", "apiKey"),
+    "session": ("id", "openaiThreadId"),
+    "message": ("id", "openaiMessageId"),
+    "chatjob": ("id",),
+    "cartitem": ("id", ("userId", "productId")),
+    "lease": ("name",),
+    "revokedtoken": ("jti",),
+}
+
+# Modèles sans colonnes de date gérées par Prisma
+_UNDATED = ("lease", "revokedtoken")
+
+_OPERATORS = {"equals", "not", "in", "not_in", "lt", "lte", "gt", "gte", "startswith", "contains"}
+
+class Record:
+    """Ligne retournée par le client : attributs du modèle, None pour un champ absent"""
+
+    def __init__(self, row: Dict[str, Any]):
+        self.__dict__.update(row)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return None
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator == "equals":
+        return value == operand
+    if operator == "not":
+        return not _matches_field(value, operand)
+    if operator == "in":
+        return value in operand
+    if operator == "not_in":
+        return value not in operand
+    if value is None:
+        return False
+    if operator == "startswith":
+        return value.startswith(operand)
+    if operator == "contains":
+        return operand in value
+    return {"lt": value < operand, "lte": value <= operand, "gt": value > operand, "gte": value >= operand}[operator]
+
+def _matches_field(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and set(condition) <= _OPERATORS:
+        return all(_compare(value, operator, operand) for operator, operand in condition.items())
+    return value == condition
+
+def matches(row: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Évalue un filtre where de Prisma (opérateurs courants, OR/AND/NOT, clés composées)"""
+    for key, condition in (where or {}).items():
+        if key == "OR":
+            if not any(matches(row, item) for item in condition):
+                return False
+        elif key == "AND":
+            if not all(matches(row, item) for item in condition):
+                return False
+        elif key == "NOT":
+            if matches(row, condition):
+                return False
+        elif isinstance(condition, dict) and condition and not set(condition) <= _OPERATORS:
+            # Clé unique composée (ex. userId_productId)
+            if not matches(row, condition):
+                return False
+        elif not _matches_field(row.get(key), condition):
+            return False
+    return True
+
+class FakeModel:
+    """Actions d'un modèle sur une table en mémoire"""
+
+    def __init__(self, client: "FakePrisma", name: str):
+        self._client = client
+        self.name = name
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        return self._client.tables[self.name]
+
+    def __getattr__(self, action: str):
+        apply = getattr(self, f"_{action}", None)
+        if apply is None:
+            raise AttributeError(action)
+
+        async def call(*args, **kwargs):
+            await self._client._engine.query(f"{self.name}.{action}")
+            return apply(*args, **kwargs)
+
+        return call
+
+    def _check_unique(self, row: Dict[str, Any], ignore: Optional[Dict[str, Any]] = None) -> None:
+        for key in MODELS[self.name]:
+            fields = key if isinstance(key, tuple) else (key,)
+            values = tuple(row.get(field) for field in fields)
+            if None in values:
+                continue
+            for other in self.rows:
+                if other is not ignore and tuple(other.get(field) for field in fields) == values:
+                    raise UniqueViolationError({"user_facing_error": {"meta": {"target": list(fields)}}})
+
+    def _apply_update(self, row: Dict[str, Any], data: Dict[str, Any]) -> None:
+        updated = dict(row)
+        for field, value in data.items():
+            if isinstance(value, dict) and "increment" in value:
+                value = updated.get(field, 0) + value["increment"]
+            elif isinstance(value, dict) and "set" in value:
+                value = value["set"]
+            updated[field] = value
+        if self.name not in _UNDATED and "updatedAt" not in data:
+            updated["updatedAt"] = datetime.now(timezone.utc)
+        self._check_unique(updated, ignore=row)
+        row.update(updated)
+
+    def _sorted(self, rows: List[Dict[str, Any]], order: Any) -> List[Dict[str, Any]]:
+        for item in reversed(order if isinstance(order, list) else [order] if order else []):
+            (field, direction), = item.items()
+            rows = sorted(rows, key=lambda row: (row.get(field) is not None, row.get(field)), reverse=direction == "desc")
+        return rows
+
+    def _find_many(self, where=None, order=None, take=None, skip=None, cursor=None, **_) -> List[Record]:
+        rows = self._sorted([row for row in self.rows if matches(row, where)], order)
+        # Un take négatif lit en arrière depuis le curseur, comme Prisma
+        backward = take is not None and take < 0
+        if cursor is not None:
+            index = next((i for i, row in enumerate(rows) if matches(row, cursor)), None)
+            if index is None:
+                rows = []
+            else:
+                rows = rows[:index + 1] if backward else rows[index:]
+        if skip:
+            rows = rows[:-skip] if backward else rows[skip:]
+        if take is not None:
+            rows = rows[take:] if backward else rows[:take]
+        return [Record(deepcopy(row)) for row in rows]
+
+    def _find_first(self, where=None, order=None, **kwargs) -> Optional[Record]:
+        rows = self._find_many(where=where, order=order, take=1, **kwargs)
+        return rows[0] if rows else None
+
+    def _find_unique(self, where, **_) -> Optional[Record]:
+        return self._find_first(where=where)
+
+    def _count(self, where=None, **_) -> int:
+        return sum(1 for row in self.rows if matches(row, where))
+
+    def _create(self, data, **_) -> Record:
+        row = dict(data)
+        if "id" in MODELS[self.name]:
+            row.setdefault("id", f"c{secrets.token_hex(12)}")
+        if self.name not in _UNDATED:
+            now = datetime.now(timezone.utc)
+            row.setdefault("createdAt", now)
+            row.setdefault("updatedAt", now)
+        self._check_unique(row)
+        self.rows.append(row)
+        return Record(deepcopy(row))
+
+    def _create_many(self, data, **_) -> int:
+        for item in data:
+            self._create(item)
+        return len(data)
+
+    def _update(self, where, data, **_) -> Optional[Record]:
+        row = next((row for row in self.rows if matches(row, where)), None)
+        if row is None:
+            raise RecordNotFoundError({"user_facing_error": {"meta": {"cause": "Record to update not found."}}})
+        self._apply_update(row, data)
+        return Record(deepcopy(row))
+
+    def _update_many(self, where, data, **_) -> int:
+        rows = [row for row in self.rows if matches(row, where)]
+        for row in rows:
+            self._apply_update(row, data)
+        return len(rows)
+
+    def _upsert(self, where, data, **_) -> Record:
+        row = next((row for row in self.rows if matches(row, where)), None)
+        if row is None:
+            return self._create(data["create"])
+        self._apply_update(row, data["update"])
+        return Record(deepcopy(row))
+
+    def _delete(self, where, **_) -> Record:
+        row = next((row for row in self.rows if matches(row, where)), None)
+        if row is None:
+            raise RecordNotFoundError({"user_facing_error": {"meta": {"cause": "Record to delete does not exist."}}})
+        self.rows.remove(row)
+        return Record(row)
+
+    def _delete_many(self, where=None, **_) -> int:
+        kept = [row for row in self.rows if not matches(row, where)]
+        deleted = len(self.rows) - len(kept)
+        self.rows[:] = kept
+        return deleted
+
+class FakeBatch:
+    """prisma.batch_() : opérations enregistrées puis appliquées en un aller-retour, tout ou rien"""
+
+    def __init__(self, client: "FakePrisma"):
+        self._client = client
+        self._operations = []
+
+    def __getattr__(self, model: str):
+        if model not in MODELS:
+            raise AttributeError(model)
+        batch = self
+
+        class Recorder:
+            def __getattr__(self, action: str):
+                return lambda *args, **kwargs: batch._operations.append((model, action, args, kwargs))
+
+        return Recorder()
+
+    async def __aenter__(self) -> "FakeBatch":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            return
+        await self._client._engine.query("batch")
+        snapshot = deepcopy(self._client.tables)
+        try:
+            for model, action, args, kwargs in self._operations:
+                getattr(FakeModel(self._client, model), f"_{action}")(*args, **kwargs)
+        except Exception:
+            self._client.tables = snapshot
+            raise
+
+class FakeEngine:
+    """Moteur de requêtes : un appel par aller-retour (PrismaPool y branche son compteur)"""
+
+    def __init__(self):
+        self.operations: List[str] = []
+        self.fail: Optional[Exception] = None
+
+    async def query(self, operation: str) -> None:
+        # Un aller-retour rend la main à la boucle, comme le vrai moteur
+        await asyncio.sleep(0)
+        self.operations.append(operation)
+        if self.fail is not None:
+            raise self.fail
+
+class FakePrisma:
+    """Client Prisma en mémoire, interchangeable avec prisma.Prisma dans PrismaPool"""
+
+    def __init__(self, datasource: Optional[dict] = None):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {name: [] for name in MODELS}
+        self._engine = FakeEngine()
+        self._connected = False
+
+    def __getattr__(self, name: str) -> FakeModel:
+        if name not in MODELS:
+            raise AttributeError(name)
+        return FakeModel(self, name)
+
+    async def connect(self) -> None:
+        self._connected = True
+
+    async def disconnect(self) -> None:
+        self._connected = False
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def batch_(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    async def query_raw(self, query: str, *args) -> list:
+        await self._engine.query("query_raw")
+        return []
+
+    async def execute_raw(self, query: str, *args) -> int:
+        await self._engine.query("execute_raw")
+        return 0
@@ -0,0 +1,62 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from auth import create_access_token, get_current_user, revoke_token, verify_token
+from config import settings
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def west_of_utc(monkeypatch):
+    """Hôte à l'ouest d'UTC, où datetime.utcnow().timestamp() est en avance sur exp"""
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def credentials(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+async def test_logout_rejects_the_token(db, west_of_utc, monkeypatch):
+    monkeypatch.setattr(settings, "jwt_stateless", True)
+    claims = {"sub": "u1", "usr": {"name": "Ada", "email": None, "created_at": None}}
+    token = create_access_token(claims, timedelta(minutes=30))
+    other = create_access_token(claims, timedelta(minutes=30))
+    assert (await get_current_user(credentials(token))).id == "u1"
+
+    await revoke_token(verify_token(token))
+
+    with pytest.raises(HTTPException) as error:
+        await get_current_user(credentials(token))
+    assert error.value.status_code == 401
+    # Seul le token révoqué est refusé
+    assert (await get_current_user(credentials(other))).id == "u1"
+
+async def test_revocation_is_shared_and_never_evicted(db):
+    # Révocations en base : aucune limite de taille, visibles par tous les workers
+    tokens = [create_access_token({"sub": f"u{i}"}, timedelta(minutes=30)) for i in range(50)]
+    for token in tokens:
+        await revoke_token(verify_token(token))
+    assert await db.revokedtoken.count() == 50
+
+async def test_expired_revocations_are_purged(db):
+    await db.revokedtoken.create(data={"jti": "old", "expiresAt": datetime.now(timezone.utc) - timedelta(minutes=1)})
+    expired = verify_token(create_access_token({"sub": "u1"}, timedelta(minutes=30)))
+    expired["exp"] = time.time() - 1
+    await revoke_token(expired)
+    await revoke_token(verify_token(create_access_token({"sub": "u1"}, timedelta(minutes=30))))
+    # Token déjà expiré non enregistré, révocation périmée supprimée au passage
+    rows = await db.revokedtoken.find_many()
+    assert len(rows) == 1 and rows[0].jti != "old"
+
+async def test_database_error_rejects_the_token(db, monkeypatch):
+    monkeypatch.setattr(settings, "jwt_stateless", True)
+    token = create_access_token({"sub": "u1", "usr": {}}, timedelta(minutes=30))
+    db._engine.fail = RuntimeError("base indisponible")
+    with pytest.raises(RuntimeError):
+        await get_current_user(credentials(token))
@@ -0,0 +1,69 @@
+import asyncio
+import itertools
+import json
+
+import pytest
+
+from benchmarks.fake_openai import CORPUS
+from chat_turn import run_chat_turn
+from config import settings
+from database import track_queries
+from openai_service import openai_service
+from response_cache import ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+# Allers-retours Prisma autorisés pour un tour de chat complet
+MAX_QUERIES = 5
+
+def corpus_response(with_cart: bool) -> str:
+    """Réponse du corpus qui met à jour le cart (useState.cart), ou non"""
+    for line in CORPUS.read_text(encoding="utf-8").splitlines():
+        content = json.loads(line)["content"]
+        if ('"cart"' in content) == with_cart:
+            return content
+    raise LookupError("Aucune réponse de ce type dans le corpus")
+
+async def new_session(db):
+    user = await db.user.create(data={"apiKey": "key-chat", "name": "Ada"})
+    session = await db.session.create(data={"userId": user.id, "openaiAssistantId": "asst_fake"})
+    return user, session
+
+async def counted_turn(db, session, user_id: str, content: str):
+    counter = track_queries()
+    response = await run_chat_turn(db, session, user_id, content)
+    return response, counter.count, list(db._engine.operations)
+
+@pytest.mark.parametrize("concurrent_io", [True, False])
+@pytest.mark.parametrize("with_cart", [False, True])
+async def test_chat_turn_query_budget(db, fake_openai, monkeypatch, concurrent_io, with_cart):
+    monkeypatch.setattr(settings, "chat_concurrent_io", concurrent_io)
+    fake_openai.responses = itertools.cycle([corpus_response(with_cart)])
+    user, session = await new_session(db)
+
+    # Premier tour : le thread est créé et rattaché à la session
+    db._engine.operations.clear()
+    response, first, operations = await counted_turn(db, session, user.id, "Montre-moi des vestes")
+    assert first <= MAX_QUERIES, operations
+    assert response.assistant_response.role == "assistant"
+
+    # Tour suivant sur la session relue (thread déjà rattaché)
+    session = await db.session.find_unique(where={"id": session.id})
+    db._engine.operations.clear()
+    _, following, operations = await counted_turn(db, session, user.id, "Ajoute la veste noire")
+    assert following <= MAX_QUERIES, operations
+    assert await db.message.count(where={"sessionId": session.id}) == 4
+
+async def test_concurrent_first_messages_cache_only_the_first(db, fake_openai, monkeypatch):
+    monkeypatch.setattr(settings, "response_cache_enabled", True)
+    monkeypatch.setattr(openai_service, "response_cache", ResponseCache(bypass_pattern=settings.response_cache_bypass_pattern))
+    fake_openai.responses = itertools.cycle([corpus_response(False)])
+    user, session = await new_session(db)
+
+    # Deux premiers messages simultanés : le second tourne avec le contexte du premier
+    prompts = ["Montre-moi des vestes", "Montre-moi des chemises"]
+    await asyncio.gather(*(run_chat_turn(db, session, user.id, prompt) for prompt in prompts))
+
+    cached = [prompt for prompt in prompts if openai_service.response_cache.get(prompt, "asst_fake") is not None]
+    assert len(cached) == 1
+    assert len(fake_openai.runs) == 2
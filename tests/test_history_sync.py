@@ -0,0 +1,32 @@
+import pytest
+
+from history_sync import HistorySync, PAGE_SIZE
+from openai_service import openai_service
+
+pytestmark = pytest.mark.anyio
+
+async def test_reconciliation_pages_through_long_threads(db, fake_openai):
+    thread = await openai_service.create_thread()
+    session = await db.session.create(data={"userId": "u1", "openaiAssistantId": "asst_fake", "openaiThreadId": thread})
+    for index in range(PAGE_SIZE * 2 + 30):
+        fake_openai.new_message(thread, "user", f"message {index}")
+    # Déjà enregistré par son tour : ignoré
+    known = fake_openai.threads[thread]["messages"][PAGE_SIZE + 5]["id"]
+    await db.message.create(data={"sessionId": session.id, "role": "user", "content": "déjà là", "openaiMessageId": known})
+
+    imported = await HistorySync(grace=0)._sync_session(db, session)
+
+    assert imported == PAGE_SIZE * 2 + 29
+    stored = await db.message.find_many(where={"sessionId": session.id})
+    assert len({message.openaiMessageId for message in stored}) == PAGE_SIZE * 2 + 30
+
+async def test_list_pages_follow_after_and_order(fake_openai):
+    thread = await openai_service.create_thread()
+    ids = [fake_openai.new_message(thread, "user", str(index))["id"] for index in range(5)]
+
+    first = await openai_service.list_thread_messages(thread, limit=2)
+    second = await openai_service.list_thread_messages(thread, after=first[-1]["id"], limit=2)
+    latest = await openai_service.client.beta.threads.messages.list(thread_id=thread, order="desc", after=ids[3], limit=2)
+
+    assert [message["id"] for message in first + second] == ids[:4]
+    assert [message.id for message in latest.data] == [ids[2], ids[1]]
@@ -0,0 +1,21 @@
+import asyncio
+
+import pytest
+
+from jobs import JobQueue, JobQueueFull
+
+pytestmark = pytest.mark.anyio
+
+async def test_concurrent_submissions_respect_the_user_quota(db):
+    queue = JobQueue(max_per_user=2)
+    queue._queue = asyncio.Queue()
+
+    results = await asyncio.gather(
+        *(queue.submit(db, "u1", "s1", f"message {index}") for index in range(6)),
+        return_exceptions=True
+    )
+
+    assert sum(not isinstance(result, Exception) for result in results) == 2
+    assert all(isinstance(result, JobQueueFull) for result in results if isinstance(result, Exception))
+    assert await db.chatjob.count(where={"userId": "u1"}) == 2
+    assert db.tables["lease"] == []
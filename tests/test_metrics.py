@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+from metrics import Registry
+
+def worker_registry() -> Registry:
+    registry = Registry()
+    registry.counter("jobs_total", "Jobs", ["status"]).inc(2, status="done")
+    registry.gauge("queue_depth", "File").set(3)
+    registry.histogram("duration_seconds", "Durée", buckets=(1.0,)).observe(0.5)
+    return registry
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def test_shared_metrics_aggregate_all_workers(tmp_path):
+    # Un autre worker vivant (le processus parent) et un worker arrêté
+    other = {
+        "jobs_total": [[["done"], 5]],
+        "queue_depth": [[[], 7]],
+        "duration_seconds": [[[], [[0, 1], 2.0, 1]]],
+    }
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps(other), encoding="utf-8")
+    (tmp_path / f"{dead_pid()}.json").write_text(json.dumps(other), encoding="utf-8")
+
+    lines = worker_registry().render_shared(str(tmp_path)).splitlines()
+
+    assert 'jobs_total{status="done"} 12' in lines
+    assert 'duration_seconds_bucket{le="1.0"} 1' in lines
+    assert 'duration_seconds_bucket{le="+Inf"} 3' in lines
+    assert "duration_seconds_count 3" in lines
+    gauges = sorted(line for line in lines if line.startswith("queue_depth{"))
+    assert gauges == sorted([f'queue_depth{{worker="{os.getpid()}"}} 3', f'queue_depth{{worker="{os.getppid()}"}} 7'])
+    assert (tmp_path / f"{os.getpid()}.json").exists()
@@ -0,0 +1,95 @@
+import time
+
+import openai
+import pytest
+from fastapi import HTTPException
+
+from config import settings
+from models import MessageCreate
+from openai_service import openai_service
+from resilience import CircuitOpen
+
+pytestmark = pytest.mark.anyio
+
+def messages(fake, thread_id: str, role: str) -> list:
+    return [message for message in fake.threads[thread_id]["messages"] if message["role"] == role]
+
+async def test_rate_limit_waits_for_retry_after(fake_openai):
+    thread_id = await openai_service.create_thread()
+    fake_openai.fail_next, fake_openai.fail_status, fake_openai.retry_after = 1, 429, 0.2
+
+    started = time.monotonic()
+    await openai_service.add_message_to_thread(thread_id, "Bonjour")
+
+    assert time.monotonic() - started >= 0.2
+    assert fake_openai.failures == 1
+    assert openai_service.resilience.retries == 1
+    assert len(messages(fake_openai, thread_id, "user")) == 1
+
+async def test_retry_after_is_capped_by_the_run_deadline(fake_openai, monkeypatch):
+    thread_id = await openai_service.create_thread()
+    monkeypatch.setattr(settings, "run_timeout", 0.3)
+    fake_openai.fail_rate, fake_openai.fail_status, fake_openai.retry_after = 1.0, 429, 30
+
+    started = time.monotonic()
+    with pytest.raises(openai.RateLimitError):
+        await openai_service.add_message_to_thread(thread_id, "Bonjour")
+    assert time.monotonic() - started < 1.0
+
+async def test_lost_message_creation_is_not_repeated(fake_openai):
+    thread_id = await openai_service.create_thread()
+    # Message créé mais réponse perdue (500) : retrouvé par sa métadonnée, pas recréé
+    fake_openai.fail_next, fake_openai.fail_status, fake_openai.fail_applied = 1, 500, True
+
+    message_id = await openai_service.add_message_to_thread(thread_id, "Bonjour")
+
+    assert [message["id"] for message in messages(fake_openai, thread_id, "user")] == [message_id]
+
+async def test_lost_run_creation_is_not_repeated(fake_openai):
+    thread_id = await openai_service.create_thread()
+    await openai_service.add_message_to_thread(thread_id, "Montre-moi des vestes")
+    fake_openai.fail_next, fake_openai.fail_status, fake_openai.fail_applied = 1, 500, True
+
+    response, message_id, _ = await openai_service.run_assistant(thread_id)
+
+    # Un seul run, donc une seule réponse de l'assistant
+    assert len(fake_openai.runs) == 1
+    assert [message["id"] for message in messages(fake_openai, thread_id, "assistant")] == [message_id]
+    assert response.text
+
+async def test_unapplied_run_creation_is_retried(fake_openai):
+    thread_id = await openai_service.create_thread()
+    await openai_service.add_message_to_thread(thread_id, "Montre-moi des vestes")
+    fake_openai.fail_next, fake_openai.fail_status = 1, 429
+
+    await openai_service.run_assistant(thread_id)
+
+    assert len(fake_openai.runs) == 1
+
+async def test_hung_run_is_cancelled_with_a_504(fake_openai, db, monkeypatch):
+    from main import chat
+
+    monkeypatch.setattr(settings, "run_timeout", 0.3)
+    fake_openai.hang_rate = 1.0
+    user = await db.user.create(data={"apiKey": "key-hung", "name": "Ada"})
+    session = await db.session.create(data={"userId": user.id, "openaiAssistantId": "asst_fake"})
+
+    with pytest.raises(HTTPException) as error:
+        await chat(session.id, MessageCreate(content="Bonjour"), None, "Bearer key-hung", prisma=db)
+
+    assert error.value.status_code == 504
+    (state,) = fake_openai.runs.values()
+    assert state["run"]["status"] == "cancelled"
+
+async def test_breaker_opens_after_repeated_failures(fake_openai):
+    fake_openai.fail_rate, fake_openai.fail_status = 1.0, 503
+    for _ in range(settings.circuit_failure_threshold):
+        with pytest.raises(openai.InternalServerError):
+            await openai_service.create_thread()
+    failures = fake_openai.failures
+
+    # Circuit ouvert : l'appel est refusé sans atteindre OpenAI
+    with pytest.raises(CircuitOpen):
+        await openai_service.create_thread()
+    assert fake_openai.failures == failures
+    assert openai_service.resilience.breaker.state == "open"
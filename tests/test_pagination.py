@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config import settings
+from pagination import paginate
+
+pytestmark = pytest.mark.anyio
+
+ORDER = [{"createdAt": "asc"}, {"id": "asc"}]
+
+async def history(db, size: int):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for index in range(size):
+        await db.message.create(data={
+            "id": f"m{index:03d}",
+            "sessionId": "s1",
+            "role": "user",
+            "content": str(index),
+            "createdAt": start + timedelta(seconds=index),
+        })
+
+async def test_no_pagination_parameter_returns_the_full_history(db):
+    await history(db, settings.page_default_limit + 10)
+
+    page = await paginate(db.message, where={"sessionId": "s1"}, order=ORDER, limit=None, from_end=True)
+
+    assert len(page.items) == settings.page_default_limit + 10
+    assert page.before_cursor is None and page.after_cursor is None
+
+async def test_limit_returns_the_latest_page_with_a_cursor(db):
+    await history(db, 12)
+
+    page = await paginate(db.message, where={"sessionId": "s1"}, order=ORDER, limit=5, from_end=True)
+    older = await paginate(db.message, where={"sessionId": "s1"}, order=ORDER, limit=5, before=page.before_cursor)
+
+    assert [item.id for item in page.items] == [f"m{index:03d}" for index in range(7, 12)]
+    assert [item.id for item in older.items] == [f"m{index:03d}" for index in range(2, 7)]
+    assert older.before_cursor == "m002" and older.after_cursor == "m006"
+
+async def test_cursor_without_limit_uses_the_default_page_size(db):
+    await history(db, settings.page_default_limit + 10)
+
+    page = await paginate(db.message, where={"sessionId": "s1"}, order=ORDER, limit=None, after="m000")
+
+    assert len(page.items) == settings.page_default_limit
+    assert page.items[0].id == "m001"
@@ -0,0 +1,173 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import time
+from config import settings
+from metrics import thread_pool_depth, thread_pool_requests
+from openai_service import openai_service
+
+class ThreadPool:
+    """Réserve de threads OpenAI pré-créés, réalimentée en tâche de fond"""
+
+    def __init__(
+        self,
+        create: Callable[[], Awaitable[str]],
+        delete: Callable[[str], Awaitable[Any]],
+        size: int = 0,
+        low_water: int = 0,
+        refill_concurrency: int = 4,
+        max_age: float = 86400.0,
+        reap_interval: float = 60.0
+    ):
+        self._create = create
+        self._delete = delete
+        self.size = max(0, size)
+        self.low_water = min(max(0, low_water), self.size)
+        self.refill_concurrency = max(1, refill_concurrency)
+        self.max_age = max_age
+        self.reap_interval = reap_interval
+        # (thread_id, date de création), du plus ancien (à gauche) au plus récent
+        self._threads: Deque[Tuple[str, float]] = deque()
+        self._expired: List[str] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Compteurs exposés pour le dimensionnement de la réserve
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.reaped = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    async def start(self) -> None:
+        """Lance la tâche de réalimentation (une par worker)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._wake.set()
+        self._task = asyncio.create_task(self._maintain())
+
+    async def stop(self) -> None:
+        """Arrête la réalimentation et supprime les threads inutilisés"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        threads = [thread_id for thread_id, _ in self._threads] + self._expired
+        self._threads.clear()
+        self._expired = []
+        thread_pool_depth.set(0)
+        await self._delete_all(threads)
+
+    async def acquire(self) -> str:
+        """Retourne un thread de la réserve, ou en crée un à la demande si elle est vide"""
+        thread_id = self._pop()
+        if thread_id is not None:
+            self.hits += 1
+            thread_pool_requests.inc(result="hit")
+            return thread_id
+        if self.enabled:
+            self.misses += 1
+            thread_pool_requests.inc(result="miss")
+        return await self._create()
+
+    def _pop(self) -> Optional[str]:
+        # Les plus anciens d'abord, pour limiter les threads expirés
+        now = time.monotonic()
+        thread_id = None
+        while self._threads:
+            candidate, created_at = self._threads.popleft()
+            if now - created_at < self.max_age:
+                thread_id = candidate
+                break
+            # Thread trop ancien : supprimé par la tâche de fond
+            self._expired.append(candidate)
+        thread_pool_depth.set(len(self._threads))
+        if self._wake is not None and len(self._threads) <= self.low_water:
+            self._wake.set()
+        return thread_id
+
+    async def _maintain(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.reap_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._reap()
+            if len(self._threads) <= self.low_water:
+                await self._refill()
+
+    async def _refill(self) -> None:
+        """Remonte la réserve jusqu'à sa taille cible, avec une concurrence bornée"""
+        semaphore = asyncio.Semaphore(self.refill_concurrency)
+
+        async def create_one():
+            async with semaphore:
+                try:
+                    thread_id = await self._create()
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Erreur lors de la pré-création d'un thread: {e}")
+                    return
+                self.created += 1
+                self._threads.append((thread_id, time.monotonic()))
+                thread_pool_depth.set(len(self._threads))
+
+        missing = self.size - len(self._threads)
+        if missing > 0:
+            await asyncio.gather(*(create_one() for _ in range(missing)))
+
+    async def _reap(self) -> None:
+        """Supprime les threads restés inutilisés plus de max_age secondes"""
+        now = time.monotonic()
+        expired, self._expired = self._expired, []
+        while self._threads and now - self._threads[0][1] >= self.max_age:
+            expired.append(self._threads.popleft()[0])
+        if expired:
+            self.reaped += len(expired)
+            thread_pool_depth.set(len(self._threads))
+            await self._delete_all(expired)
+
+    async def _delete_all(self, threads) -> None:
+        semaphore = asyncio.Semaphore(self.refill_concurrency)
+
+        async def delete_one(thread_id: str):
+            async with semaphore:
+                await self._delete(thread_id)
+
+        await asyncio.gather(*(delete_one(thread_id) for thread_id in threads), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne les compteurs de la réserve"""
+        return {
+            "size": self.size,
+            "low_water": self.low_water,
+            "depth": len(self._threads),
+            "hits": self.hits,
+            "misses": self.misses,
+            "created": self.created,
+            "reaped": self.reaped,
+            "errors": self.errors,
+        }
+
+# Instance globale de la réserve de threads
+thread_pool = ThreadPool(
+    create=openai_service.create_thread,
+    delete=openai_service.delete_thread,
+    size=settings.thread_pool_size,
+    low_water=settings.thread_pool_low_water,
+    refill_concurrency=settings.thread_pool_refill_concurrency,
+    max_age=settings.thread_pool_max_age
+)